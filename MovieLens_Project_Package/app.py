@@ -3,7 +3,7 @@ MovieLens电影评分数据查询系统
 """
 import streamlit as st
 import pandas as pd
-from data_loader import load_movies, load_ratings
+from data_loader import load_dataset
 from pages import query
 
 # 页面配置
@@ -29,16 +29,10 @@ st.markdown("""
 # 标题
 st.markdown('<h1 class="main-header">🔍 MovieLens 电影评分数据查询系统</h1>', unsafe_allow_html=True)
 
-# 加载数据
-@st.cache_data
-def load_all_data():
-    movies = load_movies()
-    ratings = load_ratings()
-    return movies, ratings
-
 try:
+    # 加载数据（只读的数据集句柄，各页面的缓存函数以其版本号作为缓存键）
     with st.spinner('正在加载数据...'):
-        movies, ratings = load_all_data()
+        dataset = load_dataset()
     
     # 侧边栏导航
     st.sidebar.title("导航")
@@ -46,13 +40,13 @@ try:
     
     if page == "数据概览":
         from pages import overview
-        overview.show(movies, ratings)
+        overview.show(dataset)
     elif page == "数据查询":
         from pages import query
-        query.show(movies, ratings)
+        query.show(dataset)
     elif page == "可视化分析":
         from pages import visualization
-        visualization.show(movies, ratings)
+        visualization.show(dataset)
 
 except Exception as e:
     st.error(f"❌ 加载数据时出错: {str(e)}")
@@ -0,0 +1,139 @@
+"""
+CSV 数据源的列式缓存
+第一次读取 CSV 时把解析结果（包括派生列）写成 Parquet 文件放在 CSV 旁边的缓存目录中，
+之后启动时直接读取 Parquet，不再重复解析字符串和计算派生列。
+缓存以 CSV 文件的大小、修改时间和内容哈希作为失效依据。
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+from hbase_config import get_data_source_config
+from snapshot_cache import PARQUET_AVAILABLE, write_json_atomic, write_parquet_atomic
+
+# 缓存格式版本，派生列的计算方式变化时递增以使旧缓存失效
+CSV_CACHE_VERSION = 1
+
+
+def prepare_movies(movies):
+    """
+    由标题提取电影年份（CSV 加载和导入 HBase 共用，保证两条路径的派生列一致）
+
+    Args:
+        movies: movies.csv 的数据
+
+    Returns:
+        pd.DataFrame: 增加了 year 列的数据
+    """
+    movies['year'] = movies['title'].str.extract(r'\((\d{4})\)')
+    movies['year'] = pd.to_numeric(movies['year'], errors='coerce')
+    return movies
+
+
+def prepare_ratings(ratings):
+    """
+    由评分时间戳计算 datetime/year/month 列（CSV 加载和导入 HBase 共用）
+
+    Args:
+        ratings: ratings.csv 的数据
+
+    Returns:
+        pd.DataFrame: 增加了时间列的数据
+    """
+    ratings['datetime'] = pd.to_datetime(ratings['timestamp'], unit='s')
+    ratings['year'] = ratings['datetime'].dt.year
+    ratings['month'] = ratings['datetime'].dt.month
+    return ratings
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """计算文件内容的 SHA-1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_csv_cache_enabled():
+    """是否启用 CSV 列式缓存"""
+    return PARQUET_AVAILABLE and get_data_source_config().get('csv_cache', False)
+
+
+def _cache_paths(csv_path):
+    directory = os.path.join(os.path.dirname(csv_path), get_data_source_config()['csv_cache_dir'])
+    base = os.path.join(directory, os.path.basename(csv_path))
+    return directory, f"{base}.parquet", f"{base}.json"
+
+
+def _cache_is_valid(csv_path, meta_path, stat):
+    """
+    判断缓存是否仍然对应当前的 CSV 文件
+
+    大小和修改时间都相同时直接认为有效；只有修改时间变化（例如文件被重新复制）时
+    再比较内容哈希，内容未变则更新缓存中记录的修改时间。
+    """
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if meta.get('version') != CSV_CACHE_VERSION or meta.get('size') != stat.st_size:
+        return False
+    if meta.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if meta.get('sha1') != file_digest(csv_path):
+        return False
+
+    meta['mtime_ns'] = stat.st_mtime_ns
+    try:
+        write_json_atomic(meta, meta_path)
+    except OSError:
+        pass
+    return True
+
+
+def read_csv_cached(csv_path, prepare=None, **read_csv_kwargs):
+    """
+    读取 CSV 文件，优先使用列式缓存
+
+    Args:
+        csv_path: CSV 文件路径
+        prepare: 计算派生列的函数（可选），参数和返回值都是 DataFrame，结果一并写入缓存
+        **read_csv_kwargs: 传给 pd.read_csv 的参数
+
+    Returns:
+        pd.DataFrame: 数据
+    """
+    if not is_csv_cache_enabled():
+        df = pd.read_csv(csv_path, **read_csv_kwargs)
+        return prepare(df) if prepare else df
+
+    directory, data_path, meta_path = _cache_paths(csv_path)
+    stat = os.stat(csv_path)
+    if os.path.exists(data_path) and _cache_is_valid(csv_path, meta_path, stat):
+        try:
+            return pd.read_parquet(data_path)
+        except Exception as e:
+            print(f"读取缓存 {data_path} 失败，重新解析 CSV: {e}")
+
+    df = pd.read_csv(csv_path, **read_csv_kwargs)
+    if prepare:
+        df = prepare(df)
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        write_parquet_atomic(df, data_path)
+        write_json_atomic({
+            'version': CSV_CACHE_VERSION,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha1': file_digest(csv_path),
+            'rows': len(df),
+        }, meta_path)
+        print(f"已生成 {os.path.basename(csv_path)} 的列式缓存: {data_path}")
+    except OSError as e:
+        print(f"无法写入缓存 {data_path}: {e}")
+    return df
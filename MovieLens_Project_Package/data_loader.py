@@ -6,12 +6,18 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import streamlit as st
+import hashlib
 import os
+from search_index import NO_GENRES, MovieFilterIndex, TagIndex, TitleIndex
+from csv_cache import prepare_movies, prepare_ratings, read_csv_cached
+from hbase_config import get_data_source_config
 
 # 导入 HBase 配置（可选）
 try:
-    from hbase_config import is_hbase_enabled, get_data_source_config
-    from hbase_connector import get_hbase_connector
+    from hbase_config import is_hbase_enabled
+    from hbase_connector import get_hbase_connector, get_hbase_availability
+    from hbase_async import get_async_hbase_client
+    from snapshot_cache import get_snapshot_cache, is_snapshot_enabled
     HBASE_SUPPORT = True
 except ImportError:
     HBASE_SUPPORT = False
@@ -19,15 +25,193 @@ except ImportError:
 
 
 def _should_use_hbase():
-    """判断是否使用 HBase 作为数据源"""
+    """
+    判断是否使用 HBase 作为数据源
+    
+    HBase 不可达时熔断器处于断开状态，直接返回 False（走 CSV），
+    后台会按退避间隔重新探测，恢复后自动切回 HBase
+    """
     if not HBASE_SUPPORT:
         return False
     try:
-        return is_hbase_enabled()
+        return is_hbase_enabled() and get_hbase_availability().is_available()
     except:
         return False
 
 
+def _read_hbase_table(name, read_full, **incremental):
+    """
+    从 HBase 读取整表；启用本地快照时优先返回快照，快照过期后在后台刷新
+    
+    Args:
+        name: 快照名
+        read_full: 全量读取函数
+        **incremental: 增量刷新参数（read_delta、read_watermark、key_columns），见 SnapshotCache.load
+    
+    Returns:
+        pd.DataFrame: 表数据
+    """
+    if is_snapshot_enabled():
+        cache = get_snapshot_cache()
+        cache.add_refresh_listener(_clear_loader_cache)
+        return cache.load(name, read_full, **incremental)
+    return read_full()
+
+
+def _clear_loader_cache(name):
+    """
+    快照在后台刷新完成后清除对应的加载缓存，下一次运行时从新快照重新加载
+    （否则 cache_data / cache_resource 在过期前会一直返回刷新前的数据）
+    
+    Args:
+        name: 快照名
+    """
+    loaders = {'movies': load_movies, 'ratings': load_ratings, 'tags': load_tags}
+    if name in loaders:
+        loaders[name].clear()
+        load_dataset.clear()
+
+
+# 紧凑类型（DATA_SOURCE['compact_dtypes']）：ID 用 int32，年份 int16、月份 int8，类型组合用分类类型；
+# rating 用 float32 而不是 uint8 编码，半星评分可以精确表示，且各页面仍可直接对其求均值、画直方图
+MOVIES_COMPACT_DTYPES = {'movieId': 'int32', 'year': 'Int16', 'genres': 'category'}
+RATINGS_COMPACT_DTYPES = {'userId': 'int32', 'movieId': 'int32', 'rating': 'float32', 'year': 'int16', 'month': 'int8'}
+TAGS_COMPACT_DTYPES = {'userId': 'int32', 'movieId': 'int32'}
+
+
+def _compact(df, name, dtypes, string_columns=()):
+    """
+    按配置把数据转换为紧凑类型，并打印转换前后的内存占用
+    
+    Args:
+        df: 数据
+        name: 数据名称（用于打印）
+        dtypes: {列名: 紧凑类型}，不存在或无法转换的列保持原样
+        string_columns: 启用 DATA_SOURCE['arrow_strings'] 时转换为 Arrow 字符串的列
+    
+    Returns:
+        pd.DataFrame: 转换后的数据
+    """
+    config = get_data_source_config()
+    if not config.get('compact_dtypes', False) or df.empty:
+        return df
+    
+    before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+    targets = dict(dtypes)
+    if config.get('arrow_strings', False):
+        targets.update({column: 'string[pyarrow]' for column in string_columns})
+    for column, dtype in targets.items():
+        if column in df.columns:
+            try:
+                df[column] = df[column].astype(dtype)
+            except (TypeError, ValueError, ImportError) as e:
+                print(f"{name}的 {column} 列无法转换为 {dtype}: {e}")
+    
+    after = df.memory_usage(deep=True).sum()
+    print(f"{name}内存占用: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB")
+    return df
+
+
+def get_memory_report(**frames):
+    """
+    各数据逐列的内存占用
+    
+    Args:
+        **frames: {数据名称: DataFrame}
+    
+    Returns:
+        pd.DataFrame: 数据、列、类型、内存 (MB)
+    """
+    rows = []
+    for name, df in frames.items():
+        for column, usage in df.memory_usage(deep=True, index=False).items():
+            rows.append({'数据': name, '列': column, '类型': str(df[column].dtype), '内存 (MB)': usage / 2**20})
+    return pd.DataFrame(rows, columns=['数据', '列', '类型', '内存 (MB)'])
+
+
+class Dataset:
+    """
+    不可变的数据集句柄
+
+    持有电影、评分、标签数据和加载时计算一次的内容版本号。带缓存的统计函数以句柄为参数，
+    Streamlit 通过 DATASET_HASH_FUNCS 只对版本号求哈希，不再在每次调用时对整个
+    DataFrame 求哈希。句柄中的 DataFrame 约定为只读，需要修改时先 copy。
+    """
+    __slots__ = ('movies', 'ratings', 'tags', 'version')
+
+    def __init__(self, movies, ratings, tags, version=None):
+        """
+        Args:
+            movies: 电影数据
+            ratings: 评分数据
+            tags: 标签数据
+            version: 版本号（可选），不指定时按数据内容计算
+        """
+        object.__setattr__(self, 'movies', movies)
+        object.__setattr__(self, 'ratings', ratings)
+        object.__setattr__(self, 'tags', tags)
+        object.__setattr__(self, 'version', version or content_version(movies, ratings, tags))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Dataset 是不可变的")
+
+    def __repr__(self):
+        return (f"Dataset(movies={len(self.movies):,}, ratings={len(self.ratings):,}, "
+                f"tags={len(self.tags):,}, version={self.version[:12]})")
+
+    def with_ratings(self, ratings, key):
+        """
+        派生出评分经过筛选的数据集（版本号由当前版本号和筛选条件得到，不再计算内容哈希）
+
+        Args:
+            ratings: 从当前评分数据筛选出的评分
+            key: 描述筛选条件的字符串，同一数据集上相同的 key 必须对应相同的筛选结果
+
+        Returns:
+            Dataset: 派生的数据集
+        """
+        version = hashlib.sha1(f"{self.version}|{key}".encode('utf-8')).hexdigest()
+        return Dataset(self.movies, ratings, self.tags, version)
+
+
+# 缓存函数对 Dataset 参数只使用版本号作为缓存键
+DATASET_HASH_FUNCS = {Dataset: lambda dataset: dataset.version}
+
+
+def content_version(*frames):
+    """
+    数据内容的版本号：列名、类型和逐行哈希（pandas 的向量化哈希）的 SHA-1
+
+    Returns:
+        str: 版本号
+    """
+    digest = hashlib.sha1()
+    for df in frames:
+        digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@st.cache_resource(ttl=3600)
+def load_dataset(data_dir='ml-latest-small'):
+    """
+    加载数据集句柄
+    
+    句柄只读，用 cache_resource 在各次运行之间共享同一个对象，
+    不像 cache_data 那样每次重新运行都复制整个 DataFrame。
+    
+    Args:
+        data_dir: CSV文件目录（当使用CSV模式时）
+    
+    Returns:
+        Dataset: 数据集句柄
+    """
+    dataset = Dataset(load_movies(data_dir), load_ratings(data_dir), load_tags(data_dir))
+    print(f"数据集版本: {dataset.version[:12]}")
+    return dataset
+
+
 @st.cache_data
 def load_movies(data_dir='ml-latest-small'):
     """
@@ -43,21 +227,16 @@ def load_movies(data_dir='ml-latest-small'):
     if _should_use_hbase():
         try:
             connector = get_hbase_connector()
-            movies = connector.read_movies()
+            movies = _read_hbase_table('movies', connector.read_movies)
             print("从 HBase 加载电影数据")
-            return movies
+            return _compact(movies, '电影数据', MOVIES_COMPACT_DTYPES, ['title'])
         except Exception as e:
             print(f"从 HBase 加载失败，回退到 CSV: {e}")
     
-    # 默认从 CSV 文件加载
+    # 默认从 CSV 文件加载（派生列随列式缓存一起保存）
     movies_path = os.path.join(data_dir, 'movies.csv')
-    movies = pd.read_csv(movies_path)
-    
-    # 提取年份
-    movies['year'] = movies['title'].str.extract(r'\((\d{4})\)')
-    movies['year'] = pd.to_numeric(movies['year'], errors='coerce')
-    
-    return movies
+    movies = read_csv_cached(movies_path, prepare_movies)
+    return _compact(movies, '电影数据', MOVIES_COMPACT_DTYPES, ['title'])
 
 
 @st.cache_data(ttl=3600)
@@ -75,34 +254,102 @@ def load_ratings(data_dir='ml-latest-small'):
     if _should_use_hbase():
         try:
             connector = get_hbase_connector()
-            ratings = connector.read_ratings()
+            # 快照按 ratings_changes 表中的写入时间增量刷新（补录的旧评分同样能读到）
+            incremental = {}
+            if connector.config['change_log_enabled']:
+                incremental = dict(
+                    read_delta=connector.read_rating_changes,
+                    read_watermark=connector.rating_change_watermark,
+                    key_columns=['userId', 'movieId', 'timestamp']
+                )
+            ratings = _read_hbase_table('ratings', connector.read_ratings, **incremental)
             print("从 HBase 加载评分数据")
-            return ratings
+            return _compact(ratings, '评分数据', RATINGS_COMPACT_DTYPES)
         except Exception as e:
             print(f"从 HBase 加载失败，回退到 CSV: {e}")
     
-    # 默认从 CSV 文件加载
+    # 默认从 CSV 文件加载（派生列随列式缓存一起保存）
     ratings_path = os.path.join(data_dir, 'ratings.csv')
-    ratings = pd.read_csv(ratings_path)
+    ratings = read_csv_cached(ratings_path, prepare_ratings)
+    return _compact(ratings, '评分数据', RATINGS_COMPACT_DTYPES)
+
+
+@st.cache_data
+def load_tags(data_dir='ml-latest-small'):
+    """
+    加载标签数据
+    
+    Args:
+        data_dir: CSV文件目录（当使用CSV模式时）
     
-    # 转换时间戳
-    ratings['datetime'] = pd.to_datetime(ratings['timestamp'], unit='s')
-    ratings['year'] = ratings['datetime'].dt.year
-    ratings['month'] = ratings['datetime'].dt.month
+    Returns:
+        pd.DataFrame: 标签数据（userId、movieId、tag、timestamp），没有标签文件时为空表
+    """
+    # 如果启用了 HBase，从 HBase 加载
+    if _should_use_hbase():
+        try:
+            connector = get_hbase_connector()
+            tags = _read_hbase_table('tags', connector.read_tags)
+            print("从 HBase 加载标签数据")
+            return _compact(tags, '标签数据', TAGS_COMPACT_DTYPES, ['tag'])
+        except Exception as e:
+            print(f"从 HBase 加载失败，回退到 CSV: {e}")
     
-    return ratings
+    # 默认从 CSV 文件加载
+    tags_path = os.path.join(data_dir, 'tags.csv')
+    if not os.path.exists(tags_path):
+        return pd.DataFrame(columns=['userId', 'movieId', 'tag', 'timestamp'])
+    return _compact(read_csv_cached(tags_path), '标签数据', TAGS_COMPACT_DTYPES, ['tag'])
 
 
-@st.cache_data
-def get_merged_data(movies, ratings):
+@st.cache_resource(hash_funcs=DATASET_HASH_FUNCS)
+def get_tag_index(dataset):
+    """
+    构建标签倒排索引（每个数据集版本只构建一次，之后的查询不再扫描标签文本）
+    
+    Args:
+        dataset: 数据集句柄
+    
+    Returns:
+        TagIndex: 标签倒排索引
+    """
+    return TagIndex(dataset.tags)
+
+
+def search_movies_by_tag(movies, tag_index, tag, prefix=True):
+    """
+    按标签搜索电影
+    
+    Args:
+        movies: 电影数据
+        tag_index: 标签倒排索引
+        tag: 标签（大小写不敏感）
+        prefix: 是否按前缀匹配
+    
+    Returns:
+        pd.DataFrame: 匹配的电影，tag_count 列为匹配的标签次数，按次数从高到低排列
+    """
+    matches = tag_index.search(tag, prefix=prefix)
+    if matches.empty:
+        return movies.iloc[0:0].assign(tag_count=pd.Series(dtype=np.int64))
+    
+    result = movies.set_index('movieId').reindex(matches.index).dropna(subset=['title'])
+    result['tag_count'] = matches
+    return result.reset_index()
+
+
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_merged_data(dataset):
     """合并电影和评分数据"""
+    movies, ratings = dataset.movies, dataset.ratings
     merged = ratings.merge(movies, on='movieId', how='left')
     return merged
 
 
-@st.cache_data
-def get_basic_stats(movies, ratings):
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_basic_stats(dataset):
     """获取基本统计信息"""
+    movies, ratings = dataset.movies, dataset.ratings
     stats = {
         '电影总数': len(movies),
         '评分总数': len(ratings),
@@ -116,14 +363,75 @@ def get_basic_stats(movies, ratings):
     return stats
 
 
-@st.cache_data
-def get_top_movies(movies, ratings, n=20):
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_movie_aggregates(dataset):
+    """
+    每部电影的评分聚合表，各页面的评分数量、平均评分等统计都从这里按索引关联，
+    不再各自对原始评分做 groupby
+    
+    Args:
+        dataset: 数据集句柄
+    
+    Returns:
+        pd.DataFrame: 以 movieId 为索引，包含 rating_count、rating_sum、rating_sumsq、
+            avg_rating、min_rating、max_rating、latest_timestamp 列
+    """
+    ratings = dataset.ratings
+    # 以 float64 累加，避免紧凑类型 float32 的精度损失
+    rating = ratings['rating'].astype('float64')
+    columns = {'rating': rating, 'rating_sq': rating * rating}
+    if 'timestamp' in ratings.columns:
+        columns['timestamp'] = ratings['timestamp']
+    grouped = pd.DataFrame(columns).groupby(ratings['movieId'].to_numpy())
+    
+    aggregates = grouped['rating'].agg(
+        rating_count='count',
+        rating_sum='sum',
+        avg_rating='mean',
+        min_rating='min',
+        max_rating='max'
+    )
+    aggregates['rating_sumsq'] = grouped['rating_sq'].sum()
+    if 'timestamp' in columns:
+        aggregates['latest_timestamp'] = grouped['timestamp'].max()
+    aggregates.index.name = 'movieId'
+    order = ['rating_count', 'rating_sum', 'rating_sumsq', 'avg_rating', 'min_rating', 'max_rating', 'latest_timestamp']
+    return aggregates[[c for c in order if c in aggregates.columns]]
+
+
+def join_movie_aggregates(movies, aggregates, columns=('rating_count', 'avg_rating')):
+    """
+    为电影数据附加聚合统计列（按 movieId 索引关联）
+    
+    Args:
+        movies: 电影数据（任意子集）
+        aggregates: get_movie_aggregates 返回的聚合表
+        columns: 需要附加的列
+    
+    Returns:
+        pd.DataFrame: 附加统计列后的电影数据，没有评分的电影 rating_count 为 0
+    """
+    columns = list(columns)
+    # 避免列名冲突（HBase 模式的电影数据自带统计列）
+    result = movies.drop(columns=[c for c in columns if c in movies.columns])
+    stats = aggregates[columns].reindex(result['movieId'].to_numpy())
+    for column in columns:
+        result[column] = stats[column].to_numpy()
+    if 'rating_count' in columns:
+        result['rating_count'] = result['rating_count'].fillna(0).astype(int)
+    return result
+
+
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_top_movies(dataset, n=20):
     """获取评分最高的电影（至少有指定数量的评分）"""
     min_ratings = 50  # 最少评分数
+    movies = dataset.movies
     
     # 如果 movies 中已经包含统计信息（HBase 模式），直接使用
     if 'rating_count' in movies.columns and 'avg_rating' in movies.columns:
-        # 确保数据类型正确
+        # 确保数据类型正确（句柄中的数据只读，先复制）
+        movies = movies.copy()
         movies['rating_count'] = pd.to_numeric(movies['rating_count'], errors='coerce').fillna(0)
         movies['avg_rating'] = pd.to_numeric(movies['avg_rating'], errors='coerce').fillna(0)
         
@@ -131,11 +439,8 @@ def get_top_movies(movies, ratings, n=20):
         top_movies = top_movies.sort_values('avg_rating', ascending=False).head(n)
         return top_movies
     
-    # 否则从 ratings 计算
-    movie_stats = ratings.groupby('movieId').agg({
-        'rating': ['mean', 'count']
-    }).reset_index()
-    movie_stats.columns = ['movieId', 'avg_rating', 'rating_count']
+    # 否则使用预先计算的聚合表
+    movie_stats = get_movie_aggregates(dataset)[['avg_rating', 'rating_count']].reset_index()
     
     # 过滤评分数量少的电影
     movie_stats = movie_stats[movie_stats['rating_count'] >= min_ratings]
@@ -152,44 +457,127 @@ def get_top_movies(movies, ratings, n=20):
     return top_movies
 
 
-@st.cache_data
-def get_genre_stats(movies, ratings):
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_movie_genres(dataset):
+    """
+    电影 -> 类型的映射表（每部电影的每个类型一行，不含无类型的电影）
+    
+    Returns:
+        pd.DataFrame: movieId、genre（分类类型）
+    """
+    genres = dataset.movies[['movieId', 'genres']].dropna(subset=['genres'])
+    genres = genres.assign(genre=genres['genres'].astype(str).str.split('|')).explode('genre')
+    genres = genres[genres['genre'] != NO_GENRES]
+    return pd.DataFrame({
+        'movieId': genres['movieId'].to_numpy(),
+        'genre': pd.Categorical(genres['genre'].to_numpy()),
+    })
+
+
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_genre_ratings(dataset):
+    """
+    按类型展开的评分长表：每条评分在其电影的每个类型下各有一行
+    
+    只在加载后构建一次，类型统计、小提琴图等都基于这张表；row 列是评分在 ratings 中的
+    索引，页面对 ratings 的筛选通过 filter_genre_ratings 套用到这张表上。
+    
+    Returns:
+        pd.DataFrame: row、movieId、genre（分类类型）、rating
+    """
+    ratings = dataset.ratings
+    long_table = pd.DataFrame({
+        'row': ratings.index.to_numpy(),
+        'movieId': ratings['movieId'].to_numpy(),
+        'rating': ratings['rating'].to_numpy(),
+    }).merge(get_movie_genres(dataset), on='movieId')
+    return long_table[['row', 'movieId', 'genre', 'rating']]
+
+
+def filter_genre_ratings(genre_ratings, filtered_ratings):
+    """
+    只保留 filtered_ratings 中的评分
+    
+    Args:
+        genre_ratings: get_genre_ratings 的结果
+        filtered_ratings: 按行筛选后的 ratings（保留原索引）
+    
+    Returns:
+        pd.DataFrame: 筛选后的类型评分长表
+    """
+    return genre_ratings[genre_ratings['row'].isin(filtered_ratings.index)]
+
+
+def summarize_genre_ratings(genre_ratings):
+    """
+    按类型统计评分
+    
+    Returns:
+        pd.DataFrame: genre、avg_rating、count、std
+    """
+    genre_stats = genre_ratings.groupby('genre', observed=True)['rating'].agg(['mean', 'count', 'std']).reset_index()
+    genre_stats.columns = ['genre', 'avg_rating', 'count', 'std']
+    genre_stats['genre'] = genre_stats['genre'].astype(str)
+    return genre_stats
+
+
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_genre_stats(dataset):
     """获取类型统计"""
-    merged = get_merged_data(movies, ratings)
-    
-    # 展开类型
-    genre_ratings = []
-    for _, row in merged.iterrows():
-        if pd.notna(row['genres']) and row['genres'] != '(no genres listed)':
-            for genre in row['genres'].split('|'):
-                genre_ratings.append({
-                    'genre': genre,
-                    'rating': row['rating']
-                })
-    
-    genre_df = pd.DataFrame(genre_ratings)
-    
-    # 统计每个类型的评分
-    genre_stats = genre_df.groupby('genre').agg({
-        'rating': ['mean', 'count']
-    }).reset_index()
-    genre_stats.columns = ['genre', 'avg_rating', 'count']
-    genre_stats = genre_stats.sort_values('avg_rating', ascending=False)
+    genre_stats = summarize_genre_ratings(get_genre_ratings(dataset))
+    genre_stats = genre_stats[['genre', 'avg_rating', 'count']].sort_values('avg_rating', ascending=False)
     
     return genre_stats
 
 
-@st.cache_data
-def get_rating_distribution(ratings):
+@st.cache_resource(hash_funcs=DATASET_HASH_FUNCS)
+def get_movie_filter_index(dataset):
+    """
+    构建电影组合筛选索引（类型位图 + 年份、评分数量、平均评分数组）
+    
+    Args:
+        dataset: 数据集句柄
+    
+    Returns:
+        MovieFilterIndex: 筛选索引
+    """
+    return MovieFilterIndex(dataset.movies, get_movie_aggregates(dataset))
+
+
+def filter_movies(movies, filter_index, genres=None, match='any', year_range=None, min_ratings=0, min_avg=None):
+    """
+    按类型、年份、评分数量和平均评分组合筛选电影
+    
+    Args:
+        movies: 电影数据（与构建 filter_index 时相同）
+        filter_index: get_movie_filter_index 构建的索引
+        genres: 类型列表（可选）
+        match: 'any' 包含任一类型，'all' 包含全部类型
+        year_range: (开始, 结束) 年份闭区间（可选）
+        min_ratings: 最少评分数量
+        min_avg: 最低平均评分（可选）
+    
+    Returns:
+        pd.DataFrame: 匹配的电影，附带 rating_count、avg_rating 列，按评分数量从多到少排列
+    """
+    positions = filter_index.filter(genres, match, year_range, min_ratings, min_avg)
+    result = movies.iloc[positions].copy()
+    result['rating_count'] = filter_index.rating_counts[positions]
+    result['avg_rating'] = filter_index.avg_ratings[positions]
+    return result.sort_values(['rating_count', 'avg_rating'], ascending=False)
+
+
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_rating_distribution(dataset):
     """获取评分分布"""
-    rating_dist = ratings['rating'].value_counts().sort_index()
+    rating_dist = dataset.ratings['rating'].value_counts().sort_index()
     return rating_dist
 
 
-@st.cache_data
-def get_yearly_stats(ratings):
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_yearly_stats(dataset):
     """获取年度评分统计"""
-    yearly = ratings.groupby('year').agg({
+    yearly = dataset.ratings.groupby('year').agg({
         'rating': ['mean', 'count']
     }).reset_index()
     yearly.columns = ['year', 'avg_rating', 'count']
@@ -197,22 +585,65 @@ def get_yearly_stats(ratings):
     return yearly
 
 
-@st.cache_data
-def search_movies(movies, keyword):
-    """搜索电影"""
+@st.cache_resource(hash_funcs=DATASET_HASH_FUNCS)
+def get_title_index(dataset):
+    """
+    构建电影标题三元组倒排索引（每个数据集版本只构建一次）
+    
+    Args:
+        dataset: 数据集句柄
+    
+    Returns:
+        TitleIndex: 标题索引，匹配质量相同时按评分数量排列
+    """
+    return TitleIndex(dataset.movies, get_movie_aggregates(dataset)['rating_count'])
+
+
+def search_movies(dataset, keyword, limit=None):
+    """
+    搜索电影（基于标题索引，单次查询很快，不再按关键词缓存结果）
+    
+    Args:
+        dataset: 数据集句柄
+        keyword: 标题关键词，支持子串和拼写相近的模糊匹配
+        limit: 最多返回的数量（可选）
+    
+    Returns:
+        pd.DataFrame: 匹配的电影，match_quality 列为匹配质量（小于 1 表示模糊匹配），
+            按匹配质量、评分数量从高到低排列
+    """
+    movies = dataset.movies
     if not keyword:
         return movies
     
-    keyword_lower = keyword.lower()
-    mask = movies['title'].str.lower().str.contains(keyword_lower, na=False, regex=False)
-    return movies[mask]
+    matches = get_title_index(dataset).search(keyword, limit=limit)
+    return movies.iloc[matches.index].assign(match_quality=matches.to_numpy())
 
 
-@st.cache_data
-def get_movie_ratings(ratings, movies, movie_id):
-    """获取特定电影的评分详情"""
-    movie_ratings = ratings[ratings['movieId'] == movie_id]
-    movie_info = movies[movies['movieId'] == movie_id].iloc[0] if len(movies[movies['movieId'] == movie_id]) > 0 else None
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_movie_ratings(dataset, movie_id):
+    """获取特定电影的评分详情（评分按时间从新到旧排列）"""
+    movies, ratings = dataset.movies, dataset.ratings
+    movie_info = None
+    movie_ratings = None
+    
+    # HBase 模式下并发读取电影行和 ratings_by_movie 索引表的前缀扫描
+    if _should_use_hbase():
+        try:
+            client = get_async_hbase_client()
+            movie_info, movie_ratings = client.run(client.gather(
+                client.get_movie(movie_id),
+                client.get_movie_ratings(movie_id),
+            ))
+        except Exception as e:
+            print(f"从 HBase 读取电影详情失败，使用内存数据: {e}")
+    
+    # 索引表为空（例如旧数据尚未建立索引）时同样回退到内存数据
+    if movie_ratings is None or len(movie_ratings) == 0:
+        movie_ratings = ratings[ratings['movieId'] == movie_id].sort_values('timestamp', ascending=False)
+    
+    if movie_info is None and len(movies[movies['movieId'] == movie_id]) > 0:
+        movie_info = movies[movies['movieId'] == movie_id].iloc[0]
     
     if movie_info is None or len(movie_ratings) == 0:
         return None, None
@@ -230,10 +661,21 @@ def get_movie_ratings(ratings, movies, movie_id):
     return stats, movie_ratings
 
 
-@st.cache_data
-def get_user_stats(ratings, movies, user_id):
+@st.cache_data(hash_funcs=DATASET_HASH_FUNCS)
+def get_user_stats(dataset, user_id):
     """获取特定用户的评分统计"""
-    user_ratings = ratings[ratings['userId'] == user_id]
+    movies, ratings = dataset.movies, dataset.ratings
+    user_ratings = None
+    
+    # HBase 模式下按行键前缀只扫描该用户的评分，而不是在整表中过滤
+    if _should_use_hbase():
+        try:
+            user_ratings = get_hbase_connector().read_ratings(user_ids=[user_id])
+        except Exception as e:
+            print(f"从 HBase 读取用户评分失败，使用内存数据: {e}")
+    
+    if user_ratings is None:
+        user_ratings = ratings[ratings['userId'] == user_id]
     
     if len(user_ratings) == 0:
         return None, None
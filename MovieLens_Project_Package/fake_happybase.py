@@ -0,0 +1,587 @@
+"""
+进程内的 HBase 替身
+提供与 happybase 兼容的 Connection/Table/Batch 接口，数据保存在进程内的有序映射中，
+用于在没有 HBase + Thrift 服务的机器上运行和压测 HBaseConnector、导入和校验脚本。
+
+启用方式: 设置环境变量 HBASE_BACKEND=memory（或 HBASE_CONFIG['backend'] = 'memory'）
+
+支持的功能:
+  - scan 的 row_start/row_stop/row_prefix/columns/filter/limit/reverse/batch_size
+  - row/rows、put/delete、batch、计数器
+  - 过滤器语言子集：KeyOnlyFilter、FirstKeyOnlyFilter、PrefixFilter、RowFilter、
+    SingleColumnValueFilter，以及 AND/OR/括号
+  - 可注入的往返延迟（configure(latency=...)）和不可用状态（configure(available=False)）
+  - Region 按行数自动切分（configure(region_max_rows=...)），模拟 HBase 按大小切分 Region；
+    也可以用 set_region_splits 固定切分点
+"""
+import bisect
+import re
+import struct
+import threading
+import time
+from collections import namedtuple
+
+
+class TException(Exception):
+    """对应 thriftpy2 的 TException"""
+
+
+class TTransportException(TException):
+    """连接失败"""
+
+
+class IOError(TException):
+    """服务端错误（表不存在、过滤器非法等）"""
+
+
+# 全局设置，模拟 Thrift 服务器的行为
+_settings = {
+    'latency': 0.0,          # 每次 RPC 往返的延迟（秒）
+    'connect_latency': 0.0,  # 建立连接的延迟（秒）
+    'available': True,       # False 时连接失败
+    'region_max_rows': 20000,  # 单个 Region 的行数超过该值后自动切分
+}
+
+# 进程内的"服务器"：表名 -> _TableData
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def configure(**settings):
+    """
+    修改替身的行为
+
+    Args:
+        latency: 每次 RPC 往返的延迟（秒）
+        connect_latency: 建立连接的延迟（秒）
+        available: 是否可以连接
+        region_max_rows: 单个 Region 的最大行数，超过后自动切分
+    """
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise TypeError(f"未知的设置项: {sorted(unknown)}")
+    _settings.update(settings)
+
+
+def reset():
+    """清空所有表并恢复默认设置"""
+    with _tables_lock:
+        _tables.clear()
+    _settings.update(latency=0.0, connect_latency=0.0, available=True, region_max_rows=20000)
+
+
+def set_region_splits(name, splits):
+    """固定表的 Region 切分点（不再自动切分），用于模拟预分区的表"""
+    _get_table_data(_ensure_bytes(name)).splits = sorted(_ensure_bytes(s) for s in splits)
+
+
+def _ensure_bytes(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+def _round_trip():
+    """模拟一次 RPC 往返"""
+    if _settings['latency']:
+        time.sleep(_settings['latency'])
+
+
+def _get_table_data(name):
+    try:
+        return _tables[name]
+    except KeyError:
+        raise IOError(f"表不存在: {name.decode()}")
+
+
+class _TableData:
+    """单张表的数据：行键 -> {列: 值}，行键顺序在扫描时按需排序"""
+
+    def __init__(self, families):
+        self.families = families
+        self.rows = {}
+        self.splits = []
+        self.enabled = True
+        self.lock = threading.Lock()
+        self._sorted_keys = []
+        self._dirty = False
+
+    def sorted_keys(self):
+        with self.lock:
+            if self._dirty:
+                self._sorted_keys = sorted(self.rows)
+                self._dirty = False
+            return self._sorted_keys
+
+    def put(self, row, data):
+        with self.lock:
+            cells = self.rows.get(row)
+            if cells is None:
+                cells = self.rows[row] = {}
+                self._dirty = True
+            cells.update(data)
+
+    def delete(self, row, columns=None):
+        with self.lock:
+            if row not in self.rows:
+                return
+            if columns is None:
+                del self.rows[row]
+                self._dirty = True
+                return
+            cells = self.rows[row]
+            for column in columns:
+                cells.pop(column, None)
+            if not cells:
+                del self.rows[row]
+                self._dirty = True
+
+
+class Connection:
+    """happybase.Connection 的替身"""
+
+    def __init__(self, host='localhost', port=9090, timeout=None, autoconnect=True,
+                 table_prefix=None, **kwargs):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.table_prefix = _ensure_bytes(table_prefix) if table_prefix else None
+        self._refresh_thrift_client()
+        if autoconnect:
+            self.open()
+
+    def _refresh_thrift_client(self):
+        self.transport = _Transport(self)
+
+    def _table_name(self, name):
+        name = _ensure_bytes(name)
+        if self.table_prefix is None:
+            return name
+        return self.table_prefix + b'_' + name
+
+    def open(self):
+        self.transport.open()
+
+    def close(self):
+        self.transport.close()
+
+    def _check_open(self):
+        if not self.transport.is_open():
+            raise TTransportException("连接未打开")
+
+    def table(self, name, use_prefix=True):
+        return Table(self._table_name(name) if use_prefix else _ensure_bytes(name), self)
+
+    def tables(self):
+        self._check_open()
+        _round_trip()
+        names = sorted(_tables)
+        if self.table_prefix is not None:
+            prefix = self.table_prefix + b'_'
+            names = [n[len(prefix):] for n in names if n.startswith(prefix)]
+        return names
+
+    def create_table(self, name, families):
+        self._check_open()
+        _round_trip()
+        if not families:
+            raise ValueError("至少需要一个列族")
+        name = self._table_name(name)
+        with _tables_lock:
+            if name in _tables:
+                raise IOError(f"表已存在: {name.decode()}")
+            _tables[name] = _TableData({_ensure_bytes(f): dict(o) for f, o in families.items()})
+
+    def delete_table(self, name, disable=False):
+        self._check_open()
+        _round_trip()
+        name = self._table_name(name)
+        data = _get_table_data(name)
+        if data.enabled and not disable:
+            raise IOError(f"表未禁用: {name.decode()}")
+        with _tables_lock:
+            del _tables[name]
+
+    def enable_table(self, name):
+        _get_table_data(self._table_name(name)).enabled = True
+
+    def disable_table(self, name):
+        _get_table_data(self._table_name(name)).enabled = False
+
+    def is_table_enabled(self, name):
+        return _get_table_data(self._table_name(name)).enabled
+
+    def compact_table(self, name, major=False):
+        _get_table_data(self._table_name(name))
+
+
+class _Transport:
+    """模拟 Thrift 传输层的打开/关闭状态"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._open = False
+
+    def is_open(self):
+        return self._open
+
+    def open(self):
+        if self._open:
+            return
+        if _settings['connect_latency']:
+            time.sleep(_settings['connect_latency'])
+        if not _settings['available']:
+            raise TTransportException(
+                f"Could not connect to ('{self._connection.host}', {self._connection.port})")
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+
+class Table:
+    """happybase.Table 的替身"""
+
+    def __init__(self, name, connection):
+        self.name = name
+        self.connection = connection
+
+    def __repr__(self):
+        return f"<fake_happybase.Table name={self.name!r}>"
+
+    def _data(self):
+        self.connection._check_open()
+        return _get_table_data(self.name)
+
+    def families(self):
+        return dict(self._data().families)
+
+    def regions(self):
+        data = self._data()
+        _round_trip()
+        splits = data.splits
+        if not splits:
+            # 与 HBase 按大小自动切分 Region 类似：每 region_max_rows 行一个 Region
+            keys = data.sorted_keys()
+            splits = keys[_settings['region_max_rows']::_settings['region_max_rows']]
+        bounds = [b''] + list(splits) + [b'']
+        return [
+            {'start_key': start, 'end_key': end, 'id': i, 'name': self.name, 'version': 1,
+             'server_name': b'localhost', 'port': 16020}
+            for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+        ]
+
+    def row(self, row, columns=None, timestamp=None, include_timestamp=False):
+        data = self._data()
+        _round_trip()
+        cells = data.rows.get(_ensure_bytes(row), {})
+        return _project(cells, columns)
+
+    def rows(self, rows, columns=None, timestamp=None, include_timestamp=False):
+        data = self._data()
+        _round_trip()
+        result = []
+        for row in rows:
+            cells = data.rows.get(_ensure_bytes(row))
+            if cells:
+                result.append((row, _project(cells, columns)))
+        return result
+
+    def scan(self, row_start=None, row_stop=None, row_prefix=None, columns=None, filter=None,
+             timestamp=None, include_timestamp=False, batch_size=1000, scan_batching=None,
+             limit=None, sorted_columns=False, reverse=False):
+        if batch_size < 1:
+            raise ValueError("'batch_size' must be >= 1")
+        if limit is not None and limit < 1:
+            raise ValueError("'limit' must be >= 1")
+        if row_prefix is not None:
+            if row_start is not None or row_stop is not None:
+                raise TypeError("'row_prefix' cannot be combined with 'row_start' or 'row_stop'")
+            row_start = row_prefix
+            row_stop = _prefix_stop(row_prefix)
+
+        data = self._data()
+        predicate, transforms = _parse_filter(filter)
+        return self._scanner(data, row_start, row_stop, columns, predicate, transforms,
+                             batch_size, limit, reverse)
+
+    def _scanner(self, data, row_start, row_stop, columns, predicate, transforms,
+                 batch_size, limit, reverse):
+        keys = data.sorted_keys()
+        if reverse:
+            # 反向扫描时 row_start 在字典序上位于 row_stop 之后
+            hi = bisect.bisect_right(keys, row_start) if row_start else len(keys)
+            lo = bisect.bisect_right(keys, row_stop) if row_stop else 0
+            positions = range(hi - 1, lo - 1, -1)
+        else:
+            lo = bisect.bisect_left(keys, row_start) if row_start else 0
+            hi = bisect.bisect_left(keys, row_stop) if row_stop else len(keys)
+            positions = range(lo, hi)
+
+        returned = 0
+        in_batch = 0
+        _round_trip()
+        for pos in positions:
+            key = keys[pos]
+            cells = data.rows.get(key)
+            if cells is None or not predicate(key, cells):
+                continue
+            cells = _project(cells, columns)
+            if not cells:
+                continue
+            for transform in transforms:
+                cells = transform(cells)
+            yield key, cells
+
+            returned += 1
+            if limit is not None and returned >= limit:
+                return
+            in_batch += 1
+            if in_batch >= batch_size:
+                in_batch = 0
+                _round_trip()
+
+    def put(self, row, data, timestamp=None, wal=True):
+        with self.batch(timestamp=timestamp, wal=wal) as batch:
+            batch.put(row, data)
+
+    def delete(self, row, columns=None, timestamp=None, wal=True):
+        with self.batch(timestamp=timestamp, wal=wal) as batch:
+            batch.delete(row, columns)
+
+    def batch(self, timestamp=None, batch_size=None, transaction=False, wal=True):
+        return Batch(self, timestamp, batch_size, transaction, wal)
+
+    def counter_get(self, row, column):
+        return self.counter_inc(row, column, value=0)
+
+    def counter_set(self, row, column, value=0):
+        self.put(row, {_ensure_bytes(column): struct.pack('>q', value)})
+
+    def counter_inc(self, row, column, value=1):
+        data = self._data()
+        _round_trip()
+        row, column = _ensure_bytes(row), _ensure_bytes(column)
+        with data.lock:
+            cells = data.rows.get(row)
+            if cells is None:
+                cells = data.rows[row] = {}
+                data._dirty = True
+            current = struct.unpack('>q', cells[column])[0] if column in cells else 0
+            current += value
+            cells[column] = struct.pack('>q', current)
+        return current
+
+    def counter_dec(self, row, column, value=1):
+        return self.counter_inc(row, column, -value)
+
+
+class Batch:
+    """happybase.Batch 的替身，send() 计为一次 RPC 往返"""
+
+    def __init__(self, table, timestamp=None, batch_size=None, transaction=False, wal=True):
+        if batch_size is not None:
+            if transaction:
+                raise TypeError("'transaction' cannot be used when 'batch_size' is specified")
+            if not batch_size > 0:
+                raise ValueError("'batch_size' must be > 0")
+        self._table = table
+        self._batch_size = batch_size
+        self._transaction = transaction
+        self._mutations = []
+
+    def send(self):
+        if not self._mutations:
+            return
+        data = self._table._data()
+        _round_trip()
+        for kind, row, payload in self._mutations:
+            if kind == 'put':
+                data.put(row, payload)
+            else:
+                data.delete(row, payload)
+        self._mutations = []
+
+    def put(self, row, data, wal=None):
+        self._mutations.append(('put', _ensure_bytes(row),
+                                {_ensure_bytes(k): _ensure_bytes(v) for k, v in data.items()}))
+        if self._batch_size and len(self._mutations) >= self._batch_size:
+            self.send()
+
+    def delete(self, row, columns=None, wal=None):
+        columns = [_ensure_bytes(c) for c in columns] if columns is not None else None
+        self._mutations.append(('delete', _ensure_bytes(row), columns))
+        if self._batch_size and len(self._mutations) >= self._batch_size:
+            self.send()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._transaction and exc_type is not None:
+            return
+        self.send()
+
+
+def _prefix_stop(prefix):
+    """计算前缀扫描的结束行键"""
+    prefix = prefix.rstrip(b'\xff')
+    if not prefix:
+        return None
+    return prefix[:-1] + bytes([prefix[-1] + 1])
+
+
+def _project(cells, columns):
+    """按 columns（b'cf:qualifier' 或 b'cf'）裁剪单元格"""
+    if not columns:
+        return dict(cells)
+    wanted = [_ensure_bytes(c) for c in columns]
+    families = tuple(c + b':' for c in wanted if b':' not in c)
+    wanted = set(wanted)
+    return {k: v for k, v in cells.items() if k in wanted or (families and k.startswith(families))}
+
+
+# --------------------------------------------------------------------------
+# 过滤器语言子集
+# --------------------------------------------------------------------------
+
+_Token = namedtuple('_Token', ['kind', 'value'])
+_TOKEN_RE = re.compile(rb"\s*(?:(?P<str>'(?:[^']|'')*')|(?P<op><=|>=|!=|=|<|>)|"
+                       rb"(?P<punct>[(),])|(?P<word>[A-Za-z_][A-Za-z0-9_]*)|(?P<num>-?\d+))", re.S)
+
+_COMPARE = {
+    b'=': lambda a, b: a == b,
+    b'!=': lambda a, b: a != b,
+    b'<': lambda a, b: a < b,
+    b'<=': lambda a, b: a <= b,
+    b'>': lambda a, b: a > b,
+    b'>=': lambda a, b: a >= b,
+}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise IOError(f"无法解析的过滤器: {text[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'str':
+            value = value[1:-1].replace(b"''", b"'")
+        tokens.append(_Token(kind, value))
+        pos = match.end()
+    return tokens
+
+
+class _FilterParser:
+    """把过滤器字符串解析为 (行谓词, 单元格变换列表)"""
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.transforms = []
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise IOError("过滤器意外结束")
+        self.pos += 1
+        return token
+
+    def _expect(self, value):
+        token = self._next()
+        if token.value != value:
+            raise IOError(f"过滤器语法错误，期望 {value!r}，实际 {token.value!r}")
+
+    def parse(self):
+        predicate = self._or()
+        if self._peek() is not None:
+            raise IOError(f"过滤器语法错误: {self._peek().value!r}")
+        return predicate, self.transforms
+
+    def _or(self):
+        terms = [self._and()]
+        while self._peek() is not None and self._peek().value.upper() == b'OR':
+            self._next()
+            terms.append(self._and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda key, cells: any(term(key, cells) for term in terms)
+
+    def _and(self):
+        terms = [self._atom()]
+        while self._peek() is not None and self._peek().value.upper() == b'AND':
+            self._next()
+            terms.append(self._atom())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda key, cells: all(term(key, cells) for term in terms)
+
+    def _atom(self):
+        token = self._next()
+        if token.value == b'(':
+            predicate = self._or()
+            self._expect(b')')
+            return predicate
+        if token.kind != 'word':
+            raise IOError(f"过滤器语法错误: {token.value!r}")
+        self._expect(b'(')
+        args = []
+        while self._peek() is not None and self._peek().value != b')':
+            args.append(self._next().value)
+            if self._peek() is not None and self._peek().value == b',':
+                self._next()
+        self._expect(b')')
+        return self._build(token.value.decode(), args)
+
+    def _build(self, name, args):
+        if name == 'KeyOnlyFilter':
+            self.transforms.append(lambda cells: {k: b'' for k in cells})
+            return lambda key, cells: True
+        if name == 'FirstKeyOnlyFilter':
+            self.transforms.append(lambda cells: dict([min(cells.items())]) if cells else cells)
+            return lambda key, cells: True
+        if name == 'PrefixFilter':
+            prefix = args[0]
+            return lambda key, cells: key.startswith(prefix)
+        if name == 'RowFilter':
+            test = _comparator(args[0], args[1])
+            return lambda key, cells: test(key)
+        if name == 'SingleColumnValueFilter':
+            column = args[0] + b':' + args[1]
+            test = _comparator(args[2], args[3])
+            filter_if_missing = len(args) > 4 and args[4].lower() == b'true'
+
+            def predicate(key, cells):
+                if column not in cells:
+                    return not filter_if_missing
+                return test(cells[column])
+            return predicate
+        raise IOError(f"替身不支持该过滤器: {name}")
+
+
+def _comparator(op, spec):
+    """构造 op + 比较器（binary/binaryprefix/regexstring/substring）的测试函数"""
+    compare = _COMPARE[op]
+    kind, _, operand = spec.partition(b':')
+    if kind == b'binary':
+        return lambda value: compare(value, operand)
+    if kind == b'binaryprefix':
+        return lambda value: compare(value[:len(operand)], operand)
+    if kind == b'regexstring':
+        pattern = re.compile(operand, re.S)
+        return lambda value: compare(bool(pattern.search(value)), True)
+    if kind == b'substring':
+        needle = operand.lower()
+        return lambda value: compare(needle in value.lower(), True)
+    raise IOError(f"替身不支持该比较器: {kind.decode()}")
+
+
+def _parse_filter(filter_string):
+    if filter_string is None:
+        return (lambda key, cells: True), []
+    return _FilterParser(_ensure_bytes(filter_string)).parse()
@@ -0,0 +1,108 @@
+"""
+HBase 异步访问模块
+在专用线程池中执行阻塞的 happybase 调用，让页面渲染时的多个独立读取并发进行
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from hbase_config import get_hbase_config
+from hbase_connector import get_hbase_connector
+
+
+class AsyncHBaseClient:
+    """
+    HBaseConnector 的 asyncio 封装
+
+    每个方法都是协程，实际的 Thrift 调用在专用线程池中执行，线程数即最大
+    并发数（默认等于连接池大小，保证每个线程都能拿到独立的连接）。
+
+    用法::
+
+        client = get_async_hbase_client()
+        movie, ratings = client.run(client.gather(
+            client.get_movie(1),
+            client.get_movie_ratings(1, limit=20),
+        ))
+    """
+
+    def __init__(self, connector=None, max_concurrency=None):
+        """
+        初始化异步客户端
+
+        Args:
+            connector: HBaseConnector 实例，默认使用全局单例
+            max_concurrency: 最大并发调用数，默认为 HBASE_CONFIG['pool_size']
+        """
+        self.connector = connector or get_hbase_connector()
+        self.max_concurrency = max_concurrency or get_hbase_config()['pool_size']
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix='hbase-async'
+        )
+
+    async def _call(self, func, *args, **kwargs):
+        """在专用线程池中执行阻塞调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def get_movie(self, movie_id):
+        """读取单部电影，见 HBaseConnector.read_movie"""
+        return await self._call(self.connector.read_movie, movie_id)
+
+    async def get_movie_ratings(self, movie_id, limit=None):
+        """通过索引表读取电影评分，见 HBaseConnector.read_movie_ratings"""
+        return await self._call(self.connector.read_movie_ratings, movie_id, limit=limit)
+
+    async def scan_ratings(self, **kwargs):
+        """读取评分数据，参数同 HBaseConnector.read_ratings"""
+        return await self._call(self.connector.read_ratings, **kwargs)
+
+    async def scan_movies(self):
+        """读取全部电影，见 HBaseConnector.read_movies"""
+        return await self._call(self.connector.read_movies)
+
+    async def gather(self, *aws, return_exceptions=False):
+        """并发等待多个读取，按传入顺序返回结果"""
+        return list(await asyncio.gather(*aws, return_exceptions=return_exceptions))
+
+    async def fetch(self, **named):
+        """
+        并发执行多个命名的读取
+
+        Args:
+            **named: 名称到协程的映射
+
+        Returns:
+            dict: 名称到结果的映射
+        """
+        results = await asyncio.gather(*named.values())
+        return dict(zip(named, results))
+
+    def run(self, coro):
+        """
+        在同步代码（例如 Streamlit 页面脚本）中执行协程并返回结果
+
+        当前线程已有运行中的事件循环时不能使用，请直接 await。
+        """
+        return asyncio.run(coro)
+
+    def close(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False)
+
+
+# 全局异步客户端实例（单例模式）
+_async_client = None
+_async_client_lock = threading.Lock()
+
+
+def get_async_hbase_client():
+    """获取异步客户端实例（单例）"""
+    global _async_client
+    if _async_client is None:
+        with _async_client_lock:
+            if _async_client is None:
+                _async_client = AsyncHBaseClient()
+    return _async_client
@@ -10,11 +10,21 @@ HBASE_CONFIG = {
     'port': 9099,
     'timeout': 3000,
     
+    # 后端实现：'thrift' 连接真实的 HBase Thrift 服务，
+    # 'memory' 使用进程内的替身 fake_happybase（离线压测和调试用）
+    'backend': 'thrift',
+    
     # 表名配置
     'tables': {
         'movies': 'movies',
         'ratings': 'ratings',
-        'tags': 'tags'
+        'tags': 'tags',
+        # 按电影组织的评分二级索引表，行键为 movieId + 反转时间戳 + userId
+        'ratings_by_movie': 'ratings_by_movie',
+        # 标签倒排索引表，行键为 归一化标签 + \x00 + movieId
+        'tag_index': 'tags_by_tag',
+        # 评分变更日志表，行键为 写入时间 + ratings 行键，本地快照据此增量刷新
+        'ratings_changes': 'ratings_changes'
     },
     
     # 列族配置
@@ -27,6 +37,15 @@ HBASE_CONFIG = {
         },
         'tags': {
             'info': ['userId', 'movieId', 'tag', 'timestamp']
+        },
+        'ratings_by_movie': {
+            'info': ['r']
+        },
+        'tag_index': {
+            'info': ['t', 'n']
+        },
+        'ratings_changes': {
+            'info': ['w']
         }
     },
     
@@ -36,14 +55,115 @@ HBASE_CONFIG = {
     # 批量写入配置
     'batch_size': 1000,
     
+    # 增量同步（import_to_hbase.py --sync）：检查点文件路径和每个数据块的行数
+    'sync_checkpoint': '.hbase_sync_checkpoint.json',
+    'sync_chunk_rows': 20000,
+    # 全量导入时单个数据块的内存上限（MB），据此自动确定每块的行数
+    'import_memory_limit_mb': 256,
+    
+    # ratings 表的存储格式版本：1 为字符串格式（默认），2 为紧凑的二进制格式
+    # 两种格式可以在同一张表中共存，读取时自动识别
+    'ratings_format': 1,
+    
+    # ratings 表行键布局：'text' 为 "userId_movieId_timestamp" 字符串（默认），
+    # 'binary' 为定长大端二进制，可按用户ID范围扫描
+    'rating_key_layout': 'text',
+    # binary 布局下的盐值分桶数（0 表示不加盐），用于分散批量导入时的写入热点
+    'rating_key_salt_buckets': 0,
+    
+    # 写入评分时是否同时维护 ratings_by_movie 索引表
+    'movie_index_enabled': True,
+    
+    # 导入标签时是否同时维护 tags_by_tag 倒排索引表
+    'tag_index_enabled': True,
+    
+    # 写入评分时是否同时写 ratings_changes 变更日志表（关闭后 ratings 快照只能全量刷新）
+    'change_log_enabled': True,
+    
     # 连接池配置
     'pool_size': 10,
+    # 从连接池获取连接的最长等待时间（秒），None 表示一直等待
+    'pool_timeout': 30,
+    # 连接空闲超过该时间（秒）后，借出前先做一次健康检查
+    'keepalive_interval': 60,
+    
+    # 可用性探测：TCP 连接检查的超时时间（毫秒），以及不可用时的重试间隔（秒，逐次翻倍直到上限）
+    'probe_timeout': 500,
+    'probe_backoff': 5,
+    'probe_backoff_max': 300,
+    
+    # 并行扫描的线程数（同时受 pool_size 限制），1 表示顺序扫描
+    'scan_workers': 4,
+    
+    # 建表时使用的配置方案，见 TABLE_PROFILES
+    'table_profile': 'default',
+    
+    # 本地快照（snapshot_cache.py）：从 HBase 读取的整表保存为 Parquet，冷启动时直接读取
+    'snapshot_enabled': True,
+    'snapshot_dir': '.hbase_snapshots',
+    # 快照超过该时间（秒）后在后台增量刷新（ratings 按 ratings_changes 表中的写入时间读取新写入的行）
+    'snapshot_max_age': 300,
+    # 增量刷新无法反映删除，超过该时间（秒）后改为全量刷新
+    'snapshot_full_refresh_interval': 86400,
+}
+
+# 建表配置方案：每张表 info 列族的属性和预分区数
+#   compression / bloom_filter_type / in_memory / max_versions 通过 Thrift 接口设置；
+#   block_size 和预分区（regions > 1）Thrift 接口不支持，需要通过 hbase shell 建表，
+#   找不到 hbase 命令时只打印对应的建表语句
+TABLE_PROFILES = {
+    # 默认配置只使用 Thrift 接口支持且不依赖本地压缩库的属性，任何 HBase 上都可以直接建表
+    'default': {
+        'movies': {'max_versions': 1, 'bloom_filter_type': 'ROW', 'in_memory': True},
+        'ratings': {'max_versions': 1, 'bloom_filter_type': 'ROW'},
+        'ratings_by_movie': {'max_versions': 1, 'bloom_filter_type': 'ROW'},
+        'tags': {'max_versions': 1, 'bloom_filter_type': 'ROW'},
+        'tag_index': {'max_versions': 1, 'bloom_filter_type': 'ROW', 'in_memory': True},
+        # 变更日志只在下一次全量刷新快照之前有用，保留 7 天后由 HBase 自动清除
+        'ratings_changes': {'max_versions': 1, 'time_to_live': 604800},
+    },
+    # 生产配置（需要 Snappy 本地库，按需通过 table_profile / HBASE_TABLE_PROFILE 启用）：
+    # movies 表小且以点查为主，使用较小的块并常驻内存；ratings 表以扫描为主，预分区以分散导入写入
+    'production': {
+        'movies': {
+            'max_versions': 1, 'compression': 'SNAPPY', 'bloom_filter_type': 'ROW',
+            'block_size': 16384, 'in_memory': True, 'regions': 1,
+        },
+        'ratings': {
+            'max_versions': 1, 'compression': 'SNAPPY', 'bloom_filter_type': 'ROW',
+            'block_size': 65536, 'in_memory': False, 'regions': 8,
+        },
+        'ratings_by_movie': {
+            'max_versions': 1, 'compression': 'SNAPPY', 'bloom_filter_type': 'ROW',
+            'block_size': 65536, 'in_memory': False, 'regions': 4,
+        },
+        'tags': {
+            'max_versions': 1, 'compression': 'SNAPPY', 'bloom_filter_type': 'ROW',
+            'block_size': 65536, 'in_memory': False, 'regions': 1,
+        },
+        'tag_index': {
+            'max_versions': 1, 'compression': 'SNAPPY', 'bloom_filter_type': 'ROW',
+            'block_size': 16384, 'in_memory': True, 'regions': 1,
+        },
+        'ratings_changes': {
+            'max_versions': 1, 'compression': 'SNAPPY', 'time_to_live': 604800,
+            'block_size': 65536, 'in_memory': False, 'regions': 1,
+        },
+    },
+    # 不设置任何属性（HBase 默认值）
+    'minimal': {},
 }
 
 # 数据源配置
 DATA_SOURCE = {
     'type': 'hbase',  # 可选: 'csv' 或 'hbase'
     'csv_dir': 'ml-latest-small',  # CSV 文件目录
+    # CSV 列式缓存（csv_cache.py）：解析结果连同派生列保存为 Parquet，放在 CSV 旁边的该目录中
+    'csv_cache': True,
+    'csv_cache_dir': '.cache',
+    # 加载后把数据转换为紧凑类型（见 data_loader.py），以及是否把标题、标签等文本列转换为 Arrow 字符串
+    'compact_dtypes': True,
+    'arrow_strings': True,
 }
 
 
@@ -75,6 +195,23 @@ def get_table_name(table_type):
     return HBASE_CONFIG['tables'].get(table_type, '')
 
 
+def get_table_profile(table_type, profile=None):
+    """
+    获取建表配置
+    
+    Args:
+        table_type: 表类型 ('movies', 'ratings', 'tags', 'ratings_by_movie', 'tag_index', 'ratings_changes')
+        profile: 配置方案名，默认为 HBASE_CONFIG['table_profile']
+    
+    Returns:
+        dict: 列族属性和预分区数
+    """
+    profile = profile or HBASE_CONFIG.get('table_profile', 'default')
+    if profile not in TABLE_PROFILES:
+        raise ValueError(f"未知的建表配置方案: {profile}")
+    return dict(TABLE_PROFILES[profile].get(table_type, {}))
+
+
 def get_column_family(table_type):
     """
     获取列族配置
@@ -97,6 +234,15 @@ def load_config_from_env():
     if os.getenv('HBASE_PORT'):
         HBASE_CONFIG['port'] = int(os.getenv('HBASE_PORT'))
     
+    if os.getenv('HBASE_BACKEND'):
+        HBASE_CONFIG['backend'] = os.getenv('HBASE_BACKEND')
+    
+    if os.getenv('HBASE_TABLE_PROFILE'):
+        HBASE_CONFIG['table_profile'] = os.getenv('HBASE_TABLE_PROFILE')
+    
+    if os.getenv('HBASE_SNAPSHOT_ENABLED'):
+        HBASE_CONFIG['snapshot_enabled'] = os.getenv('HBASE_SNAPSHOT_ENABLED').lower() == 'true'
+    
     if os.getenv('HBASE_ENABLED'):
         HBASE_CONFIG['enabled'] = os.getenv('HBASE_ENABLED').lower() == 'true'
     
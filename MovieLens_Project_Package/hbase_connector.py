@@ -2,25 +2,1150 @@
 HBase 连接器模块
 提供 HBase 数据库的连接和操作功能
 """
+import contextlib
+import hashlib
+import os
+import queue
+import shutil
+import socket
+import struct
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
 import pandas as pd
-from hbase_config import get_hbase_config, get_table_name, get_column_family, is_hbase_enabled
+from hbase_config import get_hbase_config, get_table_name, get_column_family, get_table_profile, is_hbase_enabled
+from search_index import normalize_tag, normalize_tags
 
 # 注意：这里使用条件导入，避免在未安装 happybase 时报错
 try:
-    import happybase
+    if get_hbase_config().get('backend') == 'memory':
+        import fake_happybase as happybase
+        from fake_happybase import TTransportException
+    else:
+        import happybase
+        from thriftpy2.transport import TTransportException
     HAPPYBASE_AVAILABLE = True
 except ImportError:
     HAPPYBASE_AVAILABLE = False
+    TTransportException = OSError
     print("Warning: happybase not installed. HBase功能不可用，将使用CSV模式。")
 
+# 传输层错误（连接断开、超时等），出现时连接不再可用；
+# 表不存在、过滤器语法错误等应用层的 Thrift 异常不在其中，直接抛给调用方
+TRANSPORT_ERRORS = (TTransportException, socket.error, socket.timeout)
+
+
+class NoConnectionsAvailable(RuntimeError):
+    """在等待时间内无法从连接池获取到连接"""
+
+
+class HBaseConnectionPool:
+    """
+    线程安全的 HBase 连接池
+
+    池中最多保持 size 个 happybase.Connection，连接按需懒加载。
+    借出前对空闲过久的连接做健康检查，Thrift 层出错时自动重建连接。
+    同一线程内嵌套借用会复用同一个连接，避免在池容量较小时自锁。
+    """
+
+    def __init__(self, size, host, port, timeout=None, keepalive_interval=60):
+        """
+        初始化连接池
+
+        Args:
+            size: 连接池容量
+            host: Thrift 服务器地址
+            port: Thrift 服务器端口
+            timeout: socket 超时时间（毫秒）
+            keepalive_interval: 空闲多少秒后借出前需要健康检查
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError("连接池容量必须是正整数")
+
+        self.size = size
+        self.keepalive_interval = keepalive_interval
+        self._queue = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        self._last_used = {}
+        self._closed = False
+
+        for _ in range(size):
+            connection = happybase.Connection(
+                host=host,
+                port=port,
+                timeout=timeout,
+                autoconnect=False
+            )
+            self._queue.put(connection)
+
+        # 立即打开第一个连接，尽早暴露地址或端口配置错误
+        with self.connection():
+            pass
+
+    def _acquire(self, timeout=None):
+        """从池中取出一个连接"""
+        if self._closed:
+            raise ConnectionError("HBase 连接池已关闭")
+        try:
+            return self._queue.get(True, timeout)
+        except queue.Empty:
+            raise NoConnectionsAvailable(f"{timeout} 秒内没有可用的 HBase 连接")
+
+    def _release(self, connection):
+        """归还连接到池中（连接池已关闭时直接关闭该连接）"""
+        if self._closed:
+            connection.close()
+            return
+        self._last_used[id(connection)] = time.monotonic()
+        self._queue.put(connection)
+
+    def _reset(self, connection):
+        """丢弃底层 Thrift 客户端，下次借出时再重新打开"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        connection._refresh_thrift_client()
+
+    def _ensure_healthy(self, connection):
+        """打开连接，并对空闲过久的连接做一次轻量的健康检查"""
+        if not connection.transport.is_open():
+            connection.open()
+            return
+
+        last_used = self._last_used.get(id(connection))
+        if last_used is None or time.monotonic() - last_used < self.keepalive_interval:
+            return
+
+        try:
+            connection.tables()
+        except TRANSPORT_ERRORS:
+            print("HBase 连接健康检查失败，正在重新连接")
+            self._reset(connection)
+            connection.open()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """
+        从连接池借出一个连接（必须用作 with 上下文管理器）
+
+        Args:
+            timeout: 等待可用连接的秒数，None 表示一直等待
+
+        Yields:
+            happybase.Connection: 可用的连接
+        """
+        connection = getattr(self._local, 'current', None)
+        if connection is not None:
+            # 同一线程内的嵌套借用，直接复用外层的连接
+            yield connection
+            return
+
+        connection = self._acquire(timeout)
+        self._local.current = connection
+        try:
+            self._ensure_healthy(connection)
+            try:
+                yield connection
+            except TRANSPORT_ERRORS:
+                # 传输层出错后无法确定连接是否仍然可用，直接重建
+                print("HBase 连接异常，已重建该连接")
+                self._reset(connection)
+                raise
+        finally:
+            del self._local.current
+            self._release(connection)
+
+    def close(self):
+        """关闭池中所有空闲连接"""
+        self._closed = True
+        while True:
+            try:
+                connection = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+
+
+class HBaseAvailability:
+    """
+    HBase 可用性探测（熔断器）
+
+    用一次短超时的 TCP 连接判断 Thrift 服务是否可达，并缓存结果：
+      - 可达时直接返回 True，直到有读写失败调用 record_failure()
+      - 不可达时在退避期内直接返回 False，不再阻塞调用方；
+        退避期结束后在后台线程中重新探测，每次失败退避时间翻倍，直到上限
+    """
+
+    def __init__(self, host, port, probe_timeout=500, backoff=5, max_backoff=300, probe=None):
+        """
+        初始化可用性探测
+
+        Args:
+            host: Thrift 服务器地址
+            port: Thrift 服务器端口
+            probe_timeout: 探测超时时间（毫秒）
+            backoff: 首次失败后的重试间隔（秒）
+            max_backoff: 重试间隔上限（秒）
+            probe: 自定义探测函数，返回 bool；默认为 TCP 连接检查
+        """
+        self.host = host
+        self.port = port
+        self.probe_timeout = probe_timeout
+        self.initial_backoff = backoff
+        self.max_backoff = max_backoff
+        self._probe = probe or self._tcp_probe
+        self._lock = threading.Lock()
+        self._available = None
+        self._backoff = backoff
+        self._retry_at = 0.0
+        self._probing = False
+
+    def _tcp_probe(self):
+        """尝试建立 TCP 连接，成功即认为 Thrift 服务可达"""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=self.probe_timeout / 1000):
+                return True
+        except OSError:
+            return False
+
+    def is_available(self):
+        """
+        返回缓存的可用性，不会阻塞（仅首次调用会做一次短超时探测）
+
+        Returns:
+            bool: HBase 是否可用
+        """
+        with self._lock:
+            available = self._available
+            retry_due = available is False and time.monotonic() >= self._retry_at
+
+        if available is None:
+            return self.check()
+        if retry_due:
+            self._check_in_background()
+        return available
+
+    def check(self):
+        """立即探测一次并更新状态"""
+        if self._probe():
+            self.record_success()
+            return True
+        self.record_failure()
+        return False
+
+    def _check_in_background(self):
+        with self._lock:
+            if self._probing:
+                return
+            self._probing = True
+
+        def run():
+            try:
+                self.check()
+            finally:
+                self._probing = False
+
+        threading.Thread(target=run, name='hbase-probe', daemon=True).start()
+
+    def record_success(self):
+        """标记为可用，并重置退避时间"""
+        with self._lock:
+            if self._available is False:
+                print(f"HBase 已恢复: {self.host}:{self.port}")
+            self._available = True
+            self._backoff = self.initial_backoff
+
+    def record_failure(self, error=None):
+        """标记为不可用，在退避期内不再尝试连接"""
+        with self._lock:
+            if self._available is not False:
+                reason = f": {error}" if error else ""
+                print(f"HBase 不可用{reason}，{self._backoff} 秒后重试")
+            self._available = False
+            self._retry_at = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+
+
+_hbase_availability = None
+_hbase_availability_lock = threading.Lock()
+
+
+def get_hbase_availability():
+    """获取 HBase 可用性探测实例（单例）"""
+    global _hbase_availability
+    if _hbase_availability is None:
+        with _hbase_availability_lock:
+            if _hbase_availability is None:
+                config = get_hbase_config()
+                probe = None
+                if config.get('backend') == 'memory':
+                    probe = partial(_connection_probe, config)
+                _hbase_availability = HBaseAvailability(
+                    host=config['host'],
+                    port=config['port'],
+                    probe_timeout=config['probe_timeout'],
+                    backoff=config['probe_backoff'],
+                    max_backoff=config['probe_backoff_max'],
+                    probe=probe
+                )
+    return _hbase_availability
+
+
+def _connection_probe(config):
+    """通过打开一个 happybase 连接来探测（用于没有 TCP 端口的后端）"""
+    try:
+        happybase.Connection(host=config['host'], port=config['port'],
+                             timeout=config['probe_timeout']).close()
+        return True
+    except Exception:
+        return False
+
+
+# 各表列的目标类型，ColumnarScanDecoder 据此一次性完成类型转换
+MOVIES_COLUMN_TYPES = {
+    'title': 'str',
+    'genres': 'str',
+    'year': 'int',
+}
+
+TAGS_COLUMN_TYPES = {
+    'userId': 'int',
+    'movieId': 'int',
+    'tag': 'str',
+    'timestamp': 'int',
+}
+
+# datetime/year/month 是由 timestamp 派生的列，读取时直接由 timestamp 计算，
+# 不再解析存储的字符串（类型为 None 表示解码时跳过）。
+# 单字母列限定符是第 2 版二进制存储格式的列，见 RATINGS_FORMAT_BINARY。
+RATINGS_COLUMN_TYPES = {
+    'userId': 'int',
+    'movieId': 'int',
+    'rating': 'float',
+    'timestamp': 'int',
+    'datetime': None,
+    'year': None,
+    'month': None,
+    'u': ('userId', 'uint32'),
+    'm': ('movieId', 'uint32'),
+    'r': ('rating', 'rating_x2'),
+    't': ('timestamp', 'uint32'),
+}
+
+
+# ratings 表的全部列，以及可以直接从行键（见 RatingKeyCodec）得到的列
+RATINGS_COLUMNS = ['userId', 'movieId', 'rating', 'timestamp', 'datetime', 'year', 'month']
+RATINGS_KEY_COLUMNS = {'userId', 'movieId', 'timestamp', 'datetime', 'year', 'month'}
+RATINGS_DERIVED_COLUMNS = {'datetime', 'year', 'month'}
+
+# ratings 表的存储格式版本：
+#   1 - 所有列（含派生列）都以 UTF-8 字符串存储在同名列中
+#   2 - 数值列以定长大端二进制存储在单字母列中（u/m/t 为 4 字节无符号整数，
+#       r 为 1 字节的 rating*2），派生列不再存储。列限定符本身就是格式标记，
+#       同一张表中两种格式的行可以共存，读取时自动识别。
+RATINGS_FORMAT_TEXT = 1
+RATINGS_FORMAT_BINARY = 2
+RATINGS_BINARY_QUALIFIERS = {'userId': 'u', 'movieId': 'm', 'rating': 'r', 'timestamp': 't'}
+
+
+class ColumnarScanDecoder:
+    """
+    HBase scan 结果的列式解码器
+
+    扫描时按预先计算好的列限定符映射，把每个单元格的原始字节直接放入
+    对应列的预分配缓冲区（第 n 行写到下标 n，缺失单元格保持 None），
+    扫描结束后每列只做一次向量化类型转换，再一次性构建 DataFrame。
+    多个列限定符可以映射到同一输出列（例如新旧两种存储格式），
+    解码后按行合并。不在 column_types 中的列按字符串处理。
+    """
+
+    def __init__(self, column_types, family='info', key_column=None,
+                 key_type='int', initial_capacity=1024):
+        """
+        初始化解码器
+
+        Args:
+            column_types: {列限定符: 类型} 或 {列限定符: (输出列名, 类型)}，类型为
+                'int'/'float'/'str'/'datetime'/'bytes'/'uint32'/'rating_x2'，
+                None 表示跳过该列
+            family: 列族名
+            key_column: 若指定，则把行键解码后放入该列
+            key_type: 行键列的类型
+            initial_capacity: 缓冲区初始容量，不足时按倍数扩容
+        """
+        self.family = family
+        self.key_column = key_column
+        self.key_type = key_type
+        self._capacity = max(int(initial_capacity), 1)
+        self._count = 0
+        self._keys = [None] * self._capacity if key_column else None
+        self._specs = {}
+        self._buffers = {}
+        for name, spec in column_types.items():
+            if not isinstance(spec, tuple):
+                spec = (name, spec)
+            self._add_column(f"{family}:{name}".encode(), spec)
+
+    def _add_column(self, qualifier, spec=None):
+        """为新的列限定符分配缓冲区"""
+        buffer = [None] * self._capacity
+        self._buffers[qualifier] = buffer
+        self._specs[qualifier] = spec or (qualifier.decode().split(':', 1)[-1], 'str')
+        return buffer
+
+    def _grow(self):
+        """缓冲区容量翻倍"""
+        padding = [None] * self._capacity
+        for buffer in self._buffers.values():
+            buffer.extend(padding)
+        if self._keys is not None:
+            self._keys.extend(padding)
+        self._capacity *= 2
+
+    def feed(self, rows):
+        """
+        消费 scan 结果
+
+        Args:
+            rows: 可迭代的 (row_key, {列限定符: 值}) 序列，例如 table.scan()
+
+        Returns:
+            ColumnarScanDecoder: self，便于链式调用
+        """
+        buffers = self._buffers
+        keys = self._keys
+        n = self._count
+        for key, cells in rows:
+            if n == self._capacity:
+                self._grow()
+            if keys is not None:
+                keys[n] = key
+            for qualifier, value in cells.items():
+                buffer = buffers.get(qualifier)
+                if buffer is None:
+                    buffer = self._add_column(qualifier)
+                buffer[n] = value
+            n += 1
+        self._count = n
+        return self
+
+    def __len__(self):
+        return self._count
+
+    def to_frame(self):
+        """
+        按最终类型构建 DataFrame
+
+        Returns:
+            pd.DataFrame: 解码后的数据
+        """
+        n = self._count
+        data = {}
+        if self._keys is not None:
+            data[self.key_column] = _convert_cells(self._keys[:n], self.key_type)
+
+        groups = {}
+        for qualifier, buffer in self._buffers.items():
+            name, kind = self._specs[qualifier]
+            if kind is not None:
+                groups.setdefault(name, []).append((buffer[:n], kind))
+
+        for name, sources in groups.items():
+            # 跳过整列为空的备选格式，只在确有两种格式的数据时才逐行合并
+            present = [(values, kind) for values, kind in sources if values.count(None) < n]
+            present = present or sources[:1]
+            column = _convert_cells(*present[0])
+            if len(present) > 1:
+                merged = pd.Series(column)
+                for values, kind in present[1:]:
+                    merged = merged.fillna(pd.Series(_convert_cells(values, kind)))
+                if merged.notna().all() and all(kind in _INTEGER_KINDS for _, kind in present):
+                    merged = merged.astype(np.int64)
+                column = merged.to_numpy()
+            data[name] = column
+        return pd.DataFrame(data, index=pd.RangeIndex(n))
+
+
+# 解码结果为整数的类型（有缺失值时退化为浮点）
+_INTEGER_KINDS = {'int', 'uint32'}
+
+# 定长二进制列的 numpy 类型（大端）
+_FIXED_WIDTH_TYPES = {
+    'uint32': np.dtype('>u4'),
+    'rating_x2': np.dtype('u1'),
+}
+
+
+def _convert_cells(values, kind):
+    """
+    把一列原始字节值一次性转换为目标类型
+
+    Args:
+        values: bytes 或 None 组成的列表
+        kind: 'int'/'float'/'str'/'datetime'/'bytes'/'uint32'/'rating_x2'
+
+    Returns:
+        np.ndarray 或 pd.Series: 转换后的列
+    """
+    if kind == 'bytes':
+        return np.array(values, dtype=object)
+
+    has_missing = None in values
+    if kind == 'str':
+        if has_missing:
+            return np.array([v.decode() if v is not None else None for v in values], dtype=object)
+        return np.array([v.decode() for v in values], dtype=object)
+
+    if kind == 'datetime':
+        decoded = [v.decode() if v is not None else None for v in values]
+        return pd.to_datetime(pd.Series(decoded, dtype=object), errors='coerce').to_numpy()
+
+    if kind in _FIXED_WIDTH_TYPES:
+        return _unpack_fixed_width(values, _FIXED_WIDTH_TYPES[kind], kind, has_missing)
+
+    if has_missing:
+        values = [b'nan' if v is None else v for v in values]
+    raw = np.array(values, dtype=bytes)
+    try:
+        if kind == 'int' and not has_missing:
+            return raw.astype(np.int64)
+        return raw.astype(np.float64)
+    except ValueError:
+        # 存在无法解析的脏数据时退回逐个解析，非法值置为 NaN
+        decoded = pd.Series(np.char.decode(raw), dtype=object)
+        return pd.to_numeric(decoded, errors='coerce').to_numpy()
+
+
+def _unpack_fixed_width(values, dtype, kind, has_missing):
+    """把定长大端二进制单元格拼接后一次性解包，缺失或长度不对的单元格置为 NaN"""
+    width = dtype.itemsize
+    invalid = None
+    if has_missing or any(len(v) != width for v in values if v is not None):
+        invalid = np.array([v is None or len(v) != width for v in values])
+        values = [b'\x00' * width if bad else v for v, bad in zip(values, invalid)]
+
+    column = np.frombuffer(b''.join(values), dtype=dtype)
+    if kind == 'rating_x2':
+        column = column / 2.0
+    elif invalid is None:
+        return column.astype(np.int64)
+    else:
+        column = column.astype(np.float64)
+
+    if invalid is not None:
+        column[invalid] = np.nan
+    return column
+
+
+def encode_rating_cells(ratings_df):
+    """
+    按第 2 版二进制格式向量化地生成评分单元格
+
+    Args:
+        ratings_df: 包含 userId、movieId、rating、timestamp 列的 DataFrame
+
+    Returns:
+        list: 与 ratings_df 行顺序一致的 {列限定符: 值} 列表
+    """
+    columns = {
+        b'info:u': _pack_column(ratings_df['userId'], '>u4'),
+        b'info:m': _pack_column(ratings_df['movieId'], '>u4'),
+        b'info:r': _pack_column(_rating_codes(ratings_df['rating']), 'u1'),
+        b'info:t': _pack_column(ratings_df['timestamp'], '>u4'),
+    }
+    return [dict(zip(columns, cells)) for cells in zip(*columns.values())]
+
+
+def encode_text_rating_cells(ratings_df):
+    """
+    按第 1 版字符串格式向量化地生成评分单元格（datetime/year/month 列存在时一并写入，缺失值跳过）
+
+    Args:
+        ratings_df: 包含 userId、movieId、rating、timestamp 列的 DataFrame
+
+    Returns:
+        list: 与 ratings_df 行顺序一致的 {列限定符: 值} 列表
+    """
+    columns = {
+        b'info:userId': _format_column(ratings_df['userId'], 'int'),
+        b'info:movieId': _format_column(ratings_df['movieId'], 'int'),
+        b'info:rating': _format_column(ratings_df['rating'], 'float'),
+        b'info:timestamp': _format_column(ratings_df['timestamp'], 'int'),
+    }
+    for name, kind in [('datetime', 'datetime'), ('year', 'int'), ('month', 'int')]:
+        if name in ratings_df:
+            columns[f'info:{name}'.encode()] = _format_column(ratings_df[name], kind)
+    return _rows_from_columns(columns)
+
+
+def encode_movie_cells(movies_df):
+    """
+    向量化地生成电影单元格
+
+    Args:
+        movies_df: 包含 movieId、title、genres 列（year 列可选）的 DataFrame
+
+    Returns:
+        tuple: (行键列表, 与行键对应的 {列限定符: 值} 列表)
+    """
+    columns = {
+        b'info:title': _format_column(movies_df['title'], 'str'),
+        b'info:genres': _format_column(movies_df['genres'], 'str'),
+    }
+    if 'year' in movies_df:
+        columns[b'info:year'] = _format_column(movies_df['year'], 'int')
+    return _format_column(movies_df['movieId'], 'int'), _rows_from_columns(columns)
+
+
+def _format_column(values, kind):
+    """把一列值转换为 UTF-8 字符串字节列表，缺失值为 None"""
+    values = pd.Series(values)
+    missing = values.isna().to_numpy()
+    if kind == 'int':
+        values = values.fillna(0).astype(np.int64)
+    if kind == 'datetime' and pd.api.types.is_datetime64_any_dtype(values):
+        # 与 str(pd.Timestamp) 的格式一致（秒级精度），比逐个格式化快得多
+        texts = np.char.replace(np.datetime_as_string(values.to_numpy('datetime64[s]'), unit='s'), 'T', ' ')
+        texts = texts.tolist()
+    else:
+        texts = values.astype(str).tolist()
+    encoded = [text.encode() for text in texts]
+    if missing.any():
+        for i in np.flatnonzero(missing):
+            encoded[i] = None
+    return encoded
+
+
+def _rows_from_columns(columns):
+    """把按列组织的单元格转换为逐行的 dict 列表"""
+    qualifiers = list(columns)
+    rows = zip(*columns.values())
+    if any(None in cells for cells in columns.values()):
+        return [{q: v for q, v in zip(qualifiers, cells) if v is not None} for cells in rows]
+    return [dict(zip(qualifiers, cells)) for cells in rows]
+
+
+def _rating_codes(ratings):
+    """把评分转换为 1 字节编码（rating*2）"""
+    codes = np.rint(np.asarray(ratings, dtype=np.float64) * 2)
+    if ((codes < 0) | (codes > 255)).any():
+        raise ValueError("评分超出二进制格式可表示的范围（0-127.5）")
+    return codes
+
+
+def _pack_column(values, dtype):
+    """把一列数值转换为定长大端字节串列表"""
+    raw = np.asarray(values).astype(dtype).tobytes()
+    width = np.dtype(dtype).itemsize
+    return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+
+class RatingKeyCodec:
+    """
+    ratings 表行键编解码器
+
+    支持两种布局：
+      - 'text'：旧的 "userId_movieId_timestamp" 字符串，按字典序排列
+      - 'binary'：[可选的 1 字节盐值] + 4 字节 userId + 4 字节 movieId + 4 字节 timestamp，
+        均为大端无符号整数，按数值排列，可以按 userId 做范围扫描
+
+    盐值取 userId % salt_buckets，同一用户的评分始终落在同一个分桶内并保持
+    连续，而相邻用户分散到不同分桶，批量导入时写入压力分摊到多个 Region。
+    """
+
+    LAYOUTS = ('text', 'binary')
+
+    def __init__(self, layout='text', salt_buckets=0):
+        """
+        初始化编解码器
+
+        Args:
+            layout: 行键布局，'text' 或 'binary'
+            salt_buckets: 盐值分桶数，0 表示不加盐（仅 binary 布局支持）
+        """
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"不支持的行键布局: {layout}")
+        if not 0 <= int(salt_buckets) <= 256:
+            raise ValueError("盐值分桶数必须在 0-256 之间")
+        if layout == 'text' and salt_buckets:
+            raise ValueError("text 行键布局不支持加盐")
+
+        self.layout = layout
+        self.salt_buckets = int(salt_buckets)
+        fields = [('userId', '>u4'), ('movieId', '>u4'), ('timestamp', '>u4')]
+        if self.salt_buckets:
+            fields.insert(0, ('salt', 'u1'))
+        self._dtype = np.dtype(fields)
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 HBASE_CONFIG 创建编解码器"""
+        return cls(config.get('rating_key_layout', 'text'), config.get('rating_key_salt_buckets', 0))
+
+    @property
+    def width(self):
+        """binary 布局的行键长度（字节）"""
+        return self._dtype.itemsize
+
+    def _salt(self, user_id):
+        return int(user_id) % self.salt_buckets
+
+    def encode(self, user_id, movie_id, timestamp):
+        """编码单个行键"""
+        return self.encode_many([user_id], [movie_id], [timestamp])[0]
+
+    def encode_many(self, user_ids, movie_ids, timestamps):
+        """
+        向量化地编码一批行键
+
+        Args:
+            user_ids: 用户ID序列
+            movie_ids: 电影ID序列
+            timestamps: 时间戳序列
+
+        Returns:
+            list: bytes 行键列表
+        """
+        user_ids = np.asarray(user_ids).astype(np.int64)
+        movie_ids = np.asarray(movie_ids).astype(np.int64)
+        timestamps = np.asarray(timestamps).astype(np.int64)
+
+        if self.layout == 'text':
+            return [
+                f"{user_id}_{movie_id}_{ts}".encode()
+                for user_id, movie_id, ts in zip(user_ids.tolist(), movie_ids.tolist(), timestamps.tolist())
+            ]
+
+        records = np.empty(len(user_ids), dtype=self._dtype)
+        if self.salt_buckets:
+            records['salt'] = user_ids % self.salt_buckets
+        records['userId'] = user_ids
+        records['movieId'] = movie_ids
+        records['timestamp'] = timestamps
+        raw = records.tobytes()
+        width = self.width
+        return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+    def decode_many(self, keys):
+        """
+        把一批行键解码为 userId、movieId、timestamp 三列
+
+        Args:
+            keys: bytes 行键列表
+
+        Returns:
+            pd.DataFrame: 解码结果
+        """
+        if self.layout == 'text':
+            parts = np.array([key.split(b'_') for key in keys], dtype=bytes).reshape(-1, 3)
+            return pd.DataFrame({
+                'userId': parts[:, 0].astype(np.int64),
+                'movieId': parts[:, 1].astype(np.int64),
+                'timestamp': parts[:, 2].astype(np.int64),
+            })
+
+        records = np.frombuffer(b''.join(keys), dtype=self._dtype)
+        if len(records) != len(keys):
+            raise ValueError("存在长度不符合 binary 布局的行键")
+        return pd.DataFrame({
+            'userId': records['userId'].astype(np.int64),
+            'movieId': records['movieId'].astype(np.int64),
+            'timestamp': records['timestamp'].astype(np.int64),
+        })
+
+    def user_prefix(self, user_id):
+        """某个用户全部评分的行键前缀"""
+        if self.layout == 'text':
+            return f"{int(user_id)}_".encode()
+        prefix = struct.pack('>I', int(user_id))
+        if self.salt_buckets:
+            prefix = bytes([self._salt(user_id)]) + prefix
+        return prefix
+
+    def user_range_scans(self, start, stop):
+        """
+        把 [start, stop) 用户ID范围转换为行键区间（仅 binary 布局）
+
+        加盐时每个分桶各对应一个区间。
+
+        Returns:
+            list: [(row_start, row_stop), ...]
+        """
+        if self.layout == 'text':
+            raise ValueError("text 行键布局不能按用户ID范围扫描")
+        start = struct.pack('>I', max(int(start), 0))
+        stop = struct.pack('>I', min(int(stop), 2 ** 32 - 1))
+        if not self.salt_buckets:
+            return [(start, stop)]
+        return [(bytes([salt]) + start, bytes([salt]) + stop) for salt in range(self.salt_buckets)]
+
+    def salt_split_points(self):
+        """加盐布局下各分桶的起始行键，可作为建表时的预分区点"""
+        return [bytes([salt]) for salt in range(1, self.salt_buckets)]
+
+
+# ratings_by_movie 索引表的行键：movieId + 反转时间戳 + userId（均为大端 uint32），
+# 同一电影的评分连续存放且按时间从新到旧排列，"最新 N 条" 就是前缀扫描的前 N 行
+MOVIE_INDEX_KEY_DTYPE = np.dtype([('movieId', '>u4'), ('reverse_ts', '>u4'), ('userId', '>u4')])
+_MAX_UINT32 = 2 ** 32 - 1
+
+
+def encode_movie_index_keys(movie_ids, timestamps, user_ids):
+    """
+    向量化地生成 ratings_by_movie 索引表的行键
+
+    Returns:
+        list: bytes 行键列表
+    """
+    records = np.empty(len(movie_ids), dtype=MOVIE_INDEX_KEY_DTYPE)
+    records['movieId'] = np.asarray(movie_ids).astype(np.int64)
+    records['reverse_ts'] = _MAX_UINT32 - np.asarray(timestamps).astype(np.int64)
+    records['userId'] = np.asarray(user_ids).astype(np.int64)
+    raw = records.tobytes()
+    width = MOVIE_INDEX_KEY_DTYPE.itemsize
+    return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+
+def decode_movie_index_keys(keys):
+    """
+    把 ratings_by_movie 索引表的行键解码为 userId、movieId、timestamp 三列
+
+    Returns:
+        pd.DataFrame: 解码结果
+    """
+    records = np.frombuffer(b''.join(keys), dtype=MOVIE_INDEX_KEY_DTYPE)
+    return pd.DataFrame({
+        'userId': records['userId'].astype(np.int64),
+        'movieId': records['movieId'].astype(np.int64),
+        'timestamp': _MAX_UINT32 - records['reverse_ts'].astype(np.int64),
+    })
+
+
+# ratings_changes 变更日志表的行键：写入时间（毫秒，大端 uint64）+ ratings 表的行键，
+# 按写入时间有序，读取某个时刻之后写入的评分只需从该时刻开始做一次区间扫描
+CHANGE_LOG_TIME = struct.Struct('>Q')
+# 多个写入方之间允许的时钟偏差（毫秒）：增量读取时从高水位往前多读这么长时间，重复的行由调用方去重
+CHANGE_LOG_OVERLAP_MS = 60000
+
+
+def split_key_space(first, last, parts):
+    """
+    在两个行键之间按字节值线性插值出 parts - 1 个切分点
+
+    先去掉两者的公共前缀，再把随后的 8 个字节看作大端整数做插值。
+
+    Args:
+        first: 最小行键
+        last: 最大行键
+        parts: 期望切分出的区间数
+
+    Returns:
+        list: 严格递增的切分点（行键）
+    """
+    prefix = os.path.commonprefix([first, last])
+    low = int.from_bytes(first[len(prefix):len(prefix) + 8].ljust(8, b'\x00'), 'big')
+    high = int.from_bytes(last[len(prefix):len(prefix) + 8].ljust(8, b'\x00'), 'big')
+    splits = []
+    for i in range(1, parts):
+        point = prefix + (low + (high - low) * i // parts).to_bytes(8, 'big')
+        if first < point <= last and (not splits or point > splits[-1]):
+            splits.append(point)
+    return splits
+
+
+def _to_unix_seconds(value):
+    """把时间点转换为 Unix 秒数"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return int(np.ceil(value))
+    return int(np.ceil(pd.Timestamp(value).timestamp()))
+
+
+def _value_filter(qualifier, op, comparator):
+    """构造 info 列族上的 SingleColumnValueFilter（列缺失的行会被过滤掉）"""
+    # 过滤器语言中字符串内的单引号需要写成两个
+    comparator = comparator.replace(b"'", b"''")
+    return (b"SingleColumnValueFilter('info', '" + qualifier.encode() + b"', "
+            + op.encode() + b", '" + comparator + b"', true, true)")
+
+
+def _any_of(clauses):
+    """用 OR 连接多个过滤条件"""
+    return clauses[0] if len(clauses) == 1 else b'(' + b' OR '.join(clauses) + b')'
+
+
+def _all_of(clauses):
+    """用 AND 连接多个过滤条件"""
+    return clauses[0] if len(clauses) == 1 else b'(' + b' AND '.join(clauses) + b')'
+
+
+def _numeric_string_range_filter(qualifier, start=None, stop=None):
+    """
+    为以十进制字符串存储的非负整数列构造 [start, stop) 范围过滤器
+
+    HBase 按字节比较单元格值，只有位数相同的十进制字符串才能按字典序
+    正确比较大小，所以按位数拆成若干段，每段限定位数后再比较。
+    """
+    low = max(int(start), 0) if start is not None else 0
+    if stop is not None and int(stop) <= low:
+        return _value_filter(qualifier, '=', b'regexstring:^$')
+    high = int(stop) - 1 if stop is not None else None
+
+    min_digits = len(str(low))
+    max_digits = len(str(high)) if high is not None else 19
+    clauses = []
+    for digits in range(min_digits, max_digits + 1):
+        parts = [_value_filter(qualifier, '=', f"regexstring:^[0-9]{{{digits}}}$".encode())]
+        if digits == min_digits and low > 0:
+            parts.append(_value_filter(qualifier, '>=', f"binary:{low}".encode()))
+        if high is not None and digits == max_digits:
+            parts.append(_value_filter(qualifier, '<=', f"binary:{high}".encode()))
+        clauses.append(_all_of(parts))
+    return _any_of(clauses)
+
+
+def _binary_range_filter(qualifier, start=None, stop=None):
+    """为定长大端无符号整数列构造 [start, stop) 范围过滤器，字节序即数值序"""
+    parts = []
+    if start is not None:
+        parts.append(_value_filter(qualifier, '>=', b'binary:' + struct.pack('>I', max(int(start), 0))))
+    if stop is not None:
+        if int(stop) <= 0:
+            return _value_filter(qualifier, '=', b'regexstring:^$')
+        parts.append(_value_filter(qualifier, '<', b'binary:' + struct.pack('>I', min(int(stop), 2 ** 32 - 1))))
+    return _all_of(parts)
+
+
+def build_ratings_filter(movie_ids=None, time_range=None, user_range=None):
+    """
+    把电影、时间和用户范围条件翻译成 HBase 过滤器字符串
+
+    每个条件同时覆盖文本格式和二进制格式的列，两种格式的行可以混存。
+
+    Args:
+        movie_ids: 电影ID列表（可选）
+        time_range: (开始, 结束) 时间范围，左闭右开（可选）
+        user_range: (开始, 结束) 用户ID范围，左闭右开（可选）
+
+    Returns:
+        bytes: 过滤器字符串，没有条件时返回 None
+    """
+    clauses = []
+    if movie_ids is not None:
+        movie_ids = sorted(set(int(movie_id) for movie_id in movie_ids))
+        movie_filters = []
+        for movie_id in movie_ids:
+            movie_filters.append(_value_filter('movieId', '=', f"binary:{movie_id}".encode()))
+            movie_filters.append(_value_filter('m', '=', b'binary:' + struct.pack('>I', movie_id)))
+        if not movie_filters:
+            movie_filters = [_value_filter('movieId', '=', b'regexstring:^$')]
+        clauses.append(_any_of(movie_filters))
+    if time_range is not None:
+        start, stop = time_range
+        start = _to_unix_seconds(start) if start is not None else None
+        stop = _to_unix_seconds(stop) if stop is not None else None
+        if start is not None or stop is not None:
+            clauses.append(_any_of([
+                _numeric_string_range_filter('timestamp', start, stop),
+                _binary_range_filter('t', start, stop),
+            ]))
+    if user_range is not None:
+        start, stop = user_range
+        clauses.append(_any_of([
+            _numeric_string_range_filter('userId', start, stop),
+            _binary_range_filter('u', start, stop),
+        ]))
+    if not clauses:
+        return None
+    return b' AND '.join(clauses)
+
+
+def _ratings_scan_columns(requested, movie_ids=None, time_range=None, user_range=None):
+    """计算列裁剪时需要扫描的列（包含过滤条件依赖的列，派生列改为扫描 timestamp）"""
+    needed = set(requested) - RATINGS_DERIVED_COLUMNS
+    if set(requested) & RATINGS_DERIVED_COLUMNS:
+        needed.add('timestamp')
+    if movie_ids is not None:
+        needed.add('movieId')
+    if time_range is not None:
+        needed.add('timestamp')
+    if user_range is not None:
+        needed.add('userId')
+    columns = []
+    for name in RATINGS_COLUMNS:
+        if name in needed:
+            columns.append(f"info:{name}".encode())
+            columns.append(f"info:{RATINGS_BINARY_QUALIFIERS[name]}".encode())
+    return columns
+
+
+def _movies_frame(decoder):
+    """把电影数据的解码结果转换为 DataFrame"""
+    df = decoder.to_frame()
+
+    # year 有缺失值时解码为浮点型，与 pd.to_numeric 的行为一致
+    if 'year' in df.columns and df['year'].dtype == np.int64:
+        df['year'] = df['year'].astype(np.float64)
+
+    return df
+
+
+def add_time_columns(ratings):
+    """
+    由 timestamp 计算 datetime/year/month 列（与 CSV 加载方式一致）
+
+    Args:
+        ratings: 含 timestamp 列的评分 DataFrame
+
+    Returns:
+        pd.DataFrame: 增加了时间列的 DataFrame
+    """
+    if 'timestamp' not in ratings.columns:
+        return ratings
+    ratings['datetime'] = pd.to_datetime(ratings['timestamp'], unit='s', errors='coerce')
+    ratings['year'] = ratings['datetime'].dt.year
+    ratings['month'] = ratings['datetime'].dt.month
+    return ratings
+
+
+# 可以通过 Thrift 接口设置的列族属性（happybase.Connection.create_table 的参数）
+_THRIFT_FAMILY_OPTIONS = ('max_versions', 'compression', 'in_memory', 'bloom_filter_type',
+                          'block_cache_enabled', 'time_to_live')
+
+
+def quantile_split_points(keys, regions):
+    """
+    按行键样本的分位数计算预分区点，使各 Region 的行数大致相同
+
+    Args:
+        keys: 行键样本（bytes 列表）
+        regions: 期望的 Region 数
+
+    Returns:
+        list: 严格递增的切分点（行键）
+    """
+    keys = sorted(keys)
+    if regions <= 1 or not keys:
+        return []
+    points = {keys[len(keys) * i // regions] for i in range(1, regions)}
+    points.discard(keys[0])
+    return sorted(points)
+
+
+def shell_create_command(table_name, options, split_points=None):
+    """
+    生成与建表配置等价的 hbase shell 建表语句
+
+    Args:
+        table_name: 表名
+        options: 建表配置（见 hbase_config.TABLE_PROFILES）
+        split_points: 预分区点（可选）
+
+    Returns:
+        str: hbase shell 语句
+    """
+    attributes = ["NAME => 'info'"]
+    if 'max_versions' in options:
+        attributes.append(f"VERSIONS => {options['max_versions']}")
+    if 'compression' in options:
+        attributes.append(f"COMPRESSION => '{options['compression']}'")
+    if 'bloom_filter_type' in options:
+        attributes.append(f"BLOOMFILTER => '{options['bloom_filter_type']}'")
+    if 'block_size' in options:
+        attributes.append(f"BLOCKSIZE => '{options['block_size']}'")
+    if 'in_memory' in options:
+        attributes.append(f"IN_MEMORY => '{str(options['in_memory']).lower()}'")
+    if 'time_to_live' in options:
+        attributes.append(f"TTL => {options['time_to_live']}")
+
+    command = f"create '{table_name}', {{{', '.join(attributes)}}}"
+    if split_points:
+        command += f", SPLITS => [{', '.join(_shell_bytes(p) for p in split_points)}]"
+    return command
+
+
+def _shell_bytes(value):
+    """把行键转换为 hbase shell（Ruby）的双引号字符串字面量"""
+    chars = []
+    for byte in value:
+        if 0x20 <= byte < 0x7f and chr(byte) not in '"\\#':
+            chars.append(chr(byte))
+        else:
+            chars.append(f"\\x{byte:02X}")
+    return '"' + ''.join(chars) + '"'
+
+
+def provisioned_table_types(config):
+    """
+    按配置需要创建的表类型（索引表和变更日志表只在启用时创建）
+
+    Args:
+        config: HBase 配置（见 hbase_config.HBASE_CONFIG）
+
+    Returns:
+        list: 表类型列表，表名通过 get_table_name 获取
+    """
+    table_types = ['movies', 'ratings', 'tags']
+    if config['movie_index_enabled']:
+        table_types.append('ratings_by_movie')
+    if config['tag_index_enabled']:
+        table_types.append('tag_index')
+    if config['change_log_enabled']:
+        table_types.append('ratings_changes')
+    return table_types
+
+
+def provision_table(connection, table_name, options, split_points=None):
+    """
+    按建表配置创建表
+
+    只用到 Thrift 支持的属性时（默认配置）直接通过 happybase 建表；只有配置中明确要求了
+    block_size 或预分区时，才调用本机的 hbase shell，找不到 hbase 命令时退回 Thrift 建表
+    并打印完整的建表语句。
+
+    Args:
+        connection: happybase.Connection
+        table_name: 表名
+        options: 建表配置（见 hbase_config.TABLE_PROFILES）
+        split_points: 预分区点（可选）
+    """
+    split_points = split_points or []
+    needs_shell = bool(split_points) or 'block_size' in options
+
+    if needs_shell and shutil.which('hbase'):
+        command = shell_create_command(table_name, options, split_points)
+        result = subprocess.run(['hbase', 'shell', '-n'], input=command + '\n', text=True,
+                                capture_output=True, timeout=300)
+        if result.returncode != 0:
+            raise RuntimeError(f"hbase shell 建表失败: {result.stderr.strip() or result.stdout.strip()}")
+        print(f"创建表: {table_name}（hbase shell，{len(split_points) + 1} 个 Region）")
+        return
+
+    families = {'info': {k: options[k] for k in _THRIFT_FAMILY_OPTIONS if k in options}}
+    connection.create_table(table_name, families)
+    print(f"创建表: {table_name}")
+
+    if needs_shell:
+        print(f"  ⚠️  Thrift 接口不支持块大小和预分区，可在 hbase shell 中重建该表:")
+        print(f"    disable '{table_name}'; drop '{table_name}'")
+        print(f"    {shell_create_command(table_name, options, split_points)}")
+
 
 class HBaseConnector:
     """HBase 连接器类"""
     
     def __init__(self):
         """初始化 HBase 连接"""
-        self.connection = None
+        self.pool = None
         self.config = get_hbase_config()
+        self.rating_keys = RatingKeyCodec.from_config(self.config)
+        self._connect_lock = threading.Lock()
         
         if not HAPPYBASE_AVAILABLE:
             print("HBase connector initialized in CSV-only mode")
@@ -34,45 +1159,87 @@ class HBaseConnector:
                 print("将使用 CSV 文件作为数据源")
     
     def connect(self):
-        """连接到 HBase"""
+        """连接到 HBase（创建连接池）"""
         if not HAPPYBASE_AVAILABLE:
             raise ImportError("happybase 未安装，无法连接 HBase")
         
+        # 先做短超时探测，HBase 不可达时立即失败，避免在建连上等待完整的超时时间
+        availability = get_hbase_availability()
+        if not availability.is_available():
+            raise ConnectionError(f"HBase 不可达: {self.config['host']}:{self.config['port']}")
+        
         try:
-            self.connection = happybase.Connection(
+            self.pool = HBaseConnectionPool(
+                size=self.config['pool_size'],
                 host=self.config['host'],
                 port=self.config['port'],
-                timeout=self.config['timeout']
+                timeout=self.config['timeout'],
+                keepalive_interval=self.config['keepalive_interval']
             )
-            print(f"成功连接到 HBase: {self.config['host']}:{self.config['port']}")
+            print(f"成功连接到 HBase: {self.config['host']}:{self.config['port']} "
+                  f"(连接池大小 {self.config['pool_size']})")
         except Exception as e:
             print(f"HBase 连接失败: {e}")
+            availability.record_failure(e)
             raise
     
     def disconnect(self):
         """断开 HBase 连接"""
-        if self.connection:
-            self.connection.close()
+        if self.pool:
+            self.pool.close()
+            self.pool = None
             print("HBase 连接已关闭")
     
     def is_connected(self):
         """检查是否已连接"""
-        return self.connection is not None and HAPPYBASE_AVAILABLE
+        return self.pool is not None and HAPPYBASE_AVAILABLE
+    
+    def _ensure_connected(self):
+        """
+        确认连接池可用；探测到 HBase 已恢复（或之前主动断开）时先重新建立连接池
+        
+        Raises:
+            ConnectionError: HBase 仍不可用
+        """
+        if self.pool is None and HAPPYBASE_AVAILABLE and get_hbase_availability().is_available():
+            with self._connect_lock:
+                if self.pool is None:
+                    self.connect()
+        
+        if not self.is_connected():
+            raise ConnectionError("未连接到 HBase")
+    
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        从连接池借出一个连接，with 块结束后自动归还
+
+        Yields:
+            happybase.Connection: 连接对象
+        """
+        self._ensure_connected()
+        
+        try:
+            with self.pool.connection(timeout=self.config['pool_timeout']) as connection:
+                yield connection
+        except TRANSPORT_ERRORS as e:
+            # 只有传输层错误说明 HBase 不可用；应用层错误（例如表不存在）不影响熔断器
+            get_hbase_availability().record_failure(e)
+            raise
     
-    def get_table(self, table_name):
+    @contextlib.contextmanager
+    def table(self, table_name):
         """
-        获取表对象
+        借出一个连接并返回表对象，with 块结束后自动归还连接
         
         Args:
             table_name: 表名
         
-        Returns:
+        Yields:
             happybase.Table: 表对象
         """
-        if not self.is_connected():
-            raise ConnectionError("未连接到 HBase")
-        
-        return self.connection.table(table_name)
+        with self.connection() as connection:
+            yield connection.table(table_name)
     
     def read_movies(self):
         """
@@ -81,75 +1248,186 @@ class HBaseConnector:
         Returns:
             pd.DataFrame: 电影数据
         """
-        if not self.is_connected():
-            raise ConnectionError("未连接到 HBase")
+        self._ensure_connected()
         
         table_name = get_table_name('movies')
-        table = self.get_table(table_name)
         
-        data = []
-        for key, value in table.scan():
-            row = {'movieId': int(key.decode())}
-            for col, val in value.items():
-                col_name = col.decode().split(':')[1]
-                row[col_name] = val.decode()
-            data.append(row)
+        decoder = ColumnarScanDecoder(MOVIES_COLUMN_TYPES, key_column='movieId')
+        with self.table(table_name) as table:
+            decoder.feed(table.scan())
+        
+        return _movies_frame(decoder)
+    
+    def read_movie(self, movie_id):
+        """
+        按行键读取单部电影
+        
+        Args:
+            movie_id: 电影ID
         
-        df = pd.DataFrame(data)
+        Returns:
+            pd.Series: 电影信息（与 read_movies 返回的一行相同），不存在时返回 None
+        """
+        self._ensure_connected()
         
-        # 数据类型转换
-        if 'movieId' in df.columns:
-            df['movieId'] = pd.to_numeric(df['movieId'], errors='coerce')
-        if 'year' in df.columns:
-            df['year'] = pd.to_numeric(df['year'], errors='coerce')
+        with self.table(get_table_name('movies')) as table:
+            key = str(int(movie_id)).encode()
+            cells = table.row(key)
         
-        return df
+        if not cells:
+            return None
+        
+        decoder = ColumnarScanDecoder(MOVIES_COLUMN_TYPES, key_column='movieId', initial_capacity=1)
+        return _movies_frame(decoder.feed([(key, cells)])).iloc[0]
     
-    def read_ratings(self):
+    def read_ratings(self, user_ids=None, movie_ids=None, time_range=None, columns=None,
+                     user_range=None):
         """
-        从 HBase 读取评分数据
+        从 HBase 读取评分数据，支持谓词下推和列裁剪
+        
+        user_ids 转换为按行键前缀的扫描；user_range 在 binary 行键布局下转换为
+        行键区间扫描，否则转换为服务端过滤；movie_ids 和 time_range 转换为
+        服务端的 SingleColumnValueFilter；columns 只拉取需要的列。当所需列都能
+        从行键解析出来时，使用 KeyOnlyFilter 只传输行键。
+        
+        Args:
+            user_ids: 只读取这些用户的评分（可选）
+            user_range: (开始, 结束) 用户ID范围，左闭右开（可选）
+            movie_ids: 只读取这些电影的评分（可选）
+            time_range: (开始, 结束) 时间范围，左闭右开，可以是 Unix 秒数或
+                pd.Timestamp 能解析的时间，任一端为 None 表示不限（可选）
+            columns: 需要返回的列，默认返回全部列（可选）
         
         Returns:
             pd.DataFrame: 评分数据
         """
-        if not self.is_connected():
-            raise ConnectionError("未连接到 HBase")
+        self._ensure_connected()
         
         table_name = get_table_name('ratings')
-        table = self.get_table(table_name)
-        
-        data = []
-        for key, value in table.scan():
-            row = {}
-            for col, val in value.items():
-                col_name = col.decode().split(':')[1]
-                row[col_name] = val.decode()
-            data.append(row)
-        
-        df = pd.DataFrame(data)
-        
-        # 如果 DataFrame 为空，返回带有正确列名的空 DataFrame
-        if df.empty:
-            columns = ['userId', 'movieId', 'rating', 'timestamp', 'datetime', 'year', 'month']
-            return pd.DataFrame(columns=columns)
+        requested = list(columns) if columns is not None else list(RATINGS_COLUMNS)
+        unknown = set(requested) - set(RATINGS_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知的评分列: {sorted(unknown)}")
+        
+        codec = self.rating_keys
+        range_by_key = user_range is not None and codec.layout == 'binary'
+        if user_range is not None and user_ids is not None:
+            user_ids = [user_id for user_id in user_ids if user_range[0] <= user_id < user_range[1]]
+        
+        scan_filter = build_ratings_filter(
+            movie_ids=movie_ids,
+            time_range=time_range,
+            user_range=None if range_by_key or user_ids is not None else user_range
+        )
+        key_only = scan_filter is None and columns is not None and set(requested) <= RATINGS_KEY_COLUMNS
+        
+        scan_kwargs = {}
+        if key_only:
+            scan_kwargs['filter'] = b'KeyOnlyFilter() AND FirstKeyOnlyFilter()'
+        else:
+            if scan_filter is not None:
+                scan_kwargs['filter'] = scan_filter
+            if columns is not None:
+                scan_kwargs['columns'] = _ratings_scan_columns(requested, movie_ids, time_range, user_range)
+        
+        if user_ids is not None:
+            ranges = [
+                {'row_prefix': codec.user_prefix(user_id)}
+                for user_id in sorted(set(user_ids))
+            ]
+        elif range_by_key:
+            ranges = [
+                {'row_start': start, 'row_stop': stop}
+                for start, stop in codec.user_range_scans(*user_range)
+            ]
+        else:
+            ranges = [
+                {'row_start': start, 'row_stop': stop}
+                for start, stop in self.key_ranges(table_name)
+            ]
+        
+        if key_only:
+            make_decoder = partial(ColumnarScanDecoder, {}, key_column='key', key_type='bytes')
+        else:
+            make_decoder = partial(ColumnarScanDecoder, RATINGS_COLUMN_TYPES)
+        df = self.scan_frames(table_name, ranges, make_decoder, **scan_kwargs)
+        
+        # 如果没有数据，返回带有正确列名的空 DataFrame
+        if len(df) == 0:
+            return pd.DataFrame(columns=requested)
+        
+        if key_only:
+            df = codec.decode_many(df['key'].tolist())
+        
+        if set(requested) & RATINGS_DERIVED_COLUMNS:
+            df = add_time_columns(df)
+        return df[requested]
+    
+    def key_ranges(self, table_name, parts=None):
+        """
+        把表的行键空间切分为若干个左闭右开的区间，用于并行扫描
+        
+        优先使用 Region 边界；Region 数少于 parts 时，再在首尾行键之间
+        按字节插值补充切分点。
+        
+        Args:
+            table_name: 表名
+            parts: 期望的区间数，默认为 HBASE_CONFIG['scan_workers']
+        
+        Returns:
+            list: [(row_start, row_stop), ...]，None 表示表的开头或结尾
+        """
+        parts = parts or self.config['scan_workers']
+        if parts <= 1:
+            return [(None, None)]
+        
+        with self.table(table_name) as table:
+            splits = {region['start_key'] for region in table.regions() if region['start_key']}
             
-        # 数据类型转换
-        if 'userId' in df.columns:
-            df['userId'] = pd.to_numeric(df['userId'], errors='coerce')
-        if 'movieId' in df.columns:
-            df['movieId'] = pd.to_numeric(df['movieId'], errors='coerce')
-        if 'rating' in df.columns:
-            df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_numeric(df['timestamp'], errors='coerce')
-        if 'datetime' in df.columns:
-            df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce')
-        if 'year' in df.columns:
-            df['year'] = pd.to_numeric(df['year'], errors='coerce')
-        if 'month' in df.columns:
-            df['month'] = pd.to_numeric(df['month'], errors='coerce')
-        
-        return df
+            if len(splits) + 1 < parts:
+                key_only = b'KeyOnlyFilter() AND FirstKeyOnlyFilter()'
+                first = next(iter(table.scan(filter=key_only, limit=1)), None)
+                last = next(iter(table.scan(filter=key_only, limit=1, reverse=True)), None)
+                if first is not None and last is not None:
+                    splits.update(split_key_space(first[0], last[0], parts))
+        
+        bounds = [None] + sorted(splits) + [None]
+        return list(zip(bounds[:-1], bounds[1:]))
+    
+    def scan_frames(self, table_name, ranges, make_decoder, **scan_kwargs):
+        """
+        在线程池中并发扫描多个行键区间，每个线程使用连接池中独立的连接，
+        各区间分别列式解码后按区间顺序合并
+        
+        Args:
+            table_name: 表名
+            ranges: 每个区间的 scan 参数列表，例如 [{'row_start': ..., 'row_stop': ...}]
+            make_decoder: 为每个区间创建 ColumnarScanDecoder 的函数
+            **scan_kwargs: 所有区间共用的 scan 参数（columns、filter 等）
+        
+        Returns:
+            pd.DataFrame: 合并后的数据
+        """
+        def scan_range(range_kwargs):
+            decoder = make_decoder()
+            with self.table(table_name) as table:
+                decoder.feed(table.scan(**range_kwargs, **scan_kwargs))
+            return decoder.to_frame()
+        
+        workers = min(self.config['scan_workers'], self.config['pool_size'], len(ranges))
+        if workers <= 1:
+            frames = [scan_range(range_kwargs) for range_kwargs in ranges]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                frames = list(executor.map(scan_range, ranges))
+        
+        frames = [frame for frame in frames if len(frame)] or frames[:1]
+        if not frames:
+            # 没有需要扫描的区间（例如 user_ids=[]）时返回只有列名的空表
+            return make_decoder().to_frame()
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
     
     def write_movies(self, movies_df):
         """
@@ -158,112 +1436,346 @@ class HBaseConnector:
         Args:
             movies_df: 电影数据 DataFrame
         """
-        if not self.is_connected():
-            raise ConnectionError("未连接到 HBase")
+        self._ensure_connected()
         
         table_name = get_table_name('movies')
-        table = self.get_table(table_name)
         
-        batch = table.batch(batch_size=self.config['batch_size'])
+        row_keys, cells = encode_movie_cells(movies_df)
         
-        for _, row in movies_df.iterrows():
-            row_key = str(row['movieId']).encode()
-            data = {
-                b'info:title': str(row['title']).encode(),
-                b'info:genres': str(row['genres']).encode(),
-            }
+        with self.table(table_name) as table:
+            batch = table.batch(batch_size=self.config['batch_size'])
             
-            if 'year' in row and pd.notna(row['year']):
-                data[b'info:year'] = str(int(row['year'])).encode()
+            for row_key, data in zip(row_keys, cells):
+                batch.put(row_key, data)
             
-            batch.put(row_key, data)
-        
-        batch.send()
+            batch.send()
         print(f"成功写入 {len(movies_df)} 条电影数据到 HBase")
     
-    def write_ratings(self, ratings_df):
+    def write_ratings(self, ratings_df, storage_format=None, table_name=None, key_codec=None, wal=True):
         """
         将评分数据写入 HBase
         
         Args:
             ratings_df: 评分数据 DataFrame
+            storage_format: 存储格式版本（RATINGS_FORMAT_TEXT 或 RATINGS_FORMAT_BINARY），
+                默认为 HBASE_CONFIG['ratings_format']
+            table_name: 目标表名，默认为配置中的 ratings 表
+            key_codec: 行键编解码器，默认按配置创建
+            wal: 是否写 WAL；初次批量导入时可关闭以提高吞吐，但 RegionServer 宕机会丢失未刷盘的数据
         """
-        if not self.is_connected():
-            raise ConnectionError("未连接到 HBase")
+        self._ensure_connected()
         
-        table_name = get_table_name('ratings')
-        table = self.get_table(table_name)
-        
-        batch = table.batch(batch_size=self.config['batch_size'])
-        
-        for idx, row in ratings_df.iterrows():
-            row_key = f"{row['userId']}_{row['movieId']}_{row['timestamp']}".encode()
-            data = {
-                b'info:userId': str(row['userId']).encode(),
-                b'info:movieId': str(row['movieId']).encode(),
-                b'info:rating': str(row['rating']).encode(),
-                b'info:timestamp': str(row['timestamp']).encode(),
-            }
+        table_name = table_name or get_table_name('ratings')
+        key_codec = key_codec or self.rating_keys
+        storage_format = storage_format or self.config['ratings_format']
+        if storage_format not in (RATINGS_FORMAT_TEXT, RATINGS_FORMAT_BINARY):
+            raise ValueError(f"不支持的评分存储格式: {storage_format}")
+        
+        row_keys = key_codec.encode_many(
+            ratings_df['userId'], ratings_df['movieId'], ratings_df['timestamp']
+        )
+        
+        with self.table(table_name) as table:
+            batch = table.batch(batch_size=self.config['batch_size'], wal=wal)
+            
+            if storage_format == RATINGS_FORMAT_BINARY:
+                cells = encode_rating_cells(ratings_df)
+            else:
+                cells = encode_text_rating_cells(ratings_df)
             
-            if 'datetime' in row and pd.notna(row['datetime']):
-                data[b'info:datetime'] = str(row['datetime']).encode()
-            if 'year' in row and pd.notna(row['year']):
-                data[b'info:year'] = str(int(row['year'])).encode()
-            if 'month' in row and pd.notna(row['month']):
-                data[b'info:month'] = str(int(row['month'])).encode()
+            for row_key, data in zip(row_keys, cells):
+                batch.put(row_key, data)
             
-            batch.put(row_key, data)
+            batch.send()
         
-        batch.send()
+        if self.config['movie_index_enabled']:
+            self.write_movie_index(ratings_df, wal=wal)
+        # 评分写入之后再记日志，读到日志时对应的评分一定已经可见
+        if self.config['change_log_enabled'] and table_name == get_table_name('ratings'):
+            self.write_rating_changes(row_keys, wal=wal)
         print(f"成功写入 {len(ratings_df)} 条评分数据到 HBase")
     
-    def create_tables(self):
-        """创建 HBase 表"""
-        if not self.is_connected():
-            raise ConnectionError("未连接到 HBase")
+    def write_movie_index(self, ratings_df, wal=True):
+        """
+        写入 ratings_by_movie 索引表（覆盖索引：行键含 movieId/时间/userId，单元格存评分）
         
-        # 创建 movies 表
-        movies_table = get_table_name('movies')
-        if movies_table.encode() not in self.connection.tables():
-            self.connection.create_table(
-                movies_table,
-                {'info': dict()}
-            )
-            print(f"创建表: {movies_table}")
-        
-        # 创建 ratings 表
-        ratings_table = get_table_name('ratings')
-        if ratings_table.encode() not in self.connection.tables():
-            self.connection.create_table(
-                ratings_table,
-                {'info': dict()}
-            )
-            print(f"创建表: {ratings_table}")
+        Args:
+            ratings_df: 评分数据 DataFrame
+            wal: 是否写 WAL
+        """
+        self._ensure_connected()
+        
+        row_keys = encode_movie_index_keys(
+            ratings_df['movieId'], ratings_df['timestamp'], ratings_df['userId']
+        )
+        rating_cells = _pack_column(_rating_codes(ratings_df['rating']), 'u1')
+        
+        with self.table(get_table_name('ratings_by_movie')) as table:
+            batch = table.batch(batch_size=self.config['batch_size'], wal=wal)
+            for row_key, rating in zip(row_keys, rating_cells):
+                batch.put(row_key, {b'info:r': rating})
+            batch.send()
+    
+    def write_rating_changes(self, row_keys, wal=True):
+        """
+        写入 ratings_changes 变更日志表（行键为当前时间 + ratings 行键）
+        
+        Args:
+            row_keys: 本次写入的 ratings 行键
+            wal: 是否写 WAL
+        """
+        self._ensure_connected()
+        
+        written_at = CHANGE_LOG_TIME.pack(int(time.time() * 1000))
+        with self.table(get_table_name('ratings_changes')) as table:
+            batch = table.batch(batch_size=self.config['batch_size'], wal=wal)
+            for row_key in row_keys:
+                batch.put(written_at + row_key, {b'info:w': b''})
+            batch.send()
+    
+    def rating_change_watermark(self):
+        """
+        ratings_changes 表中最近一次写入的时间，用作 ratings 快照增量刷新的高水位
+        
+        Returns:
+            int: 写入时间（毫秒），日志为空时为 0；变更日志表不存在时返回 None
+        """
+        self._ensure_connected()
+        
+        table_name = get_table_name('ratings_changes')
+        with self.connection() as connection:
+            if table_name.encode() not in connection.tables():
+                return None
+            last = next(iter(connection.table(table_name).scan(
+                filter=b'KeyOnlyFilter() AND FirstKeyOnlyFilter()', limit=1, reverse=True
+            )), None)
+        return CHANGE_LOG_TIME.unpack_from(last[0])[0] if last else 0
+    
+    def read_rating_changes(self, since):
+        """
+        读取写入时间不早于 since 的评分：在 ratings_changes 表上从 since 开始做一次区间扫描，
+        再按行键批量读取 ratings 表（与评分自身的 timestamp 无关，补录的旧评分同样能读到）
+        
+        为容忍写入方之间的时钟偏差，从 since 往前多读 CHANGE_LOG_OVERLAP_MS 毫秒，
+        重复读到的行由调用方按主键去重。
+        
+        Args:
+            since: 写入时间高水位（毫秒），见 rating_change_watermark
+        
+        Returns:
+            pd.DataFrame: 评分数据（列与 read_ratings 相同），每行只出现一次
+        """
+        self._ensure_connected()
+        
+        row_start = CHANGE_LOG_TIME.pack(max(0, int(since) - CHANGE_LOG_OVERLAP_MS))
+        with self.table(get_table_name('ratings_changes')) as table:
+            scanner = table.scan(row_start=row_start, filter=b'KeyOnlyFilter() AND FirstKeyOnlyFilter()')
+            row_keys = sorted({key[CHANGE_LOG_TIME.size:] for key, _ in scanner})
+        
+        decoder = ColumnarScanDecoder(RATINGS_COLUMN_TYPES)
+        batch_size = self.config['batch_size']
+        with self.table(get_table_name('ratings')) as table:
+            for i in range(0, len(row_keys), batch_size):
+                decoder.feed(table.rows(row_keys[i:i + batch_size]))
+        
+        if len(decoder) == 0:
+            return pd.DataFrame(columns=RATINGS_COLUMNS)
+        return add_time_columns(decoder.to_frame())[RATINGS_COLUMNS]
+    
+    def read_movie_ratings(self, movie_id, limit=None):
+        """
+        通过 ratings_by_movie 索引表读取某部电影的评分，按时间从新到旧排列
+        
+        Args:
+            movie_id: 电影ID
+            limit: 最多返回的条数，例如只取最新 20 条（可选）
+        
+        Returns:
+            pd.DataFrame: 评分数据
+        """
+        self._ensure_connected()
+        
+        decoder = ColumnarScanDecoder(
+            {'r': ('rating', 'rating_x2')}, key_column='key', key_type='bytes'
+        )
+        with self.table(get_table_name('ratings_by_movie')) as table:
+            decoder.feed(table.scan(row_prefix=struct.pack('>I', int(movie_id)), limit=limit))
+        
+        if len(decoder) == 0:
+            return pd.DataFrame(columns=RATINGS_COLUMNS)
+        
+        cells = decoder.to_frame()
+        df = decode_movie_index_keys(cells['key'].tolist())
+        df['rating'] = cells['rating'].to_numpy()
+        return add_time_columns(df)[RATINGS_COLUMNS]
+    
+    def create_tables(self, profile=None, split_points=None):
+        """
+        按建表配置创建 HBase 表（已存在的表保持不变）
+        
+        Args:
+            profile: 建表配置方案名，默认为 HBASE_CONFIG['table_profile']
+            split_points: {表类型: 预分区点列表}，通常由导入工具根据 CSV 中的行键分布计算；
+                未提供时，加盐布局的 ratings 表按盐值分桶预分区
+        """
+        self._ensure_connected()
+        
+        split_points = dict(split_points or {})
+        if self.rating_keys.salt_buckets > 1:
+            split_points.setdefault('ratings', self.rating_keys.salt_split_points())
+        
+        with self.connection() as connection:
+            existing = connection.tables()
+            
+            for table_type in provisioned_table_types(self.config):
+                table_name = get_table_name(table_type)
+                if table_name.encode() in existing:
+                    continue
+                provision_table(connection, table_name, get_table_profile(table_type, profile),
+                                split_points.get(table_type))
+    
+    def write_tags(self, tags_df, wal=True):
+        """
+        将标签数据写入 HBase
+        
+        行键为 "userId_movieId_timestamp_标签哈希"，同一用户在同一时刻给同一电影打的多个标签互不覆盖
+        
+        Args:
+            tags_df: 标签数据 DataFrame（userId、movieId、tag、timestamp）
+            wal: 是否写 WAL
+        """
+        self._ensure_connected()
+        
+        tags = tags_df['tag'].astype(str)
+        digests = [hashlib.md5(tag.encode()).hexdigest()[:8] for tag in tags]
+        row_keys = [
+            f"{u}_{m}_{ts}_{d}".encode()
+            for u, m, ts, d in zip(tags_df['userId'], tags_df['movieId'], tags_df['timestamp'], digests)
+        ]
+        cells = _rows_from_columns({
+            b'info:userId': _format_column(tags_df['userId'], 'int'),
+            b'info:movieId': _format_column(tags_df['movieId'], 'int'),
+            b'info:tag': _format_column(tags, 'str'),
+            b'info:timestamp': _format_column(tags_df['timestamp'], 'int'),
+        })
+        
+        with self.table(get_table_name('tags')) as table:
+            batch = table.batch(batch_size=self.config['batch_size'], wal=wal)
+            for row_key, data in zip(row_keys, cells):
+                batch.put(row_key, data)
+            batch.send()
+        print(f"成功写入 {len(tags_df)} 条标签数据到 HBase")
+    
+    def read_tags(self):
+        """
+        从 HBase 读取标签数据
+        
+        Returns:
+            pd.DataFrame: 标签数据
+        """
+        self._ensure_connected()
+        
+        decoder = ColumnarScanDecoder(TAGS_COLUMN_TYPES)
+        with self.table(get_table_name('tags')) as table:
+            decoder.feed(table.scan())
+        
+        if len(decoder) == 0:
+            return pd.DataFrame(columns=list(TAGS_COLUMN_TYPES))
+        return decoder.to_frame()[list(TAGS_COLUMN_TYPES)]
+    
+    def write_tag_index(self, tags_df, wal=True):
+        """
+        写入 tags_by_tag 倒排索引表
+        
+        行键为 归一化标签 + \\x00 + movieId（大端 uint32），info:t 为标签的原始写法，
+        info:n 为该电影被打上该标签的次数。次数按传入的数据计算，因此应传入全部标签数据。
+        
+        Args:
+            tags_df: 标签数据 DataFrame
+            wal: 是否写 WAL
+        """
+        self._ensure_connected()
+        
+        tags = tags_df[['movieId', 'tag']].dropna()
+        tags = tags.assign(norm=normalize_tags(tags['tag']))
+        tags = tags[tags['norm'] != '']
+        grouped = tags.groupby(['norm', 'movieId']).agg(tag=('tag', 'first'), n=('tag', 'size')).reset_index()
+        
+        row_keys = [
+            norm.encode() + b'\x00' + key
+            for norm, key in zip(grouped['norm'], _pack_column(grouped['movieId'], '>u4'))
+        ]
+        cells = _rows_from_columns({
+            b'info:t': _format_column(grouped['tag'], 'str'),
+            b'info:n': _format_column(grouped['n'], 'int'),
+        })
+        
+        with self.table(get_table_name('tag_index')) as table:
+            batch = table.batch(batch_size=self.config['batch_size'], wal=wal)
+            for row_key, data in zip(row_keys, cells):
+                batch.put(row_key, data)
+            batch.send()
+        print(f"成功写入 {len(grouped)} 条标签索引到 HBase")
+    
+    def read_tag_movies(self, tag, prefix=True):
+        """
+        通过 tags_by_tag 倒排索引表查询打过某个标签的电影（前缀扫描，无需读取标签全表）
+        
+        Args:
+            tag: 标签（大小写、多余空白不敏感）
+            prefix: 是否按前缀匹配
+        
+        Returns:
+            pd.Series: movieId -> 匹配的标签次数，按次数从高到低排列
+        """
+        self._ensure_connected()
+        
+        norm = normalize_tag(tag)
+        if not norm:
+            return pd.Series(dtype=np.int64, name='tag_count')
+        row_prefix = norm.encode() if prefix else norm.encode() + b'\x00'
+        
+        counts = {}
+        with self.table(get_table_name('tag_index')) as table:
+            for key, cells in table.scan(row_prefix=row_prefix, columns=[b'info:n']):
+                movie_id = struct.unpack('>I', key[-4:])[0]
+                counts[movie_id] = counts.get(movie_id, 0) + int(cells.get(b'info:n', b'1'))
+        
+        result = pd.Series(counts, dtype=np.int64, name='tag_count')
+        result.index.name = 'movieId'
+        return result.sort_values(ascending=False, kind='stable')
     
     def delete_tables(self):
         """删除 HBase 表（慎用）"""
-        if not self.is_connected():
-            raise ConnectionError("未连接到 HBase")
+        self._ensure_connected()
         
         tables_to_delete = [
             get_table_name('movies'),
-            get_table_name('ratings')
+            get_table_name('ratings'),
+            get_table_name('tags'),
+            get_table_name('ratings_by_movie'),
+            get_table_name('tag_index'),
+            get_table_name('ratings_changes')
         ]
         
-        for table_name in tables_to_delete:
-            if table_name.encode() in self.connection.tables():
-                self.connection.delete_table(table_name, disable=True)
-                print(f"删除表: {table_name}")
+        with self.connection() as connection:
+            existing = connection.tables()
+            for table_name in tables_to_delete:
+                if table_name.encode() in existing:
+                    connection.delete_table(table_name, disable=True)
+                    print(f"删除表: {table_name}")
 
 
 # 全局连接器实例（单例模式）
 _hbase_connector = None
+_hbase_connector_lock = threading.Lock()
 
 
 def get_hbase_connector():
-    """获取 HBase 连接器实例（单例）"""
+    """获取 HBase 连接器实例（单例，多个会话线程共享同一个连接池）"""
     global _hbase_connector
     if _hbase_connector is None:
-        _hbase_connector = HBaseConnector()
+        with _hbase_connector_lock:
+            if _hbase_connector is None:
+                _hbase_connector = HBaseConnector()
     return _hbase_connector
-
@@ -1,14 +1,54 @@
 """
 数据导入工具 - 将 CSV 数据导入 HBase
-使用方法: python import_to_hbase.py
+使用方法:
+    python import_to_hbase.py          全量导入（分块流式读取，内存占用有上限）
+    python import_to_hbase.py --sync   增量同步：只写入新增或变化的数据块，中断后可从上次提交的块继续
+tags.csv 存在时一并导入标签数据，并构建标签倒排索引
 """
-import pandas as pd
+import argparse
+import hashlib
+import io
+import json
 import os
-from hbase_connector import get_hbase_connector
-from hbase_config import HBASE_CONFIG
+import time
+from datetime import datetime
+from itertools import islice
+
+import pandas as pd
+from csv_cache import prepare_movies, prepare_ratings
+from hbase_connector import get_hbase_connector, encode_movie_index_keys, quantile_split_points
+from hbase_config import HBASE_CONFIG, get_table_name, get_table_profile
+
+
+# ratings.csv 的列类型：ID 用 int32 减少每个数据块的内存占用
+RATINGS_CSV_DTYPES = {'userId': 'int32', 'movieId': 'int32', 'rating': 'float64', 'timestamp': 'int64'}
+
+# 估算数据块内存时，在 DataFrame 本身之外为编码后的单元格（bytes 对象和 dict）预留的倍数
+# （字符串格式的评分实测约为 DataFrame 内存的 18 倍）
+CELL_MEMORY_FACTOR = 20
+
+# 估算每行内存时读取的样本行数
+SAMPLE_ROWS = 1000
+
+# 计算预分区点时最多抽样的行数
+MAX_KEY_SAMPLES = 100000
 
-def import_csv_to_hbase():
-    """将 CSV 数据导入 HBase"""
+
+def prepare_tags(tags):
+    """去掉空标签"""
+    return tags.dropna(subset=['tag'])
+
+
+def import_csv_to_hbase(sync=False, chunk_rows=None, reset_checkpoint=False, memory_limit_mb=None):
+    """
+    将 CSV 数据导入 HBase
+    
+    Args:
+        sync: 是否使用增量同步模式
+        chunk_rows: 增量同步时每个数据块的行数，默认为 HBASE_CONFIG['sync_chunk_rows']
+        reset_checkpoint: 增量同步前是否丢弃已有的检查点（相当于全量重新同步）
+        memory_limit_mb: 全量导入时单个数据块的内存上限（MB），默认为 HBASE_CONFIG['import_memory_limit_mb']
+    """
     
     print("=" * 60)
     print("MovieLens 数据导入 HBase 工具")
@@ -18,6 +58,7 @@ def import_csv_to_hbase():
     csv_dir = 'ml-latest-small'
     movies_csv = os.path.join(csv_dir, 'movies.csv')
     ratings_csv = os.path.join(csv_dir, 'ratings.csv')
+    tags_csv = os.path.join(csv_dir, 'tags.csv')
     
     if not os.path.exists(movies_csv):
         print(f"❌ 错误: 找不到文件 {movies_csv}")
@@ -30,6 +71,10 @@ def import_csv_to_hbase():
     print(f"\n📁 CSV 文件检查完成")
     print(f"  - {movies_csv}")
     print(f"  - {ratings_csv}")
+    if os.path.exists(tags_csv):
+        print(f"  - {tags_csv}")
+    else:
+        tags_csv = None
     
     # 连接 HBase
     print(f"\n🔌 正在连接 HBase...")
@@ -44,38 +89,41 @@ def import_csv_to_hbase():
         
         print("✅ HBase 连接成功")
         
-        # 创建表
+        with connector.connection() as connection:
+            existing = connection.tables()
+        
+        # 创建表（新建 ratings 相关表时按 CSV 中的行键分布预分区）
         print(f"\n📋 创建 HBase 表...")
-        connector.create_tables()
+        split_points = None
+        if any(get_table_name(t).encode() not in existing for t in ('ratings', 'ratings_by_movie')):
+            split_points = compute_split_points(ratings_csv, connector.rating_keys)
+        connector.create_tables(split_points=split_points)
         print("✅ 表创建完成")
         
-        # 读取 CSV 数据
-        print(f"\n📖 读取 CSV 数据...")
-        
-        print("  - 读取 movies.csv...")
-        movies = pd.read_csv(movies_csv)
-        # 提取年份
-        movies['year'] = movies['title'].str.extract(r'\((\d{4})\)')
-        movies['year'] = pd.to_numeric(movies['year'], errors='coerce')
-        print(f"    ✅ 读取 {len(movies)} 条电影数据")
-        
-        print("  - 读取 ratings.csv...")
-        ratings = pd.read_csv(ratings_csv)
-        # 转换时间戳
-        ratings['datetime'] = pd.to_datetime(ratings['timestamp'], unit='s')
-        ratings['year'] = ratings['datetime'].dt.year
-        ratings['month'] = ratings['datetime'].dt.month
-        print(f"    ✅ 读取 {len(ratings)} 条评分数据")
-        
-        # 导入电影数据
-        print(f"\n⬆️  导入电影数据到 HBase...")
-        connector.write_movies(movies)
-        print(f"✅ 电影数据导入完成")
-        
-        # 导入评分数据
-        print(f"\n⬆️  导入评分数据到 HBase...")
-        connector.write_ratings(ratings)
-        print(f"✅ 评分数据导入完成")
+        if sync:
+            sync_csv_to_hbase(connector, movies_csv, ratings_csv, existing,
+                              chunk_rows or HBASE_CONFIG['sync_chunk_rows'], reset_checkpoint, tags_csv)
+        else:
+            memory_limit_mb = memory_limit_mb or HBASE_CONFIG['import_memory_limit_mb']
+            
+            # 导入电影数据
+            print(f"\n⬆️  导入电影数据到 HBase...")
+            total = import_csv_streaming(movies_csv, prepare_movies, connector.write_movies, memory_limit_mb)
+            print(f"✅ 电影数据导入完成（{total:,} 条）")
+            
+            # 导入评分数据
+            print(f"\n⬆️  导入评分数据到 HBase...")
+            total = import_csv_streaming(ratings_csv, prepare_ratings, connector.write_ratings, memory_limit_mb,
+                                         dtype=RATINGS_CSV_DTYPES)
+            print(f"✅ 评分数据导入完成（{total:,} 条）")
+            
+            # 导入标签数据
+            if tags_csv:
+                print(f"\n⬆️  导入标签数据到 HBase...")
+                total = import_csv_streaming(tags_csv, prepare_tags, connector.write_tags, memory_limit_mb)
+                if HBASE_CONFIG['tag_index_enabled']:
+                    connector.write_tag_index(prepare_tags(pd.read_csv(tags_csv)))
+                print(f"✅ 标签数据导入完成（{total:,} 条）")
         
         # 断开连接
         connector.disconnect()
@@ -95,6 +143,251 @@ def import_csv_to_hbase():
         traceback.print_exc()
 
 
-if __name__ == '__main__':
-    import_csv_to_hbase()
+def sync_csv_to_hbase(connector, movies_csv, ratings_csv, existing_tables, chunk_rows, reset_checkpoint=False,
+                      tags_csv=None):
+    """
+    增量同步 movies.csv、ratings.csv 和 tags.csv
+    
+    Args:
+        connector: HBase 连接器
+        movies_csv: movies.csv 路径
+        ratings_csv: ratings.csv 路径
+        existing_tables: 建表前已存在的表名列表，新建的表会丢弃旧检查点
+        chunk_rows: 每个数据块的行数
+        reset_checkpoint: 是否丢弃已有的检查点
+        tags_csv: tags.csv 路径（可选）
+    """
+    checkpoint_path = HBASE_CONFIG['sync_checkpoint']
+    checkpoint = {} if reset_checkpoint else load_checkpoint(checkpoint_path)
+    
+    targets = [
+        ('movies', movies_csv, prepare_movies, connector.write_movies),
+        ('ratings', ratings_csv, prepare_ratings, connector.write_ratings),
+    ]
+    if tags_csv:
+        targets.append(('tags', tags_csv, prepare_tags, connector.write_tags))
+    
+    for table_type, csv_path, prepare, write in targets:
+        table_name = get_table_name(table_type)
+        target = checkpoint_target(table_name)
+        if table_name.encode() not in existing_tables:
+            checkpoint.pop(target, None)
+        
+        print(f"\n🔄 同步 {csv_path} -> {table_name}...")
+        written, skipped = sync_csv_file(csv_path, target, prepare, write, checkpoint, checkpoint_path, chunk_rows)
+        print(f"✅ 写入 {written:,} 行，跳过未变化的 {skipped:,} 行")
+        
+        # 倒排索引中的标签次数需要全部标签数据才能算出，标签有变化时整体重建
+        index_missing = get_table_name('tag_index').encode() not in existing_tables
+        if table_type == 'tags' and HBASE_CONFIG['tag_index_enabled'] and (written or index_missing):
+            connector.write_tag_index(prepare_tags(pd.read_csv(csv_path)))
+
 
+def sample_ratings(ratings_csv, max_samples=MAX_KEY_SAMPLES):
+    """
+    对 ratings.csv 等间隔抽样（只读取组成行键的列）
+    
+    Returns:
+        pd.DataFrame: userId、movieId、timestamp 列的样本
+    """
+    with open(ratings_csv, 'rb') as f:
+        total_rows = sum(1 for _ in f) - 1
+    stride = max(1, total_rows // max_samples)
+    reader = pd.read_csv(ratings_csv, usecols=['userId', 'movieId', 'timestamp'],
+                         dtype=RATINGS_CSV_DTYPES, chunksize=stride * 10000)
+    samples = [chunk.iloc[::stride] for chunk in reader]
+    if not samples:
+        return pd.DataFrame(columns=['userId', 'movieId', 'timestamp'])
+    return pd.concat(samples, ignore_index=True)
+
+
+def compute_split_points(ratings_csv, codec, profile=None):
+    """
+    按 CSV 中的行键分布计算 ratings 和 ratings_by_movie 表的预分区点
+    
+    Args:
+        ratings_csv: ratings.csv 路径
+        codec: ratings 表的行键编解码器
+        profile: 建表配置方案名（决定 Region 数）
+    
+    Returns:
+        dict: {表类型: 预分区点列表}
+    """
+    sample = sample_ratings(ratings_csv)
+    split_points = {
+        'ratings_by_movie': quantile_split_points(
+            encode_movie_index_keys(sample['movieId'], sample['timestamp'], sample['userId']),
+            get_table_profile('ratings_by_movie', profile).get('regions', 1)
+        ),
+    }
+    # 加盐布局由 create_tables 按盐值分桶预分区
+    if codec.salt_buckets <= 1:
+        split_points['ratings'] = quantile_split_points(
+            codec.encode_many(sample['userId'], sample['movieId'], sample['timestamp']),
+            get_table_profile('ratings', profile).get('regions', 1)
+        )
+    return split_points
+
+
+def estimate_chunk_rows(csv_path, prepare, memory_limit_mb, dtype=None):
+    """
+    根据样本行的内存占用估算每个数据块的行数，使单个数据块（含编码后的单元格）不超过内存上限
+    
+    Returns:
+        int: 每个数据块的行数
+    """
+    sample = prepare(pd.read_csv(csv_path, nrows=SAMPLE_ROWS, dtype=dtype))
+    if sample.empty:
+        return SAMPLE_ROWS
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample) * CELL_MEMORY_FACTOR
+    return max(SAMPLE_ROWS, int(memory_limit_mb * 1024 * 1024 / bytes_per_row))
+
+
+def import_csv_streaming(csv_path, prepare, write, memory_limit_mb, dtype=None):
+    """
+    分块流式导入一个 CSV 文件，内存中只保留一个数据块
+    
+    Args:
+        csv_path: CSV 文件路径
+        prepare: 写入前对数据块做预处理的函数
+        write: 写入数据块的函数
+        memory_limit_mb: 单个数据块的内存上限（MB）
+        dtype: 读取 CSV 时的列类型（可选）
+    
+    Returns:
+        int: 导入的行数
+    """
+    chunk_rows = estimate_chunk_rows(csv_path, prepare, memory_limit_mb, dtype)
+    print(f"  每块 {chunk_rows:,} 行（内存上限 {memory_limit_mb} MB）")
+    
+    total = 0
+    start = time.perf_counter()
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=dtype):
+        write(prepare(chunk))
+        total += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"  已导入 {total:,} 行（{total / elapsed:,.0f} 行/秒）")
+    return total
+
+
+def checkpoint_target(table_name):
+    """检查点中的目标标识：同一份 CSV 同步到不同集群或表时互不影响"""
+    return f"{HBASE_CONFIG['backend']}://{HBASE_CONFIG['host']}:{HBASE_CONFIG['port']}/{table_name}"
+
+
+def load_checkpoint(path):
+    """读取检查点文件，不存在时返回空检查点"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    """先写临时文件再替换，保证中途崩溃时检查点文件完整"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def iter_csv_chunks(csv_path, chunk_rows):
+    """
+    按行数切分 CSV 文件（不含表头），逐块返回原始字节，只在内存中保留一个块
+    
+    假设字段中没有换行符（MovieLens 的 CSV 满足这一点）
+    
+    Yields:
+        tuple: (起始字节偏移, 原始字节)
+    """
+    with open(csv_path, 'rb') as f:
+        f.readline()
+        offset = f.tell()
+        while True:
+            raw = b''.join(islice(f, chunk_rows))
+            if not raw:
+                break
+            yield offset, raw
+            offset += len(raw)
+
+
+def sync_csv_file(csv_path, target, prepare, write, checkpoint, checkpoint_path, chunk_rows):
+    """
+    按数据块增量同步一个 CSV 文件
+    
+    每个块的内容哈希记录在检查点中。再次同步时哈希未变的块直接跳过，
+    新增或变化的块重新写入（HBase 的 put 是幂等的），每写完一个块立即保存检查点，
+    因此中断后重新运行会从最后一个已提交的块之后继续。
+    注意：CSV 中被删除的行不会从 HBase 删除。
+    
+    Args:
+        csv_path: CSV 文件路径
+        target: 检查点中的目标标识
+        prepare: 写入前对数据块做预处理的函数
+        write: 写入数据块的函数
+        checkpoint: 检查点字典（会被原地更新）
+        checkpoint_path: 检查点文件路径
+        chunk_rows: 每个数据块的行数
+    
+    Returns:
+        tuple: (写入行数, 跳过行数)
+    """
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+    header_hash = hashlib.sha1(header).hexdigest()
+    
+    state = checkpoint.get(target)
+    if not state or state.get('chunk_rows') != chunk_rows or state.get('header') != header_hash:
+        # 块大小或表头变化后块边界不再对应，只能从头同步
+        state = {'file': csv_path, 'chunk_rows': chunk_rows, 'header': header_hash, 'chunks': []}
+        checkpoint[target] = state
+    chunks = state['chunks']
+    
+    written = skipped = 0
+    count = 0
+    for index, (offset, raw) in enumerate(iter_csv_chunks(csv_path, chunk_rows)):
+        count = index + 1
+        digest = hashlib.sha1(raw).hexdigest()
+        if index < len(chunks) and chunks[index]['hash'] == digest:
+            skipped += chunks[index]['rows']
+            continue
+        
+        chunk = prepare(pd.read_csv(io.BytesIO(header + raw)))
+        write(chunk)
+        
+        record = {'offset': offset, 'length': len(raw), 'rows': len(chunk), 'hash': digest}
+        if 'timestamp' in chunk:
+            record['max_timestamp'] = int(chunk['timestamp'].max())
+        if index < len(chunks):
+            chunks[index] = record
+        else:
+            chunks.append(record)
+        
+        # 每提交一个块就保存检查点
+        state['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        save_checkpoint(checkpoint_path, checkpoint)
+        written += len(chunk)
+        print(f"  已提交第 {index + 1} 块（累计写入 {written:,} 行）")
+    
+    # 文件变短时丢弃多余的块记录
+    del chunks[count:]
+    timestamps = [c['max_timestamp'] for c in chunks if 'max_timestamp' in c]
+    if timestamps:
+        state['max_timestamp'] = max(timestamps)
+    save_checkpoint(checkpoint_path, checkpoint)
+    return written, skipped
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="将 MovieLens CSV 数据导入 HBase")
+    parser.add_argument('--sync', action='store_true', help="增量同步模式（可断点续传）")
+    parser.add_argument('--chunk-rows', type=int, default=None, help="增量同步时每个数据块的行数")
+    parser.add_argument('--reset-checkpoint', action='store_true', help="丢弃检查点，重新同步全部数据")
+    parser.add_argument('--memory-limit', type=int, default=None, help="全量导入时单个数据块的内存上限（MB）")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    import_csv_to_hbase(sync=args.sync, chunk_rows=args.chunk_rows, reset_checkpoint=args.reset_checkpoint,
+                        memory_limit_mb=args.memory_limit)
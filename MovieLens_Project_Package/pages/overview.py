@@ -9,18 +9,20 @@ from data_loader import (
     get_basic_stats, 
     get_top_movies, 
     get_rating_distribution,
-    get_genre_stats
+    get_genre_stats,
+    get_memory_report
 )
 
 
-def show(movies, ratings):
+def show(dataset):
     """显示数据总览页面"""
+    movies, ratings = dataset.movies, dataset.ratings
     st.title("📊 数据总览")
     st.markdown("---")
     
     # 基础统计信息
     st.subheader("📈 基础统计信息")
-    stats = get_basic_stats(movies, ratings)
+    stats = get_basic_stats(dataset)
     
     # 第一行统计卡片
     col1, col2, col3, col4 = st.columns(4)
@@ -51,7 +53,7 @@ def show(movies, ratings):
     
     with col1:
         st.subheader("⭐ 评分分布")
-        rating_dist = get_rating_distribution(ratings)
+        rating_dist = get_rating_distribution(dataset)
         
         fig = px.bar(
             x=rating_dist.index,
@@ -77,7 +79,7 @@ def show(movies, ratings):
     
     with col2:
         st.subheader("🎭 类型统计 (Top 10)")
-        genre_stats = get_genre_stats(movies, ratings)
+        genre_stats = get_genre_stats(dataset)
         top_genres = genre_stats.head(10)
         
         fig = px.bar(
@@ -106,7 +108,7 @@ def show(movies, ratings):
     with col1:
         top_n = st.slider("显示数量", min_value=5, max_value=50, value=20, step=5)
     
-    top_movies = get_top_movies(movies, ratings, n=top_n)
+    top_movies = get_top_movies(dataset, n=top_n)
     
     # 格式化显示
     display_df = top_movies.copy()
@@ -207,6 +209,7 @@ def show(movies, ratings):
         st.write(f"- 总行数: {len(movies):,}")
         st.write(f"- 缺失值: {movies.isnull().sum().sum()}")
         st.write(f"- 无类型电影: {len(movies[movies['genres'] == '(no genres listed)'])}")
+        st.write(f"- 内存占用: {movies.memory_usage(deep=True).sum() / 2**20:.1f} MB")
         
     with col2:
         st.write("**评分数据：**")
@@ -214,4 +217,10 @@ def show(movies, ratings):
         st.write(f"- 缺失值: {ratings.isnull().sum().sum()}")
         st.write(f"- 最活跃用户评分数: {ratings['userId'].value_counts().max()}")
         st.write(f"- 最少活跃用户评分数: {ratings['userId'].value_counts().min()}")
+        st.write(f"- 内存占用: {ratings.memory_usage(deep=True).sum() / 2**20:.1f} MB")
+    
+    with st.expander("🧮 各列内存占用"):
+        memory_report = get_memory_report(电影数据=movies, 评分数据=ratings)
+        memory_report['内存 (MB)'] = memory_report['内存 (MB)'].round(3)
+        st.dataframe(memory_report, use_container_width=True, hide_index=True)
 
@@ -2,24 +2,38 @@
 数据查询页面 - 电影查询模块
 """
 import streamlit as st
+import numpy as np
 import pandas as pd
 from data_loader import (
     search_movies,
-    get_movie_ratings
+    get_movie_ratings,
+    get_tag_index,
+    search_movies_by_tag,
+    get_movie_filter_index,
+    filter_movies,
+    get_movie_aggregates,
+    join_movie_aggregates
 )
 
 
-def show(movies, ratings):
+def show(dataset):
     """显示数据查询页面"""
     st.title("🔍 数据查询")
     st.markdown("---")
     
-    # 直接显示电影查询
-    movie_query_section(movies, ratings)
+    search_mode = st.radio("搜索方式", ["电影名称", "标签", "组合筛选"], horizontal=True)
+    
+    if search_mode == "标签":
+        tag_query_section(dataset)
+    elif search_mode == "组合筛选":
+        filter_query_section(dataset)
+    else:
+        movie_query_section(dataset)
 
 
-def movie_query_section(movies, ratings):
+def movie_query_section(dataset):
     """电影查询部分"""
+    movies = dataset.movies
     st.subheader("🎬 电影信息查询")
     
     # 搜索框
@@ -36,38 +50,24 @@ def movie_query_section(movies, ratings):
     
     if search_keyword or search_button:
         # 搜索电影
-        search_results = search_movies(movies, search_keyword)
+        search_results = search_movies(dataset, search_keyword)
         
         if len(search_results) == 0:
             st.warning(f"未找到包含 '{search_keyword}' 的电影")
         else:
-            st.success(f"找到 {len(search_results)} 部相关电影")
+            # 匹配质量小于 1 表示没有子串匹配，结果来自模糊匹配
+            if (search_results['match_quality'] < 1).all():
+                st.info(f"未找到包含 '{search_keyword}' 的电影，以下是名称相近的 {len(search_results)} 部电影")
+            else:
+                st.success(f"找到 {len(search_results)} 部相关电影")
             
             # 显示搜索结果
             st.subheader("📝 搜索结果")
             
             # 添加评分统计
-            search_results_with_stats = search_results.copy()
-            
-            # 计算每部电影的评分统计
-            rating_stats = ratings.groupby('movieId').agg({
-                'rating': ['count', 'mean']
-            }).reset_index()
-            
-            rating_stats.columns = ['movieId', 'rating_count', 'avg_rating']
-
-            # 避免列名冲突，先删除 search_results 中的统计列（如果存在）
-            cols_to_drop = ['rating_count', 'avg_rating']
-            search_results_with_stats = search_results.drop(columns=[c for c in cols_to_drop if c in search_results.columns])
-
-            search_results_with_stats = search_results_with_stats.merge(
-                rating_stats,
-                on='movieId',
-                how='left'
-            )
+            search_results_with_stats = join_movie_aggregates(search_results, get_movie_aggregates(dataset))
             
             # 填充缺失值
-            search_results_with_stats['rating_count'] = search_results_with_stats['rating_count'].fillna(0).astype(int)
             search_results_with_stats['avg_rating'] = search_results_with_stats['avg_rating'].fillna(0).round(2)
             
             # 显示表格
@@ -118,7 +118,7 @@ def movie_query_section(movies, ratings):
             )
             
             if selected_movie:
-                show_movie_details(selected_movie, movies, ratings)
+                show_movie_details(selected_movie, dataset)
     else:
         st.info("💡 请输入电影名称关键词进行搜索")
         
@@ -127,17 +127,7 @@ def movie_query_section(movies, ratings):
         random_movies = movies.sample(10)
         
         # 添加评分信息
-        rating_stats = ratings.groupby('movieId').agg({
-            'rating': ['count', 'mean']
-        }).reset_index()
-        rating_stats.columns = ['movieId', 'rating_count', 'avg_rating']
-        
-        # 避免列名冲突，先删除 random_movies 中的统计列（如果存在）
-        cols_to_drop = ['rating_count', 'avg_rating']
-        random_movies = random_movies.drop(columns=[c for c in cols_to_drop if c in random_movies.columns])
-
-        random_movies = random_movies.merge(rating_stats, on='movieId', how='left')
-        random_movies['rating_count'] = random_movies['rating_count'].fillna(0).astype(int)
+        random_movies = join_movie_aggregates(random_movies, get_movie_aggregates(dataset))
         random_movies['avg_rating'] = random_movies['avg_rating'].fillna(0).round(2)
         
         display_df = random_movies[['movieId', 'title', 'genres', 'rating_count', 'avg_rating']].copy()
@@ -146,9 +136,167 @@ def movie_query_section(movies, ratings):
         st.dataframe(display_df, use_container_width=True, hide_index=True)
 
 
-def show_movie_details(movie_id, movies, ratings):
+def tag_query_section(dataset):
+    """标签查询部分（基于预先构建的标签倒排索引）"""
+    movies = dataset.movies
+    st.subheader("🏷️ 按标签查询电影")
+    
+    if len(dataset.tags) == 0:
+        st.info("💡 当前数据源没有标签数据")
+        return
+    tag_index = get_tag_index(dataset)
+    
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        tag_keyword = st.text_input(
+            "输入标签",
+            placeholder="例如: dark comedy, pixar, time travel..."
+        )
+    
+    with col2:
+        exact_match = st.checkbox("精确匹配", value=False)
+    
+    if not tag_keyword:
+        st.info(f"💡 共 {len(tag_index):,} 个标签，输入标签或标签前缀进行搜索")
+        return
+    
+    suggestions = tag_index.suggest(tag_keyword)
+    if suggestions:
+        st.caption("相关标签: " + " · ".join(suggestions))
+    
+    search_results = search_movies_by_tag(movies, tag_index, tag_keyword, prefix=not exact_match)
+    
+    if len(search_results) == 0:
+        st.warning(f"未找到标签为 '{tag_keyword}' 的电影")
+        return
+    
+    st.success(f"找到 {len(search_results)} 部相关电影")
+    
+    # 添加评分统计
+    search_results = join_movie_aggregates(search_results, get_movie_aggregates(dataset))
+    search_results['avg_rating'] = search_results['avg_rating'].fillna(0).round(2)
+    
+    display_df = search_results[['movieId', 'title', 'genres', 'tag_count', 'rating_count', 'avg_rating']].copy()
+    display_df.columns = ['电影ID', '电影名称', '类型', '标签次数', '评分数量', '平均评分']
+    
+    st.dataframe(
+        display_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "平均评分": st.column_config.ProgressColumn(
+                "平均评分",
+                format="%.2f",
+                min_value=0,
+                max_value=5,
+                width="medium",
+            ),
+        }
+    )
+    
+    # 选择电影查看详情
+    st.markdown("---")
+    st.subheader("📊 电影详细信息")
+    
+    titles = dict(zip(search_results['movieId'], search_results['title']))
+    selected_movie = st.selectbox(
+        "选择一部电影查看详情",
+        options=list(titles),
+        format_func=lambda x: titles[x]
+    )
+    
+    if selected_movie:
+        show_movie_details(selected_movie, dataset)
+
+
+def filter_query_section(dataset):
+    """组合筛选部分（基于类型位图索引）"""
+    st.subheader("🧩 按条件组合筛选电影")
+    
+    filter_index = get_movie_filter_index(dataset)
+    
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        selected_genres = st.multiselect("类型", options=filter_index.genres)
+    
+    with col2:
+        genre_match = st.radio("类型匹配", ["任一类型", "全部类型"])
+    
+    col1, col2, col3 = st.columns(3)
+    
+    years = filter_index.years[~np.isnan(filter_index.years)]
+    year_range = None
+    with col1:
+        if len(years):
+            min_year, max_year = int(years.min()), int(years.max())
+            selected_years = st.slider("上映年份", min_year, max_year, (min_year, max_year))
+            # 年份范围未收窄时不按年份筛选，保留没有年份的电影
+            if selected_years != (min_year, max_year):
+                year_range = selected_years
+    
+    with col2:
+        min_ratings = st.number_input("最少评分数量", min_value=0, value=0, step=10)
+    
+    with col3:
+        min_avg = st.slider("最低平均评分", 0.0, 5.0, 0.0, 0.5)
+    
+    search_results = filter_movies(
+        dataset.movies,
+        filter_index,
+        genres=selected_genres,
+        match='all' if genre_match == "全部类型" else 'any',
+        year_range=year_range,
+        min_ratings=int(min_ratings),
+        min_avg=min_avg or None
+    )
+    
+    if len(search_results) == 0:
+        st.warning("没有符合条件的电影")
+        return
+    
+    st.success(f"找到 {len(search_results)} 部电影")
+    
+    search_results = search_results.copy()
+    search_results['avg_rating'] = search_results['avg_rating'].fillna(0).round(2)
+    
+    display_df = search_results[['movieId', 'title', 'genres', 'year', 'rating_count', 'avg_rating']].copy()
+    display_df.columns = ['电影ID', '电影名称', '类型', '年份', '评分数量', '平均评分']
+    
+    st.dataframe(
+        display_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "平均评分": st.column_config.ProgressColumn(
+                "平均评分",
+                format="%.2f",
+                min_value=0,
+                max_value=5,
+                width="medium",
+            ),
+        }
+    )
+    
+    # 选择电影查看详情
+    st.markdown("---")
+    st.subheader("📊 电影详细信息")
+    
+    titles = dict(zip(search_results['movieId'], search_results['title']))
+    selected_movie = st.selectbox(
+        "选择一部电影查看详情",
+        options=list(titles),
+        format_func=lambda x: titles[x]
+    )
+    
+    if selected_movie:
+        show_movie_details(selected_movie, dataset)
+
+
+def show_movie_details(movie_id, dataset):
     """显示电影详细信息"""
-    stats, movie_ratings = get_movie_ratings(ratings, movies, movie_id)
+    stats, movie_ratings = get_movie_ratings(dataset, movie_id)
     
     if stats is None:
         st.warning("该电影暂无评分数据")
@@ -162,6 +310,10 @@ def show_movie_details(movie_id, movies, ratings):
         st.write(f"**电影名称：** {stats['电影名称']}")
         st.write(f"**类型：** {stats['类型']}")
         st.write(f"**电影ID：** {movie_id}")
+        
+        movie_tags = get_tag_index(dataset).movie_tags(movie_id)
+        if movie_tags:
+            st.write(f"**标签：** {', '.join(movie_tags[:20])}")
     
     with col2:
         st.markdown("### ⭐ 评分统计")
@@ -195,9 +347,9 @@ def show_movie_details(movie_id, movies, ratings):
         
         st.dataframe(yearly_ratings, use_container_width=True, hide_index=True)
     
-    # 最新评分
+    # 最新评分（get_movie_ratings 返回的评分已按时间从新到旧排列）
     st.markdown("### 📝 最新评分记录")
-    latest_ratings = movie_ratings.nlargest(20, 'timestamp')[
+    latest_ratings = movie_ratings.head(20)[
         ['userId', 'rating', 'datetime']
     ].copy()
     latest_ratings.columns = ['用户ID', '评分', '评分时间']
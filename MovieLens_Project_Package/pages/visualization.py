@@ -7,21 +7,21 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from data_loader import (
-    get_merged_data,
     get_yearly_stats,
-    get_genre_stats,
-    get_rating_distribution
+    get_genre_ratings,
+    filter_genre_ratings,
+    summarize_genre_ratings,
+    get_rating_distribution,
+    get_movie_aggregates
 )
 
 
-def show(movies, ratings):
+def show(dataset):
     """显示可视化分析页面"""
+    movies, ratings = dataset.movies, dataset.ratings
     st.title("📈 可视化分析")
     st.markdown("---")
     
-    # 获取合并数据
-    merged_data = get_merged_data(movies, ratings)
-    
     # 侧边栏筛选
     st.sidebar.markdown("### 📊 数据筛选")
     
@@ -38,6 +38,7 @@ def show(movies, ratings):
             (ratings['year'] <= year_range[1])
         ]
     else:
+        year_range = None
         filtered_ratings = ratings
     
     # 评分筛选
@@ -53,6 +54,15 @@ def show(movies, ratings):
         (filtered_ratings['rating'] <= rating_range[1])
     ]
     
+    # 筛选只会去掉评分，行数不变说明未筛选，直接复用完整数据集的缓存结果；
+    # 否则派生出以筛选条件为版本号的数据集，缓存函数不必对筛选结果求哈希
+    if len(filtered_ratings) == len(ratings):
+        filtered_dataset = dataset
+    else:
+        filtered_dataset = dataset.with_ratings(
+            filtered_ratings, f"year={year_range};rating={rating_range}"
+        )
+    
     st.info(f"📊 当前筛选条件下共有 **{len(filtered_ratings):,}** 条评分数据")
     
     # Tab 布局
@@ -71,7 +81,7 @@ def show(movies, ratings):
         
         with col1:
             # 评分分布直方图
-            rating_dist = get_rating_distribution(filtered_ratings)
+            rating_dist = get_rating_distribution(filtered_dataset)
             
             fig = px.histogram(
                 filtered_ratings,
@@ -131,27 +141,12 @@ def show(movies, ratings):
     with tab2:
         st.subheader("🎭 电影类型分析")
         
-        # 合并筛选后的数据
-        filtered_merged = filtered_ratings.merge(movies, on='movieId', how='left')
-        
-        # 展开类型统计
-        genre_ratings = []
-        for _, row in filtered_merged.iterrows():
-            if pd.notna(row['genres']) and row['genres'] != '(no genres listed)':
-                for genre in row['genres'].split('|'):
-                    genre_ratings.append({
-                        'genre': genre,
-                        'rating': row['rating']
-                    })
-        
-        genre_df = pd.DataFrame(genre_ratings)
+        # 从预先展开的类型评分长表中取出筛选后的评分
+        genre_df = filter_genre_ratings(get_genre_ratings(dataset), filtered_ratings)
         
         if len(genre_df) > 0:
             # 类型评分统计
-            genre_stats = genre_df.groupby('genre').agg({
-                'rating': ['mean', 'count', 'std']
-            }).reset_index()
-            genre_stats.columns = ['genre', 'avg_rating', 'count', 'std']
+            genre_stats = summarize_genre_ratings(genre_df)
             genre_stats = genre_stats.sort_values('count', ascending=False)
             
             col1, col2 = st.columns(2)
@@ -203,12 +198,13 @@ def show(movies, ratings):
             top_genres = genre_stats.head(10)['genre'].tolist()
             selected_genres = st.multiselect(
                 "选择要显示的类型（默认显示Top 10）",
-                options=sorted(genre_df['genre'].unique()),
+                options=genre_stats['genre'].sort_values().tolist(),
                 default=top_genres
             )
             
             if selected_genres:
                 genre_violin_data = genre_df[genre_df['genre'].isin(selected_genres)]
+                genre_violin_data = genre_violin_data.assign(genre=genre_violin_data['genre'].astype(str))
                 
                 fig = px.violin(
                     genre_violin_data,
@@ -375,10 +371,7 @@ def show(movies, ratings):
         # 电影热度分析
         st.subheader("🎬 电影热度分析")
         
-        movie_popularity = filtered_ratings.groupby('movieId').agg({
-            'rating': ['count', 'mean']
-        }).reset_index()
-        movie_popularity.columns = ['movieId', 'rating_count', 'avg_rating']
+        movie_popularity = get_movie_aggregates(filtered_dataset)[['rating_count', 'avg_rating']].reset_index()
         
         # 合并电影名称
         movie_popularity = movie_popularity.merge(
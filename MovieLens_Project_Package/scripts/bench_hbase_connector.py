@@ -0,0 +1,106 @@
+"""
+HBaseConnector 端到端性能测试（离线）
+使用进程内的 HBase 替身 fake_happybase，无需 HBase + Thrift 服务即可测试
+导入、读取、校验脚本以及 data_loader 的 CSV 回退路径
+使用方法: python scripts/bench_hbase_connector.py [每次 RPC 延迟毫秒数]
+"""
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.chdir(PROJECT_DIR)
+os.environ['HBASE_BACKEND'] = 'memory'
+os.environ.setdefault('HBASE_ENABLED', 'true')
+os.environ.setdefault('DATA_SOURCE', 'hbase')
+
+import fake_happybase
+import hbase_connector
+from hbase_connector import HBaseConnector, get_hbase_connector
+
+
+def timed(name, func, *args, **kwargs):
+    """运行一次并打印耗时，返回函数结果"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    rows = f"  {len(result):>8,} 行  {len(result) / elapsed:12,.0f} 行/秒" if hasattr(result, '__len__') else ""
+    print(f"  - {name:<24} {elapsed * 1000:9.1f} ms{rows}")
+    return result
+
+
+def bench_import():
+    """导入 CSV（import_to_hbase.py）"""
+    from import_to_hbase import import_csv_to_hbase
+    start = time.perf_counter()
+    import_csv_to_hbase()
+    return time.perf_counter() - start
+
+
+def bench_reads(connector):
+    """读取路径：全表扫描（顺序/并行）、按用户过滤、按电影索引查询"""
+    workers = connector.config['scan_workers']
+    timed('read_movies', connector.read_movies)
+
+    connector.config['scan_workers'] = 1
+    timed('read_ratings 顺序扫描', connector.read_ratings)
+    connector.config['scan_workers'] = workers
+    timed(f'read_ratings {workers} 线程', connector.read_ratings)
+
+    timed('read_ratings 单用户', connector.read_ratings, user_ids=[414])
+    timed('read_ratings 电影过滤', connector.read_ratings, movie_ids=[1, 356])
+    timed('read_ratings 仅行键列', connector.read_ratings, columns=['userId', 'movieId'])
+    timed('read_movie_ratings', connector.read_movie_ratings, 356)
+
+
+def bench_fallback(connect_latency):
+    """HBase 不可用时 data_loader 回退到 CSV 的耗时"""
+    import data_loader
+
+    fake_happybase.configure(available=False, connect_latency=connect_latency)
+    hbase_connector._hbase_connector = None
+    hbase_connector._hbase_availability = None
+    data_loader.load_ratings.clear()
+    try:
+        timed('load_ratings (HBase 不可用)', data_loader.load_ratings)
+    finally:
+        fake_happybase.configure(available=True, connect_latency=0.0)
+        hbase_connector._hbase_connector = None
+        hbase_connector._hbase_availability = None
+
+
+def main():
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.001
+
+    fake_happybase.reset()
+    fake_happybase.configure(latency=latency)
+
+    elapsed = bench_import()
+
+    print("=" * 60)
+    print(f"HBaseConnector 性能测试（fake_happybase，RPC 延迟 {latency * 1000:.1f} ms）")
+    print("=" * 60)
+    print(f"\n⬆️  导入 CSV: {elapsed:.2f} 秒")
+
+    connector = get_hbase_connector()
+    if not connector.is_connected():
+        connector.connect()
+
+    print("\n📖 读取")
+    bench_reads(connector)
+
+    print("\n🔍 校验脚本")
+    from scripts.verify_hbase_data import verify_movies_table, verify_ratings_table
+    timed('verify_movies_table', verify_movies_table, connector)
+    timed('verify_ratings_table', verify_ratings_table, connector)
+    connector.disconnect()
+
+    print("\n↩️  CSV 回退")
+    bench_fallback(connect_latency=latency)
+
+    print("\n✅ 测试完成")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+ratings 表多进程批量导入工具
+主进程只解析一遍 ratings.csv 并按行键区间切分，每个区间的数据交给写入进程，
+写入进程使用独立的连接和 batch 并发写入，导入完成后按区间统计 HBase 中的行数进行校验
+使用方法: python scripts/bulk_load_ratings.py --workers 8 [--no-wal]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from hbase_connector import get_hbase_connector, quantile_split_points
+from hbase_config import get_hbase_config, get_table_name
+from import_to_hbase import (
+    RATINGS_CSV_DTYPES,
+    compute_split_points,
+    estimate_chunk_rows,
+    prepare_movies,
+    prepare_ratings,
+    sample_ratings,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="多进程批量导入 ratings 表")
+    parser.add_argument('--csv-dir', default=os.path.join(PROJECT_DIR, 'ml-latest-small'), help="CSV 文件目录")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="写入进程数")
+    parser.add_argument('--no-wal', action='store_true',
+                        help="不写 WAL（仅用于初次导入；RegionServer 宕机会丢失未刷盘的数据）")
+    parser.add_argument('--memory-limit', type=int, default=None, help="每个进程单个数据块的内存上限（MB）")
+    parser.add_argument('--skip-movies', action='store_true', help="不导入 movies.csv")
+    return parser.parse_args()
+
+
+def connect():
+    """获取当前进程的连接器，未连接时主动建立连接"""
+    connector = get_hbase_connector()
+    if not connector.is_connected():
+        connector.connect()
+    return connector
+
+
+def encode_keys(codec, ratings):
+    """把评分的行键编码为 numpy 定长字节数组，便于向量化地按区间筛选"""
+    return np.array(codec.encode_many(ratings['userId'], ratings['movieId'], ratings['timestamp']), dtype=bytes)
+
+
+def plan_key_ranges(connector, codec, ratings_csv, workers):
+    """
+    把行键空间划分为 workers 个区间
+
+    表已预分区且 Region 数不少于进程数时按 Region 边界分组，保证每个进程只写少数几个 Region；
+    否则对 CSV 中的行键等间隔抽样，取分位数作为切分点，使各区间行数大致相同。
+
+    Returns:
+        list: [(row_start, row_stop), ...]，None 表示行键空间的开头或结尾
+    """
+    if workers <= 1:
+        return [(None, None)]
+
+    with connector.table(get_table_name('ratings')) as table:
+        region_splits = sorted(region['start_key'] for region in table.regions() if region['start_key'])
+
+    if len(region_splits) + 1 >= workers:
+        step = (len(region_splits) + 1) / workers
+        splits = [region_splits[int(step * i) - 1] for i in range(1, workers)]
+    else:
+        sample = sample_ratings(ratings_csv)
+        splits = quantile_split_points(codec.encode_many(sample['userId'], sample['movieId'], sample['timestamp']), workers)
+        if not splits:
+            return [(None, None)]
+
+    splits = sorted(set(bytes(s) for s in splits))
+    bounds = [None] + splits + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def partition_chunk(codec, chunk, ranges):
+    """
+    按行键区间切分一个数据块（每个数据块只编码一次行键）
+
+    Returns:
+        list: [(区间序号, 该区间的评分), ...]，不含空区间
+    """
+    if len(ranges) == 1:
+        return [(0, chunk)]
+    splits = np.array([row_stop for _, row_stop in ranges[:-1]], dtype=bytes)
+    range_ids = np.searchsorted(splits, encode_keys(codec, chunk), side='right')
+    return [(int(i), chunk[range_ids == i]) for i in np.unique(range_ids)]
+
+
+def write_part(part, wal):
+    """
+    写入进程：写入主进程切分好的一部分评分（表由主进程预先创建）
+
+    Returns:
+        tuple: (写入行数, 耗时秒数)
+    """
+    start = time.perf_counter()
+    connector = connect()
+    part = prepare_ratings(part.reset_index(drop=True))
+    connector.write_ratings(part, wal=wal)
+    return len(part), time.perf_counter() - start
+
+
+def count_range(row_start, row_stop):
+    """只传输行键统计区间内的行数"""
+    connector = connect()
+    with connector.table(get_table_name('ratings')) as table:
+        scanner = table.scan(row_start=row_start, row_stop=row_stop,
+                             filter=b'KeyOnlyFilter() AND FirstKeyOnlyFilter()')
+        return sum(1 for _ in scanner)
+
+
+class _InlineExecutor:
+    """只有一个进程时在主进程中直接执行"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def load_ranges(executor, codec, ratings_csv, ranges, chunk_rows, wal, workers):
+    """
+    主进程流式读取 CSV，每个数据块按区间切分后提交给写入进程，
+    同时在途的数据块不超过进程数的两倍，内存占用有上限
+
+    Returns:
+        tuple: (各区间写入行数, 各区间写入耗时秒数)
+    """
+    written = [0] * len(ranges)
+    seconds = [0.0] * len(ranges)
+    pending = {}
+    total = 0
+    start = time.perf_counter()
+
+    def collect(done):
+        nonlocal total
+        for future in done:
+            range_id = pending.pop(future)
+            rows, elapsed = future.result()
+            written[range_id] += rows
+            seconds[range_id] += elapsed
+            total += rows
+        print(f"  已写入 {total:,} 行（{total / (time.perf_counter() - start):,.0f} 行/秒）", flush=True)
+
+    for chunk in pd.read_csv(ratings_csv, chunksize=chunk_rows, dtype=RATINGS_CSV_DTYPES):
+        for range_id, part in partition_chunk(codec, chunk, ranges):
+            pending[executor.submit(write_part, part, wal)] = range_id
+        while len(pending) > 2 * workers:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    if pending:
+        collect(wait(pending)[0])
+    return written, seconds
+
+
+def bulk_load(args):
+    """批量导入入口"""
+    ratings_csv = os.path.join(args.csv_dir, 'ratings.csv')
+    movies_csv = os.path.join(args.csv_dir, 'movies.csv')
+    memory_limit_mb = args.memory_limit or get_hbase_config()['import_memory_limit_mb']
+    wal = not args.no_wal
+    workers = args.workers
+    if get_hbase_config()['backend'] == 'memory' and workers > 1:
+        # 进程内替身的数据只存在于当前进程中，写入进程无法共享
+        print("memory 后端只支持单进程导入，已改为 --workers 1")
+        workers = 1
+
+    print("=" * 60)
+    print("ratings 表多进程批量导入工具")
+    print("=" * 60)
+    print(f"  数据文件: {ratings_csv}")
+    print(f"  进程数: {workers}，WAL: {'开启' if wal else '关闭'}")
+    if not wal:
+        print("  ⚠️  WAL 已关闭：导入完成前 RegionServer 宕机会丢失数据，请仅用于可重跑的初次导入")
+
+    connector = connect()
+    connector.create_tables(split_points=compute_split_points(ratings_csv, connector.rating_keys))
+
+    if not args.skip_movies:
+        print(f"\n⬆️  导入电影数据...")
+        connector.write_movies(prepare_movies(pd.read_csv(movies_csv)))
+
+    chunk_rows = estimate_chunk_rows(ratings_csv, prepare_ratings, memory_limit_mb, dtype=RATINGS_CSV_DTYPES)
+    ranges = plan_key_ranges(connector, connector.rating_keys, ratings_csv, workers)
+    print(f"\n📐 划分为 {len(ranges)} 个行键区间，每块 {chunk_rows:,} 行")
+
+    codec = connector.rating_keys
+    start = time.perf_counter()
+    if len(ranges) == 1:
+        executor = _InlineExecutor()
+    else:
+        # 使用 spawn 启动子进程，避免 fork 继承父进程已打开的 Thrift 连接
+        connector.disconnect()
+        executor = ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context('spawn'))
+    with executor:
+        written, seconds = load_ranges(executor, codec, ratings_csv, ranges, chunk_rows, wal, len(ranges))
+        elapsed = time.perf_counter() - start
+
+        print("\n📊 校验行数...")
+        counted = list(executor.map(count_range, *zip(*ranges)))
+
+    total_written = total_counted = 0
+    for i, (row_start, row_stop) in enumerate(ranges):
+        status = "✅" if written[i] == counted[i] else "⚠️ "
+        print(f"  {status} 区间 {i} [{row_start!r}, {row_stop!r}): 写入 {written[i]:,} 行，"
+              f"HBase 中 {counted[i]:,} 行（写入耗时 {seconds[i]:.1f} 秒）")
+        total_written += written[i]
+        total_counted += counted[i]
+
+    print(f"\n  合计写入 {total_written:,} 行，耗时 {elapsed:.1f} 秒（{total_written / elapsed:,.0f} 行/秒）")
+    if total_written != total_counted:
+        print("❌ 行数不一致：CSV 中可能有重复的行键，或表中已有其他数据")
+        return
+    print("✅ 批量导入完成！")
+
+
+if __name__ == '__main__':
+    bulk_load(parse_args())
@@ -0,0 +1,335 @@
+"""
+CSV 与 HBase 的 ratings 数据一致性比较（范围校验和）
+按行键把 ratings 划分为若干叶子区间，CSV 和 HBase 两侧分别流式计算每个区间的
+摘要（行数 + 行哈希之和），再自底向上合并为 Merkle 树，自顶向下只展开摘要不一致的
+节点，最后仅对不一致的叶子区间逐行比较，给出缺失、多余和取值不一致的行
+使用方法: python scripts/compare_csv_hbase.py [--csv-dir ml-latest-small] [--leaf-rows 10000]
+"""
+import argparse
+import itertools
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from hbase_connector import (
+    RATINGS_COLUMN_TYPES,
+    ColumnarScanDecoder,
+    _ratings_scan_columns,
+    get_hbase_connector,
+    quantile_split_points,
+)
+from hbase_config import get_table_name
+from import_to_hbase import RATINGS_CSV_DTYPES, sample_ratings
+
+# 参与比较的列；两侧都先转换为 float64 再哈希，避免缺失值导致的整型/浮点型差异
+COMPARE_COLUMNS = ['userId', 'movieId', 'rating', 'timestamp']
+
+# HBase 一侧只扫描参与比较的列（字符串和二进制两种存储格式的列限定符都扫描，表中两种格式可以共存）
+SCAN_COLUMNS = _ratings_scan_columns(COMPARE_COLUMNS)
+
+# 每个叶子区间的目标行数
+DEFAULT_LEAF_ROWS = 10000
+
+# Merkle 树每个节点的子节点数
+DEFAULT_FANOUT = 16
+
+# 流式计算摘要时每批处理的行数
+BATCH_ROWS = 100000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="用范围校验和比较 ratings.csv 与 HBase 中的 ratings 表")
+    parser.add_argument('--csv-dir', default=os.path.join(PROJECT_DIR, 'ml-latest-small'), help="CSV 文件目录")
+    parser.add_argument('--leaf-rows', type=int, default=DEFAULT_LEAF_ROWS, help="每个叶子区间的目标行数")
+    parser.add_argument('--fanout', type=int, default=DEFAULT_FANOUT, help="Merkle 树每个节点的子节点数")
+    parser.add_argument('--examples', type=int, default=5, help="每类差异最多打印的示例行数")
+    return parser.parse_args()
+
+
+def row_hashes(frame):
+    """每行 COMPARE_COLUMNS 的 64 位哈希"""
+    canonical = frame[COMPARE_COLUMNS].astype(np.float64)
+    return pd.util.hash_pandas_object(canonical, index=False).to_numpy(dtype=np.uint64)
+
+
+class RangeDigests:
+    """
+    每个叶子区间的摘要：行数和行哈希之和（按 2^64 取模）
+
+    求和与行的顺序无关，两侧可以各自按任意顺序、分批累加。
+    """
+
+    def __init__(self, leaves):
+        self.counts = np.zeros(leaves, dtype=np.int64)
+        self.sums = np.zeros(leaves, dtype=np.uint64)
+
+    def add(self, leaf_ids, hashes):
+        np.add.at(self.counts, leaf_ids, 1)
+        np.add.at(self.sums, leaf_ids, hashes)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.sums += other.sums
+        return self
+
+    def levels(self, fanout):
+        """
+        自底向上构建 Merkle 树
+
+        Returns:
+            list: 从根到叶子的各层 (counts, sums)
+        """
+        levels = [(self.counts, self.sums)]
+        while len(levels[0][0]) > 1:
+            counts, sums = levels[0]
+            starts = np.arange(0, len(counts), fanout)
+            levels.insert(0, (np.add.reduceat(counts, starts), np.add.reduceat(sums, starts)))
+        return levels
+
+
+class LeafRanges:
+    """按 CSV 行键样本的分位数划分的叶子区间"""
+
+    def __init__(self, codec, bounds):
+        """
+        Args:
+            codec: ratings 表的行键编解码器
+            bounds: 严格递增的区间边界（bytes 行键），叶子 i 为 [bounds[i-1], bounds[i])
+        """
+        self.codec = codec
+        self.bounds = list(bounds)
+        # 同一布局下行键等长（binary）或不含 \x00（text），numpy 定长字节串的比较与 bytes 一致
+        self._sorted = np.array(self.bounds, dtype=bytes)
+
+    @classmethod
+    def from_csv(cls, codec, ratings_csv, leaf_rows):
+        with open(ratings_csv, 'rb') as f:
+            total_rows = sum(1 for _ in f) - 1
+        sample = sample_ratings(ratings_csv)
+        keys = codec.encode_many(sample['userId'], sample['movieId'], sample['timestamp'])
+        return cls(codec, quantile_split_points(keys, max(1, math.ceil(total_rows / leaf_rows))))
+
+    def __len__(self):
+        return len(self.bounds) + 1
+
+    def range(self, leaf):
+        """叶子区间的 (row_start, row_stop)，None 表示行键空间的开头或结尾"""
+        row_start = self.bounds[leaf - 1] if leaf > 0 else None
+        row_stop = self.bounds[leaf] if leaf < len(self.bounds) else None
+        return row_start, row_stop
+
+    def leaf_ids(self, keys):
+        """行键所在的叶子区间编号"""
+        return np.searchsorted(self._sorted, np.array(keys, dtype=bytes), side='right')
+
+    def groups(self, parts):
+        """把叶子区间按顺序合并为最多 parts 个扫描区间，返回每组的 (首个叶子, 末个叶子 + 1)"""
+        step = max(1, math.ceil(len(self) / parts))
+        return [(start, min(start + step, len(self))) for start in range(0, len(self), step)]
+
+
+def csv_chunks(ratings_csv, leaves, chunk_rows=BATCH_ROWS):
+    """流式读取 CSV，逐块产出带行键和叶子编号的评分"""
+    for chunk in pd.read_csv(ratings_csv, chunksize=chunk_rows, dtype=RATINGS_CSV_DTYPES):
+        keys = leaves.codec.encode_many(chunk['userId'], chunk['movieId'], chunk['timestamp'])
+        chunk['key'] = np.array(keys, dtype=object)
+        chunk['leaf'] = leaves.leaf_ids(keys)
+        yield chunk
+
+
+def decode_batches(scanner, batch_rows=BATCH_ROWS):
+    """把 scan 结果按批解码为带行键的评分 DataFrame"""
+    scanner = iter(scanner)
+    while True:
+        batch = list(itertools.islice(scanner, batch_rows))
+        if not batch:
+            return
+        decoder = ColumnarScanDecoder(RATINGS_COLUMN_TYPES, key_column='key', key_type='bytes')
+        yield decoder.feed(batch).to_frame()
+
+
+def csv_digests(ratings_csv, leaves):
+    """CSV 一侧的叶子摘要"""
+    digests = RangeDigests(len(leaves))
+    for chunk in csv_chunks(ratings_csv, leaves):
+        digests.add(chunk['leaf'].to_numpy(), row_hashes(chunk))
+    return digests
+
+
+def hbase_digests(connector, leaves):
+    """HBase 一侧的叶子摘要：按叶子区间分组并行扫描，每组流式计算"""
+    table_name = get_table_name('ratings')
+    workers = max(1, min(connector.config['scan_workers'], connector.config['pool_size']))
+
+    def scan_group(group):
+        first, stop = group
+        row_start, row_stop = leaves.range(first)[0], leaves.range(stop - 1)[1]
+        digests = RangeDigests(len(leaves))
+        with connector.table(table_name) as table:
+            for frame in decode_batches(table.scan(row_start=row_start, row_stop=row_stop, columns=SCAN_COLUMNS)):
+                digests.add(leaves.leaf_ids(frame['key'].tolist()), row_hashes(frame))
+        return digests
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(scan_group, leaves.groups(workers * 4)))
+    total = RangeDigests(len(leaves))
+    for digests in partials:
+        total.merge(digests)
+    return total
+
+
+def mismatched_leaves(csv_tree, hbase_tree, fanout):
+    """
+    自顶向下比较两棵 Merkle 树，只展开摘要不一致的节点
+
+    Returns:
+        tuple: (不一致的叶子编号列表, 每层 (比较的节点数, 不一致的节点数))
+    """
+    nodes = np.arange(len(csv_tree[0][0]))
+    stats = []
+    for depth, ((csv_counts, csv_sums), (hbase_counts, hbase_sums)) in enumerate(zip(csv_tree, hbase_tree)):
+        differs = (csv_counts[nodes] != hbase_counts[nodes]) | (csv_sums[nodes] != hbase_sums[nodes])
+        mismatched = nodes[differs]
+        stats.append((len(nodes), len(mismatched)))
+        if len(mismatched) == 0:
+            break
+        if depth + 1 < len(csv_tree):
+            width = len(csv_tree[depth + 1][0])
+            nodes = np.array([
+                child for node in mismatched
+                for child in range(node * fanout, min((node + 1) * fanout, width))
+            ], dtype=np.int64)
+    return mismatched.tolist(), stats
+
+
+def diff_leaves(connector, ratings_csv, leaves, leaf_ids):
+    """
+    逐行比较不一致的叶子区间
+
+    Returns:
+        dict: {'missing': CSV 有而 HBase 没有的行, 'extra': HBase 有而 CSV 没有的行,
+               'mismatched': 行键相同但取值不一致的行（_csv/_hbase 后缀）}
+    """
+    wanted = set(leaf_ids)
+    csv_rows = [chunk[chunk['leaf'].isin(wanted)] for chunk in csv_chunks(ratings_csv, leaves)]
+    csv_rows = pd.concat(csv_rows, ignore_index=True)[['key'] + COMPARE_COLUMNS]
+
+    table_name = get_table_name('ratings')
+
+    def scan_leaf(leaf):
+        row_start, row_stop = leaves.range(leaf)
+        with connector.table(table_name) as table:
+            decoder = ColumnarScanDecoder(RATINGS_COLUMN_TYPES, key_column='key', key_type='bytes')
+            return decoder.feed(table.scan(row_start=row_start, row_stop=row_stop, columns=SCAN_COLUMNS)).to_frame()
+
+    workers = max(1, min(connector.config['scan_workers'], connector.config['pool_size'], len(leaf_ids)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        frames = [frame for frame in executor.map(scan_leaf, leaf_ids) if len(frame)]
+    hbase_rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['key'])
+    hbase_rows = hbase_rows.reindex(columns=['key'] + COMPARE_COLUMNS)
+
+    merged = csv_rows.merge(hbase_rows, on='key', how='outer', suffixes=('_csv', '_hbase'), indicator=True)
+    both = merged[merged['_merge'] == 'both']
+    differs = np.zeros(len(both), dtype=bool)
+    for column in COMPARE_COLUMNS:
+        left = both[f'{column}_csv'].astype(np.float64)
+        right = both[f'{column}_hbase'].astype(np.float64)
+        differs |= ~((left == right) | (left.isna() & right.isna())).to_numpy()
+
+    def side(which):
+        rows = merged[merged['_merge'] == which]
+        suffix = '_csv' if which == 'left_only' else '_hbase'
+        return rows[['key'] + [f'{c}{suffix}' for c in COMPARE_COLUMNS]].rename(
+            columns=lambda c: c.removesuffix(suffix)).reset_index(drop=True)
+
+    result = {
+        'missing': side('left_only'),
+        'extra': side('right_only'),
+        'mismatched': both[differs].drop(columns='_merge').reset_index(drop=True),
+    }
+    # 比较时统一为浮点，输出时整数列还原为（可空的）整型
+    for rows in result.values():
+        for column in rows.columns:
+            if column.split('_')[0] in ('userId', 'movieId', 'timestamp'):
+                rows[column] = rows[column].astype('Int64')
+    return result
+
+
+def compare_ratings(connector, ratings_csv, leaf_rows=DEFAULT_LEAF_ROWS, fanout=DEFAULT_FANOUT, examples=5):
+    """
+    用范围校验和比较 ratings.csv 与 HBase 中的 ratings 表
+
+    Args:
+        connector: HBase 连接器
+        ratings_csv: ratings.csv 路径
+        leaf_rows: 每个叶子区间的目标行数
+        fanout: Merkle 树每个节点的子节点数
+        examples: 每类差异最多打印的示例行数
+
+    Returns:
+        dict: 见 diff_leaves，完全一致时各项均为空表
+    """
+    leaves = LeafRanges.from_csv(connector.rating_keys, ratings_csv, leaf_rows)
+    print(f"🌳 按行键划分为 {len(leaves):,} 个叶子区间（每个约 {leaf_rows:,} 行）")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        csv_future = executor.submit(csv_digests, ratings_csv, leaves)
+        hbase = hbase_digests(connector, leaves)
+        csv = csv_future.result()
+    print(f"  CSV: {csv.counts.sum():,} 行，HBase: {hbase.counts.sum():,} 行"
+          f"（计算摘要 {time.perf_counter() - start:.2f} 秒）")
+
+    leaf_ids, stats = mismatched_leaves(csv.levels(fanout), hbase.levels(fanout), fanout)
+    for depth, (compared, mismatched) in enumerate(stats):
+        print(f"  - 第 {depth} 层: 比较 {compared:,} 个节点，{mismatched:,} 个不一致")
+
+    if not leaf_ids:
+        print("✅ 所有区间的摘要一致")
+        empty = pd.DataFrame(columns=['key'] + COMPARE_COLUMNS)
+        return {'missing': empty, 'extra': empty.copy(), 'mismatched': empty.copy()}
+
+    print(f"\n🔍 逐行比较 {len(leaf_ids):,} 个不一致的叶子区间...")
+    start = time.perf_counter()
+    result = diff_leaves(connector, ratings_csv, leaves, leaf_ids)
+    print(f"  完成（{time.perf_counter() - start:.2f} 秒）")
+
+    labels = {
+        'missing': "缺失（CSV 中有、HBase 中没有）",
+        'extra': "多余（HBase 中有、CSV 中没有）",
+        'mismatched': "取值不一致",
+    }
+    for name, label in labels.items():
+        rows = result[name]
+        status = "✅" if rows.empty else "❌"
+        print(f"  {status} {label}: {len(rows):,} 行")
+        if not rows.empty and examples:
+            print(rows.head(examples).to_string(index=False))
+    return result
+
+
+def main():
+    args = parse_args()
+    ratings_csv = os.path.join(args.csv_dir, 'ratings.csv')
+
+    print("=" * 60)
+    print("CSV 与 HBase 一致性比较（范围校验和）")
+    print("=" * 60)
+
+    connector = get_hbase_connector()
+    if not connector.is_connected():
+        connector.connect()
+    compare_ratings(connector, ratings_csv, args.leaf_rows, args.fanout, args.examples)
+    connector.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,78 @@
 """
 Create HBase Tables
+Usage: python scripts/create_tables.py [--profile default|production|minimal] [--ratings-csv path]
 """
+import argparse
+import os
+import sys
+
 import happybase
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hbase_config import TABLE_PROFILES, get_hbase_config, get_table_name, get_table_profile
+from hbase_connector import RatingKeyCodec, provision_table, provisioned_table_types
+
 # HBase Configuration
 HBASE_HOST = 'hbase'
 HBASE_PORT = 9090
 
-def create_tables():
+DEFAULT_RATINGS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'ml-latest-small', 'ratings.csv')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create MovieLens HBase tables")
+    parser.add_argument('--profile', choices=sorted(TABLE_PROFILES), default=None,
+                        help="provisioning profile from hbase_config.TABLE_PROFILES")
+    parser.add_argument('--ratings-csv', default=DEFAULT_RATINGS_CSV,
+                        help="ratings.csv used to compute pre-split points")
+    return parser.parse_args()
+
+
+def compute_split_points(ratings_csv, profile):
+    """Pre-split points from the row-key distribution of ratings.csv (if it exists)"""
+    if not ratings_csv or not os.path.exists(ratings_csv):
+        print(f"{ratings_csv} not found, tables will not be pre-split")
+        return {}
+
+    from import_to_hbase import compute_split_points as from_csv
+    codec = RatingKeyCodec.from_config(get_hbase_config())
+    split_points = from_csv(ratings_csv, codec, profile)
+    if codec.salt_buckets > 1:
+        split_points['ratings'] = codec.salt_split_points()
+    return split_points
+
+
+def create_tables(profile=None, ratings_csv=DEFAULT_RATINGS_CSV):
     try:
         connection = happybase.Connection(host=HBASE_HOST, port=HBASE_PORT)
         print("Connected to HBase")
-        
+
         tables = connection.tables()
         print(f"Existing tables: {tables}")
-        
-        # Create 'movielens:movies'
-        # Note: happybase usually handles 'table_name' directly. 
+
+        # Note: happybase usually handles 'table_name' directly.
         # If namespace is used, it might be part of the name if configured.
         # But standard HBase thrift usually treats 'namespace:table' as the table name.
-        
-        table_name = 'movies'
-        if table_name.encode() not in tables:
-            print(f"Creating table {table_name}")
-            connection.create_table(
-                table_name,
-                {'info': dict()}
-            )
-        else:
-            print(f"Table {table_name} already exists")
-            
-        # Create 'ratings'
-        table_name = 'ratings'
-        if table_name.encode() not in tables:
-            print(f"Creating table {table_name}")
-            connection.create_table(
-                table_name,
-                {'info': dict()}
-            )
-        else:
-            print(f"Table {table_name} already exists")
-            
+
+        split_points = compute_split_points(ratings_csv, profile)
+
+        for table_type in provisioned_table_types(get_hbase_config()):
+            table_name = get_table_name(table_type)
+            if table_name.encode() not in tables:
+                print(f"Creating table {table_name}")
+                provision_table(connection, table_name, get_table_profile(table_type, profile),
+                                split_points.get(table_type))
+            else:
+                print(f"Table {table_name} already exists")
+
         connection.close()
         print("Tables created successfully")
-        
+
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    create_tables()
+    args = parse_args()
+    create_tables(args.profile, args.ratings_csv)
@@ -0,0 +1,106 @@
+"""
+ratings 表行键迁移工具
+把现有 ratings 表按新的行键布局（和可选的存储格式）重写到目标表
+使用方法: python scripts/migrate_rating_keys.py --layout binary --salt-buckets 16
+"""
+import argparse
+import os
+import sys
+import time
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hbase_connector import (
+    get_hbase_connector,
+    ColumnarScanDecoder,
+    RatingKeyCodec,
+    RATINGS_COLUMN_TYPES,
+    RATINGS_FORMAT_TEXT,
+    RATINGS_FORMAT_BINARY,
+    add_time_columns,
+    provision_table,
+)
+from hbase_config import get_table_name, get_table_profile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="重写 ratings 表的行键布局")
+    parser.add_argument('--source', default=get_table_name('ratings'), help="源表名")
+    parser.add_argument('--target', default=None, help="目标表名，默认为 <源表名>_migrated")
+    parser.add_argument('--layout', choices=RatingKeyCodec.LAYOUTS, default='binary', help="目标行键布局")
+    parser.add_argument('--salt-buckets', type=int, default=0, help="盐值分桶数，0 表示不加盐")
+    parser.add_argument('--format', type=int, choices=[RATINGS_FORMAT_TEXT, RATINGS_FORMAT_BINARY],
+                        default=RATINGS_FORMAT_BINARY, help="目标单元格存储格式")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="每批迁移的行数")
+    return parser.parse_args()
+
+
+def count_rows(connector, table_name):
+    """只传输行键统计表的行数"""
+    with connector.table(table_name) as table:
+        return sum(1 for _ in table.scan(filter=b'KeyOnlyFilter() AND FirstKeyOnlyFilter()'))
+
+
+def migrate_rating_keys(args):
+    """按块扫描源表，解码后用新的行键编解码器写入目标表"""
+    target = args.target or f"{args.source}_migrated"
+    codec = RatingKeyCodec(args.layout, args.salt_buckets)
+
+    print("=" * 60)
+    print("ratings 表行键迁移工具")
+    print("=" * 60)
+    print(f"  源表: {args.source}")
+    print(f"  目标表: {target}（布局 {args.layout}，盐值分桶 {args.salt_buckets}，格式 {args.format}）")
+
+    connector = get_hbase_connector()
+    if not connector.is_connected():
+        print("❌ 无法连接到 HBase，请检查配置")
+        return
+
+    # 目标表按 ratings 表的建表配置创建，加盐布局按盐值分桶预分区
+    with connector.connection() as connection:
+        if target.encode() not in connection.tables():
+            provision_table(connection, target, get_table_profile('ratings'), codec.salt_split_points())
+
+    migrated = 0
+    start = time.perf_counter()
+    with connector.table(args.source) as table:
+        scanner = iter(table.scan(batch_size=min(args.chunk_size, 10000)))
+        while True:
+            decoder = ColumnarScanDecoder(RATINGS_COLUMN_TYPES, initial_capacity=args.chunk_size)
+            decoder.feed(islice(scanner, args.chunk_size))
+            if len(decoder) == 0:
+                break
+
+            chunk = decoder.to_frame()
+            if args.format == RATINGS_FORMAT_TEXT:
+                chunk = add_time_columns(chunk)
+            connector.write_ratings(chunk, storage_format=args.format, table_name=target, key_codec=codec)
+
+            migrated += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"  已迁移 {migrated:,} 行（{migrated / elapsed:,.0f} 行/秒）")
+
+    print("\n📊 校验行数...")
+    source_count = count_rows(connector, args.source)
+    target_count = count_rows(connector, target)
+    print(f"  - 源表: {source_count:,} 行")
+    print(f"  - 目标表: {target_count:,} 行")
+
+    connector.disconnect()
+
+    if source_count != target_count:
+        print("❌ 行数不一致，请检查后重新迁移")
+        return
+
+    print("\n✅ 迁移完成！")
+    print("\n💡 提示: 修改 hbase_config.py 以使用新表:")
+    print(f"  HBASE_CONFIG['tables']['ratings'] = '{target}'")
+    print(f"  HBASE_CONFIG['rating_key_layout'] = '{args.layout}'")
+    print(f"  HBASE_CONFIG['rating_key_salt_buckets'] = {args.salt_buckets}")
+    print(f"  HBASE_CONFIG['ratings_format'] = {args.format}")
+
+
+if __name__ == '__main__':
+    migrate_rating_keys(parse_args())
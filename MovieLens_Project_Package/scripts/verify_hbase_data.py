@@ -1,13 +1,57 @@
 """
 HBase 数据验证脚本
 用于验证数据是否正确导入 HBase
+
+ratings 表使用抽样验证：行数通过多个行键区间并行的 KeyOnly 扫描精确统计，
+扫描的同时对行键做蓄水池抽样，再按行键读取样本行，
+字段完整性和取值范围基于样本估计，并给出置信区间
+指定 --csv-dir 时，再用范围校验和逐区间比较 ratings.csv 与 HBase（见 compare_csv_hbase.py）
+使用方法: python scripts/verify_hbase_data.py [--sample-size 1000] [--parts 16] [--seed 42] [--csv-dir ml-latest-small]
 """
-from hbase_connector import get_hbase_connector
-from hbase_config import get_table_name
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hbase_connector import RATINGS_COLUMN_TYPES, ColumnarScanDecoder, get_hbase_connector
+from hbase_config import get_table_name
+from compare_csv_hbase import compare_ratings
+
+KEY_ONLY_FILTER = b'KeyOnlyFilter() AND FirstKeyOnlyFilter()'
+
+# 默认样本量；样本量为 n 时比例估计的 95% 置信区间半宽不超过 1/sqrt(n)
+DEFAULT_SAMPLE_SIZE = 1000
+
+# 置信水平 95% 对应的正态分位数
+Z_95 = 1.96
 
-def verify_hbase_data():
+# ratings 表的取值范围检查：列名 -> (说明, 判断取值合法的函数)
+RATINGS_RANGE_CHECKS = {
+    'userId': ("userId > 0", lambda s: s > 0),
+    'movieId': ("movieId > 0", lambda s: s > 0),
+    'rating': ("rating 为 0.5-5.0 之间的半星", lambda s: s.between(0.5, 5.0) & ((s * 2) % 1 == 0)),
+    'timestamp': ("timestamp 不晚于当前时间", lambda s: (s > 0) & (s <= time.time())),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="验证 HBase 中的 MovieLens 数据")
+    parser.add_argument('--sample-size', type=int, default=DEFAULT_SAMPLE_SIZE, help="ratings 表的样本量")
+    parser.add_argument('--parts', type=int, default=None,
+                        help="统计行数时切分的行键区间数（默认为并行扫描线程数的 4 倍）")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子，用于复现同一份样本")
+    parser.add_argument('--csv-dir', default=None, help="CSV 文件目录，指定时与 HBase 逐区间比较 ratings")
+    return parser.parse_args()
+
+
+def verify_hbase_data(sample_size=DEFAULT_SAMPLE_SIZE, parts=None, seed=None, csv_dir=None):
     """验证 HBase 数据"""
     
     print("=" * 60)
@@ -35,13 +79,20 @@ def verify_hbase_data():
         print("\n" + "=" * 60)
         print("验证 Ratings 表")
         print("=" * 60)
-        verify_ratings_table(connector)
+        ratings_sample = verify_ratings_table(connector, sample_size, parts, seed)
         
         # 数据一致性检查
         print("\n" + "=" * 60)
         print("数据一致性检查")
         print("=" * 60)
-        check_data_consistency(connector)
+        check_data_consistency(connector, ratings_sample)
+
+        # 与 CSV 源数据比较
+        if csv_dir:
+            print("\n" + "=" * 60)
+            print("CSV 与 HBase 比较")
+            print("=" * 60)
+            compare_ratings(connector, os.path.join(csv_dir, 'ratings.csv'))
         
         # 断开连接
         connector.disconnect()
@@ -97,124 +148,290 @@ def verify_movies_table(connector):
         print(f"❌ Movies 表验证失败: {e}")
 
 
-def verify_ratings_table(connector):
-    """验证 ratings 表"""
+def wilson_interval(successes, n, z=Z_95):
+    """
+    比例的 Wilson 置信区间（样本量小或比例接近 0/1 时比正态近似可靠）
+
+    Args:
+        successes: 满足条件的样本数
+        n: 样本量
+        z: 正态分位数
+
+    Returns:
+        tuple: (下限, 上限)
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def mean_interval(values, z=Z_95):
+    """
+    均值及其正态近似置信区间的半宽
+
+    Returns:
+        tuple: (均值, 半宽)
+    """
+    values = pd.Series(values).dropna()
+    if len(values) < 2:
+        return (values.mean() if len(values) else float('nan')), float('nan')
+    return values.mean(), z * values.std(ddof=1) / math.sqrt(len(values))
+
+
+def count_key_range(connector, table_name, row_start, row_stop, reservoir_size=0, rng=None):
+    """
+    只传输行键统计区间内的行数，同时对行键做蓄水池抽样
+
+    使用 Algorithm L：蓄水池装满后按几何分布直接算出下一个被替换的位置，
+    只需 O(k·log(N/k)) 次随机数，扫描每行只多一次比较。
+
+    Args:
+        connector: HBase 连接器
+        table_name: 表名
+        row_start: 区间起始行键（含）
+        row_stop: 区间结束行键（不含）
+        reservoir_size: 蓄水池大小，0 表示不抽样
+        rng: numpy 随机数生成器
+
+    Returns:
+        tuple: (行数, 抽中的行键列表)
+    """
+    count = 0
+    reservoir = []
+    next_pick = weight = None
+    with connector.table(table_name) as table:
+        for key, _ in table.scan(row_start=row_start, row_stop=row_stop, filter=KEY_ONLY_FILTER):
+            if count < reservoir_size:
+                reservoir.append(key)
+                if count + 1 == reservoir_size:
+                    weight = math.exp(math.log(rng.random()) / reservoir_size)
+                    next_pick = count + 1 + math.floor(math.log(rng.random()) / math.log(1 - weight))
+            elif count == next_pick:
+                reservoir[rng.integers(reservoir_size)] = key
+                weight *= math.exp(math.log(rng.random()) / reservoir_size)
+                next_pick += 1 + math.floor(math.log(rng.random()) / math.log(1 - weight))
+            count += 1
+    return count, reservoir
+
+
+def count_rows_parallel(connector, table_name, parts=None, sample_size=0, seed=None):
+    """
+    把行键空间切分为多个区间，并行地用 KeyOnly 扫描统计每个区间的行数，
+    同时在每个区间内抽取最多 sample_size 个行键
+
+    Args:
+        connector: HBase 连接器
+        table_name: 表名
+        parts: 区间数，默认为并行扫描线程数的 4 倍
+        sample_size: 每个区间的蓄水池大小
+        seed: 随机种子
+
+    Returns:
+        list: 每个区间的统计 [{'row_start', 'row_stop', 'count', 'keys'}, ...]
+    """
+    parts = parts or connector.config['scan_workers'] * 4
+    ranges = connector.key_ranges(table_name, parts)
+    # 每个区间使用独立的随机数生成器（Generator 不是线程安全的），给定种子时结果可复现
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(ranges))]
+    workers = max(1, min(connector.config['scan_workers'], connector.config['pool_size'], len(ranges)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda args: count_key_range(connector, table_name, *args[0], sample_size, args[1]),
+            zip(ranges, rngs)
+        ))
+    return [
+        {'row_start': start, 'row_stop': stop, 'count': count, 'keys': keys}
+        for (start, stop), (count, keys) in zip(ranges, results)
+    ]
+
+
+def allocate_samples(counts, sample_size):
+    """按各区间的行数比例分配样本量（最大余数法）"""
+    counts = np.asarray(counts, dtype=np.float64)
+    if counts.sum() == 0:
+        return np.zeros(len(counts), dtype=np.int64)
+    quotas = counts / counts.sum() * sample_size
+    allocated = np.floor(quotas).astype(np.int64)
+    remainder = int(sample_size - allocated.sum())
+    if remainder > 0:
+        allocated[np.argsort(-(quotas - allocated), kind='stable')[:remainder]] += 1
+    return np.minimum(allocated, counts.astype(np.int64))
+
+
+def sample_rows(connector, table_name, strata, sample_size, seed=None):
+    """
+    从各区间的行键样本中按行数比例选出 sample_size 个行键，并行按行键读取完整的行
+
+    每个区间的蓄水池是该区间的均匀样本，按行数比例从中再抽取，
+    合起来就是整张表的无放回均匀样本。
+
+    Args:
+        connector: HBase 连接器
+        table_name: 表名
+        strata: count_rows_parallel 的返回值
+        sample_size: 样本量
+        seed: 随机种子
+
+    Returns:
+        list: 抽到的 (行键, 单元格) 列表
+    """
+    rng = np.random.default_rng(seed)
+    jobs = []
+    for stratum, n in zip(strata, allocate_samples([s['count'] for s in strata], sample_size)):
+        if n > 0:
+            picked = rng.choice(len(stratum['keys']), size=min(int(n), len(stratum['keys'])), replace=False)
+            jobs.append([stratum['keys'][i] for i in sorted(picked)])
+
+    def fetch(keys):
+        with connector.table(table_name) as table:
+            return table.rows(keys)
+
+    workers = max(1, min(connector.config['scan_workers'], connector.config['pool_size'], len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [row for rows in executor.map(fetch, jobs) for row in rows]
+
+
+def verify_ratings_table(connector, sample_size=DEFAULT_SAMPLE_SIZE, parts=None, seed=None):
+    """
+    验证 ratings 表：并行统计行数，并基于随机样本估计字段完整性和取值范围
+
+    Args:
+        connector: HBase 连接器
+        sample_size: 样本量
+        parts: 统计行数时切分的行键区间数
+        seed: 随机种子
+
+    Returns:
+        pd.DataFrame: 解码后的样本（验证失败时为 None）
+    """
     try:
-        # 读取数据（限制数量以避免内存溢出）
-        print("📖 读取 ratings 表数据...")
-        
-        # 获取表对象并扫描
         table_name = get_table_name('ratings')
-        table = connector.get_table(table_name)
         
         # 统计总行数
-        print("📊 统计行数...")
-        row_count = 0
-        for _ in table.scan():
-            row_count += 1
-            if row_count % 10000 == 0:
-                print(f"  已扫描 {row_count} 行...")
-        
-        print(f"✅ 总行数: {row_count:,}")
-        
-        # 读取样例数据
-        print("\n📖 读取样例数据（前1000条）...")
-        sample_data = []
-        for i, (key, value) in enumerate(table.scan(limit=1000)):
-            row = {}
-            for col, val in value.items():
-                col_name = col.decode().split(':')[1]
-                row[col_name] = val.decode()
-            sample_data.append(row)
-        
-        ratings_sample = pd.DataFrame(sample_data)
+        print("📊 并行统计行数并抽取行键样本（仅传输行键）...")
+        start = time.perf_counter()
+        strata = count_rows_parallel(connector, table_name, parts, sample_size, seed)
+        total = sum(s['count'] for s in strata)
+        elapsed = time.perf_counter() - start
+        print(f"✅ 总行数: {total:,}（{len(strata)} 个区间，{elapsed:.2f} 秒，"
+              f"{total / max(elapsed, 1e-9):,.0f} 行/秒）")
+            
+        if total == 0:
+            print("⚠️  ratings 表为空")
+            return None
+            
+        # 随机抽样
+        sample_size = min(sample_size, total)
+        print(f"\n🎲 随机抽取 {sample_size:,} 行...")
+        start = time.perf_counter()
+        rows = sample_rows(connector, table_name, strata, sample_size, seed)
+        decoder = ColumnarScanDecoder(RATINGS_COLUMN_TYPES, key_column='key', key_type='bytes').feed(rows)
+        ratings_sample = decoder.to_frame()
+        n = len(ratings_sample)
+        print(f"  抽到 {n:,} 行（{time.perf_counter() - start:.2f} 秒）")
         
         # 检查必要字段
-        print("\n📋 检查字段完整性:")
+        print(f"\n📋 检查字段完整性（估计值，{Z_95:.2f}σ 即 95% 置信区间）:")
         required_fields = ['userId', 'movieId', 'rating', 'timestamp']
         for field in required_fields:
-            if field in ratings_sample.columns:
-                non_null = ratings_sample[field].notna().sum()
-                null_count = ratings_sample[field].isna().sum()
-                print(f"  - {field}: {non_null} 非空, {null_count} 空值")
-            else:
-                print(f"  - {field}: ❌ 缺失")
+            missing = int(ratings_sample[field].isna().sum()) if field in ratings_sample.columns else n
+            low, high = wilson_interval(missing, n)
+            status = "✅" if missing == 0 else "⚠️ "
+            print(f"  {status} {field}: 样本中 {missing} 个空值，"
+                  f"估计缺失 {low * total:,.0f} - {high * total:,.0f} 行（{low:.2%} - {high:.2%}）")
+
+        # 取值范围检查
+        print("\n📐 取值范围检查:")
+        for field, (description, is_valid) in RATINGS_RANGE_CHECKS.items():
+            if field not in ratings_sample.columns:
+                continue
+            values = pd.to_numeric(ratings_sample[field], errors='coerce').dropna()
+            invalid = int((~is_valid(values)).sum())
+            low, high = wilson_interval(invalid, len(values))
+            status = "✅" if invalid == 0 else "⚠️ "
+            print(f"  {status} {description}: 样本中 {invalid} 个不符合，"
+                  f"估计 {low * total:,.0f} - {high * total:,.0f} 行（{low:.2%} - {high:.2%}）")
+
+        # 行键与列值应当一致
+        try:
+            key_fields = connector.rating_keys.decode_many(ratings_sample['key'].tolist())
+            mismatched = int((key_fields != ratings_sample[key_fields.columns]).any(axis=1).sum())
+            low, high = wilson_interval(mismatched, n)
+            status = "✅" if mismatched == 0 else "⚠️ "
+            print(f"  {status} 行键与 userId/movieId/timestamp 一致: 样本中 {mismatched} 个不一致，"
+                  f"估计 {low * total:,.0f} - {high * total:,.0f} 行")
+        except ValueError as e:
+            print(f"  ⚠️  行键无法按 {connector.rating_keys.layout} 布局解析: {e}")
         
         # 统计信息
-        print("\n📊 统计信息（基于样例）:")
-        if 'userId' in ratings_sample.columns:
-            ratings_sample['userId'] = pd.to_numeric(ratings_sample['userId'], errors='coerce')
-            print(f"  - 用户ID范围: {ratings_sample['userId'].min():.0f} - {ratings_sample['userId'].max():.0f}")
-        
-        if 'rating' in ratings_sample.columns:
-            ratings_sample['rating'] = pd.to_numeric(ratings_sample['rating'], errors='coerce')
-            print(f"  - 评分范围: {ratings_sample['rating'].min()} - {ratings_sample['rating'].max()}")
-            print(f"  - 平均评分: {ratings_sample['rating'].mean():.2f}")
+        print("\n📊 统计信息（基于样本）:")
+        mean, half_width = mean_interval(ratings_sample['rating'])
+        print(f"  - 用户ID范围: {ratings_sample['userId'].min():.0f} - {ratings_sample['userId'].max():.0f}")
+        print(f"  - 评分范围: {ratings_sample['rating'].min()} - {ratings_sample['rating'].max()}")
+        print(f"  - 平均评分: {mean:.2f} ± {half_width:.2f}")
         
         # 显示样例数据
         print("\n📝 样例数据（前5条）:")
-        print(ratings_sample.head(5).to_string())
+        print(ratings_sample.drop(columns='key').head(5).to_string())
+
+        return ratings_sample
         
     except Exception as e:
         print(f"❌ Ratings 表验证失败: {e}")
+        return None
+
 
+def check_data_consistency(connector, ratings_sample=None, sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    检查数据一致性
 
-def check_data_consistency(connector):
-    """检查数据一致性"""
+    Args:
+        connector: HBase 连接器
+        ratings_sample: verify_ratings_table 抽取的样本，未提供时重新抽样
+        sample_size: 重新抽样时的样本量
+    """
     try:
         print("📋 检查数据一致性...")
         
         # 读取数据
         movies = connector.read_movies()
         
-        # 从 ratings 表读取样例数据
-        table_name = get_table_name('ratings')
-        table = connector.get_table(table_name)
-        
-        sample_data = []
-        for i, (key, value) in enumerate(table.scan(limit=1000)):
-            row = {}
-            for col, val in value.items():
-                col_name = col.decode().split(':')[1]
-                row[col_name] = val.decode()
-            sample_data.append(row)
-        
-        ratings_sample = pd.DataFrame(sample_data)
+        if ratings_sample is None:
+            table_name = get_table_name('ratings')
+            strata = count_rows_parallel(connector, table_name, sample_size=sample_size)
+            rows = sample_rows(connector, table_name, strata, sample_size)
+            ratings_sample = ColumnarScanDecoder(RATINGS_COLUMN_TYPES).feed(rows).to_frame()
         
         if 'movieId' in ratings_sample.columns:
-            ratings_sample['movieId'] = pd.to_numeric(ratings_sample['movieId'], errors='coerce')
-            
             # 检查引用完整性
             movie_ids_in_movies = set(movies['movieId'])
-            movie_ids_in_ratings = set(ratings_sample['movieId'].dropna())
+            sampled_movie_ids = ratings_sample['movieId'].dropna()
+            movie_ids_in_ratings = set(sampled_movie_ids)
             
             # 找出 ratings 中但不在 movies 中的 movieId
             orphan_movies = movie_ids_in_ratings - movie_ids_in_movies
+            orphan_rows = int(sampled_movie_ids.isin(orphan_movies).sum())
+            low, high = wilson_interval(orphan_rows, len(sampled_movie_ids))
             
             print(f"\n  - Movies 表中的电影数: {len(movie_ids_in_movies)}")
-            print(f"  - Ratings 样例中涉及的电影数: {len(movie_ids_in_ratings)}")
+            print(f"  - Ratings 样本中涉及的电影数: {len(movie_ids_in_ratings)}")
             
             if orphan_movies:
-                print(f"  - ⚠️  发现 {len(orphan_movies)} 个孤儿电影ID（在ratings中但不在movies中）")
+                print(f"  - ⚠️  发现 {len(orphan_movies)} 个孤儿电影ID（在ratings中但不在movies中），"
+                      f"估计占评分的 {low:.2%} - {high:.2%}")
                 print(f"    示例: {list(orphan_movies)[:5]}")
             else:
-                print(f"  - ✅ 引用完整性检查通过")
-        
-        # 检查评分值范围
-        if 'rating' in ratings_sample.columns:
-            ratings_sample['rating'] = pd.to_numeric(ratings_sample['rating'], errors='coerce')
-            valid_ratings = ratings_sample['rating'].dropna()
-            invalid_ratings = valid_ratings[(valid_ratings < 0.5) | (valid_ratings > 5.0)]
-            
-            if len(invalid_ratings) > 0:
-                print(f"  - ⚠️  发现 {len(invalid_ratings)} 个无效评分值")
-            else:
-                print(f"  - ✅ 评分值范围检查通过（0.5-5.0）")
+                print(f"  - ✅ 引用完整性检查通过（孤儿评分占比的 95% 置信上限为 {high:.2%}）")
         
     except Exception as e:
         print(f"❌ 一致性检查失败: {e}")
 
 
 if __name__ == '__main__':
-    verify_hbase_data()
+    args = parse_args()
+    verify_hbase_data(args.sample_size, args.parts, args.seed, args.csv_dir)
 
@@ -0,0 +1,504 @@
+"""
+内存检索索引模块
+为查询页面提供预先构建的倒排索引，避免每次搜索都扫描整列自由文本
+"""
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 表示电影没有类型的占位值，不计入任何类型
+NO_GENRES = '(no genres listed)'
+
+# 标题末尾的上映年份，例如 "(1995)"、"(2006–2007)"
+_TITLE_YEAR_RE = re.compile(r'\s*\((\d{4})(?:[-–]\d{0,4})?\)\s*$')
+# 查询词末尾的年份，例如 "toy story 1995"、"Toy Story (1995)"、"1995"
+_QUERY_YEAR_RE = re.compile(r'^(.*?)\s*\(?\b((?:18|19|20)\d{2})\)?\s*$')
+# 后置的冠词，例如 "Matrix, The"、"Cité des enfants perdus, La"（主标题和括号中的别名都可能出现）
+_TRAILING_ARTICLE_RE = re.compile(
+    r"([^()]+?), (The|A|An|La|Le|Les|L'|Il|El|Los|Las|Das|Die|Der|Den|Det|Un|Une|Una)(?=\s*\)|\s*\(|\s*$)"
+)
+_NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+# 归一化后开头的冠词，比较匹配质量时忽略（"matrix" 与 "the matrix" 视为完全相同）
+_LEADING_ARTICLE_RE = re.compile(r'^(?:the|a|an|la|le|les|l|il|el|los|las|das|die|der|den|det|un|une|una) ')
+
+
+def _prefix_upper_bound(prefix):
+    """
+    有序字符串中以 prefix 开头的区间的上界（不含）
+
+    Args:
+        prefix: 非空前缀
+
+    Returns:
+        str: 大于所有以 prefix 开头的字符串的最小前缀，不存在时返回 None
+    """
+    while prefix and prefix[-1] == chr(0x10FFFF):
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefix_range(keys, prefix):
+    """有序列表 keys 中以 prefix 开头的元素的下标区间 [start, stop)"""
+    start = bisect.bisect_left(keys, prefix)
+    upper = _prefix_upper_bound(prefix)
+    stop = len(keys) if upper is None else bisect.bisect_left(keys, upper, lo=start)
+    return start, stop
+
+
+def normalize_tag(tag):
+    """
+    标签归一化：去掉首尾空白、合并连续空白并转为小写
+
+    Args:
+        tag: 原始标签
+
+    Returns:
+        str: 归一化后的标签
+    """
+    return _WHITESPACE_RE.sub(' ', str(tag)).strip().lower()
+
+
+def normalize_tags(tags):
+    """向量化的 normalize_tag"""
+    return tags.astype(str).str.replace(_WHITESPACE_RE, ' ', regex=True).str.strip().str.lower()
+
+
+class TagIndex:
+    """
+    标签倒排索引：归一化标签 -> 打过该标签的电影
+
+    标签按字典序排列，前缀查询通过二分查找定位，单次查询只访问命中的倒排表。
+    """
+
+    def __init__(self, tags):
+        """
+        构建索引
+
+        Args:
+            tags: 包含 movieId、tag 列的 DataFrame
+        """
+        tags = tags[['movieId', 'tag']].dropna()
+        normalized = normalize_tags(tags['tag'])
+        tags = tags.assign(norm=normalized)[normalized != '']
+
+        # 每个（标签, 电影）被标记的次数作为排序依据，
+        # 倒排表预先按次数从高到低排好，单个标签的查询无需再排序
+        counts = tags.groupby(['norm', 'movieId']).size().reset_index(name='n')
+        counts = counts.sort_values(['norm', 'n'], ascending=[True, False], kind='stable')
+        self._postings = {}
+        for tag, group in counts.groupby('norm', sort=False):
+            self._postings[tag] = (group['movieId'].to_numpy(dtype=np.int64), group['n'].to_numpy(dtype=np.int64))
+        self._tags = sorted(self._postings)
+
+        # 每个归一化标签最常用的原始写法，用于展示
+        display = tags.groupby(['norm', 'tag']).size().reset_index(name='n')
+        display = display.sort_values(['norm', 'n'], ascending=[True, False]).drop_duplicates('norm')
+        self._display = dict(zip(display['norm'], display['tag']))
+
+        # 正向索引：电影 -> 标签列表
+        movie_tags = tags.drop_duplicates(['movieId', 'norm'])
+        self._movie_tags = {
+            movie_id: [self._display[t] for t in group]
+            for movie_id, group in movie_tags.groupby('movieId')['norm']
+        }
+
+    def __len__(self):
+        return len(self._tags)
+
+    def _matching_tags(self, query, prefix):
+        query = normalize_tag(query)
+        if not query:
+            return []
+        if not prefix:
+            return [query] if query in self._postings else []
+        start, stop = _prefix_range(self._tags, query)
+        return self._tags[start:stop]
+
+    def search(self, query, prefix=True):
+        """
+        查询打过某个标签的电影
+
+        Args:
+            query: 标签（大小写、多余空白不敏感）
+            prefix: 是否按前缀匹配（例如 "dark" 同时匹配 "dark comedy"）
+
+        Returns:
+            pd.Series: movieId -> 匹配的标签次数，按次数从高到低排列
+        """
+        matched = self._matching_tags(query, prefix)
+        if not matched:
+            return pd.Series(dtype=np.int64, name='tag_count')
+        if len(matched) == 1:
+            movie_ids, counts = self._postings[matched[0]]
+        else:
+            movie_ids, inverse = np.unique(
+                np.concatenate([self._postings[t][0] for t in matched]), return_inverse=True
+            )
+            counts = np.bincount(inverse, weights=np.concatenate([self._postings[t][1] for t in matched]))
+            order = np.argsort(-counts, kind='stable')
+            movie_ids, counts = movie_ids[order], counts[order].astype(np.int64)
+        return pd.Series(counts, index=pd.Index(movie_ids, name='movieId'), name='tag_count')
+
+    def suggest(self, query, limit=10):
+        """
+        按前缀给出标签建议（原始写法），热门标签在前
+
+        Args:
+            query: 标签前缀
+            limit: 最多返回的数量
+
+        Returns:
+            list: 标签列表
+        """
+        matched = self._matching_tags(query, prefix=True)
+        matched.sort(key=lambda t: -int(self._postings[t][1].sum()))
+        return [self._display[t] for t in matched[:limit]]
+
+    def movie_tags(self, movie_id):
+        """返回电影的全部标签（原始写法）"""
+        return self._movie_tags.get(movie_id, [])
+
+
+def _front_article(match):
+    article = match.group(2)
+    separator = '' if article.endswith("'") else ' '
+    return f"{article}{separator}{match.group(1)}"
+
+
+def normalize_title(title):
+    """
+    标题归一化：去掉末尾的年份，把后置冠词移回开头（"Matrix, The" -> "the matrix"），
+    去掉重音符号，标点统一为空格并转为小写
+
+    Args:
+        title: 原始标题或查询词
+
+    Returns:
+        str: 归一化后的标题
+    """
+    title = _TITLE_YEAR_RE.sub('', str(title))
+    title = _TRAILING_ARTICLE_RE.sub(_front_article, title)
+    title = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode('ascii')
+    return _NON_ALNUM_RE.sub(' ', title.lower()).strip()
+
+
+def normalize_titles(titles):
+    """向量化的 normalize_title"""
+    titles = titles.astype(str).str.replace(_TITLE_YEAR_RE, '', regex=True)
+    titles = titles.str.replace(_TRAILING_ARTICLE_RE, _front_article, regex=True)
+    titles = titles.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    return titles.str.lower().str.replace(_NON_ALNUM_RE, ' ', regex=True).str.strip()
+
+
+def split_query_year(query):
+    """
+    拆出查询词末尾的年份
+
+    Returns:
+        tuple: (去掉年份后的查询词, 年份)，没有年份时年份为 None
+    """
+    match = _QUERY_YEAR_RE.match(str(query).strip())
+    if match is None:
+        return str(query), None
+    return match.group(1), int(match.group(2))
+
+
+def title_trigrams(text, pad=True):
+    """
+    文本的三元组集合
+
+    Args:
+        text: 归一化后的文本
+        pad: 是否在首尾补空格，补齐后词首、词尾也会形成三元组（例如 " ma"）
+    """
+    if pad:
+        text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """
+    电影标题三元组倒排索引
+
+    每个归一化标题（首尾补空格）拆成三元组，倒排表以 CSR 形式保存：三元组按字典序排列，
+    offsets 指向 docs 数组中各自的行号区间，行号升序。
+
+    - 子串查询：求查询词全部三元组倒排表的交集（从最短的开始），再对少量候选核对子串
+    - 少于 3 个字符的查询：按词首匹配，用以 " " + 查询词开头的三元组定位
+    - 模糊查询：子串没有结果时，按与查询词共有的三元组比例匹配，容忍拼写错误；
+      要求共有三元组的比例和数量都达到下限，很短的查询不会匹配到无关标题
+    - 年份：标题末尾的年份不参与三元组，单独保存为数组；查询词末尾的年份
+      （"toy story 1995"）只匹配该年份的电影，只有年份的查询返回该年份上映的电影
+
+    单次查询只访问查询词三元组的倒排表，不扫描全部标题。
+    """
+
+    # 匹配质量：完全相同 > 标题开头 > 词首 > 词中；模糊匹配的质量为共有三元组比例，小于 1
+    EXACT = 4.0
+    PREFIX = 3.0
+    WORD = 2.0
+    SUBSTRING = 1.0
+
+    def __init__(self, movies, popularity=None, fuzzy_threshold=0.6, fuzzy_min_shared=3):
+        """
+        构建索引
+
+        Args:
+            movies: 包含 movieId、title 列的 DataFrame，search 返回的位置即该 DataFrame 的行号
+            popularity: movieId -> 热度（例如评分数量）的 Series（可选），匹配质量相同时热度高的在前
+            fuzzy_threshold: 模糊匹配要求的最低共有三元组比例
+            fuzzy_min_shared: 模糊匹配要求的最少共有三元组数
+        """
+        movies = movies.reset_index(drop=True)
+        self.movie_ids = movies['movieId'].to_numpy(dtype=np.int64)
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_min_shared = fuzzy_min_shared
+        titles = movies['title'].fillna('').astype(str)
+        self._texts = normalize_titles(titles).tolist()
+        self.years = pd.to_numeric(titles.str.extract(_TITLE_YEAR_RE, expand=False), errors='coerce').to_numpy()
+
+        if popularity is None:
+            self.popularity = np.zeros(len(movies))
+        else:
+            self.popularity = popularity.reindex(self.movie_ids).fillna(0).to_numpy(dtype=np.float64)
+
+        grams, docs = [], []
+        for doc, text in enumerate(self._texts):
+            doc_grams = title_trigrams(text) if text else ()
+            grams.extend(doc_grams)
+            docs.extend([doc] * len(doc_grams))
+        grams = pd.Categorical(grams)
+        codes = grams.codes.astype(np.int64)
+        docs = np.asarray(docs, dtype=np.int32)
+
+        order = np.lexsort((docs, codes))
+        self._grams = list(grams.categories)
+        self._gram_ids = {gram: i for i, gram in enumerate(self._grams)}
+        self._docs = docs[order]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(self._grams)))))
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _postings(self, gram_id):
+        return self._docs[self._offsets[gram_id]:self._offsets[gram_id + 1]]
+
+    def _gram_postings(self, grams):
+        """三元组对应的倒排表列表，存在未收录的三元组时返回 None"""
+        gram_ids = [self._gram_ids.get(gram) for gram in grams]
+        if any(gram_id is None for gram_id in gram_ids):
+            return None
+        return [self._postings(gram_id) for gram_id in gram_ids]
+
+    def _substring_candidates(self, query):
+        if len(query) < 3:
+            # 以 " " + 查询词开头的三元组（查询词只有一个字符时是一个区间）
+            start, stop = _prefix_range(self._grams, ' ' + query)
+            if start == stop:
+                return np.array([], dtype=np.int32)
+            return np.unique(np.concatenate([self._postings(i) for i in range(start, stop)]))
+
+        postings = self._gram_postings(title_trigrams(query, pad=False))
+        if postings is None:
+            return np.array([], dtype=np.int32)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for docs in postings[1:]:
+            candidates = np.intersect1d(candidates, docs, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+
+    def _match_quality(self, text, query):
+        bare = _LEADING_ARTICLE_RE.sub('', text)
+        if query in (text, bare):
+            return self.EXACT
+        if text.startswith(query) or bare.startswith(query):
+            return self.PREFIX
+        if f" {query}" in f" {text}":
+            return self.WORD
+        if len(query) >= 3 and query in text:
+            return self.SUBSTRING
+        return 0.0
+
+    def _fuzzy_matches(self, query):
+        grams = title_trigrams(query)
+        postings = [self._postings(self._gram_ids[g]) for g in grams if g in self._gram_ids]
+        if not postings:
+            return np.array([], dtype=np.int32), np.array([])
+        docs, shared = np.unique(np.concatenate(postings), return_counts=True)
+        quality = shared / len(grams)
+        matched = (quality >= self.fuzzy_threshold) & (shared >= self.fuzzy_min_shared)
+        # 模糊匹配的质量始终低于子串匹配
+        return docs[matched], np.minimum(quality[matched], 0.99)
+
+    def _text_matches(self, query, fuzzy):
+        """
+        按归一化后的查询词匹配标题
+
+        Returns:
+            tuple: (行号数组, 匹配质量数组)
+        """
+        if not query:
+            return np.array([], dtype=np.int32), np.array([])
+
+        candidates = self._substring_candidates(query)
+        quality = np.array([self._match_quality(self._texts[doc], query) for doc in candidates])
+        matched = quality > 0
+        docs, quality = candidates[matched], quality[matched]
+
+        # 纯数字的查询不做模糊匹配，相近的数字没有意义
+        if len(docs) == 0 and fuzzy and len(query) >= 3 and not query.isdigit():
+            docs, quality = self._fuzzy_matches(query)
+        return docs, quality
+
+    def search(self, query, limit=None, fuzzy=True):
+        """
+        搜索标题
+
+        Args:
+            query: 查询词（与标题使用相同的归一化，大小写、标点、重音、冠词位置不敏感），
+                末尾可以带年份
+            limit: 最多返回的数量（可选）
+            fuzzy: 子串没有结果时是否返回模糊匹配
+
+        Returns:
+            pd.Series: 行号 -> 匹配质量，按匹配质量、热度从高到低排列
+        """
+        text, year = split_query_year(query)
+        text = normalize_title(text)
+        if year is None:
+            docs, quality = self._text_matches(text, fuzzy)
+        elif not text:
+            # 只有年份：该年份上映的电影，以及标题中含有这个数字的电影（例如 "2001: A Space Odyssey"）
+            year_docs = np.flatnonzero(self.years == year)
+            docs, quality = self._text_matches(str(year), fuzzy=False)
+            docs = np.concatenate([docs, year_docs])
+            quality = np.concatenate([quality, np.full(len(year_docs), self.WORD)])
+            order = np.lexsort((-quality, docs))
+            docs, quality = docs[order], quality[order]
+            first = np.r_[True, docs[1:] != docs[:-1]]
+            docs, quality = docs[first], quality[first]
+        else:
+            docs, quality = self._text_matches(text, fuzzy)
+            in_year = self.years[docs] == year
+            if in_year.any():
+                docs, quality = docs[in_year], quality[in_year]
+            else:
+                # 该年份没有匹配时，数字可能是标题的一部分（例如 "Blade Runner 2049"）
+                docs, quality = self._text_matches(normalize_title(query), fuzzy)
+
+        order = np.lexsort((-self.popularity[docs], -quality))
+        if limit is not None:
+            order = order[:limit]
+        return pd.Series(quality[order], index=docs[order].astype(np.int64), name='match_quality')
+
+
+class MovieFilterIndex:
+    """
+    电影组合筛选索引
+
+    每部电影的类型编码为一个位图（每个类型一位，MovieLens 的 20 个类型放得进 uint32），
+    类型条件通过按位运算判断；年份、评分数量、平均评分保存为与位图对齐的数组，
+    所有条件都是对这几个数组的向量化布尔运算，不再对类型字符串做匹配。
+    """
+
+    def __init__(self, movies, rating_stats=None):
+        """
+        构建索引
+
+        Args:
+            movies: 包含 movieId、genres、year（可选）列的 DataFrame，
+                filter 返回的位置即该 DataFrame 的行号
+            rating_stats: 以 movieId 为索引、包含 rating_count、avg_rating 列的 DataFrame（可选）
+        """
+        movies = movies.reset_index(drop=True)
+        self.movie_ids = movies['movieId'].to_numpy(dtype=np.int64)
+
+        genres = movies['genres'].dropna().astype(str).str.split('|').explode()
+        genres = genres[(genres != NO_GENRES) & (genres != '')]
+        self.genres = sorted(genres.unique())
+        if len(self.genres) > 64:
+            raise ValueError(f"类型数量 {len(self.genres)} 超过 64，无法编码为位图")
+        dtype = np.uint32 if len(self.genres) <= 32 else np.uint64
+        self._bits = {genre: dtype(1) << dtype(i) for i, genre in enumerate(self.genres)}
+
+        codes = pd.Categorical(genres, categories=self.genres).codes.astype(dtype)
+        self.genre_masks = np.zeros(len(movies), dtype=dtype)
+        np.bitwise_or.at(self.genre_masks, genres.index.to_numpy(), dtype(1) << codes)
+
+        if 'year' in movies.columns:
+            self.years = pd.to_numeric(movies['year'], errors='coerce').astype(np.float64).to_numpy()
+        else:
+            self.years = np.full(len(movies), np.nan)
+
+        if rating_stats is None:
+            rating_stats = pd.DataFrame(columns=['rating_count', 'avg_rating'])
+        rating_stats = rating_stats.reindex(self.movie_ids)
+        self.rating_counts = rating_stats['rating_count'].fillna(0).to_numpy(dtype=np.int64)
+        self.avg_ratings = rating_stats['avg_rating'].astype(np.float64).to_numpy()
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def genre_mask(self, genres):
+        """
+        类型列表对应的位图
+
+        Returns:
+            tuple: (位图, 是否包含未知类型)
+        """
+        mask = self.genre_masks.dtype.type(0)
+        unknown = False
+        for genre in genres:
+            bit = self._bits.get(genre)
+            if bit is None:
+                unknown = True
+            else:
+                mask |= bit
+        return mask, unknown
+
+    def filter(self, genres=None, match='any', year_range=None, min_ratings=0, min_avg=None):
+        """
+        按组合条件筛选电影
+
+        Args:
+            genres: 类型列表（可选）
+            match: 'any' 包含任一类型，'all' 包含全部类型
+            year_range: (开始, 结束) 年份闭区间，任一端为 None 表示不限；设置后没有年份的电影不匹配
+            min_ratings: 最少评分数量
+            min_avg: 最低平均评分（可选），设置后没有评分的电影不匹配
+
+        Returns:
+            np.ndarray: 匹配电影在 movies 中的行号（升序）
+        """
+        if match not in ('any', 'all'):
+            raise ValueError(f"不支持的类型匹配方式: {match}")
+
+        selected = np.ones(len(self.movie_ids), dtype=bool)
+        if genres:
+            mask, unknown = self.genre_mask(genres)
+            if match == 'all':
+                if unknown:
+                    return np.array([], dtype=np.int64)
+                selected &= (self.genre_masks & mask) == mask
+            else:
+                selected &= (self.genre_masks & mask) != 0
+        if year_range is not None:
+            start, stop = year_range
+            if start is not None:
+                selected &= self.years >= start
+            if stop is not None:
+                selected &= self.years <= stop
+        if min_ratings:
+            selected &= self.rating_counts >= min_ratings
+        if min_avg is not None:
+            selected &= self.avg_ratings >= min_avg
+        return np.flatnonzero(selected)
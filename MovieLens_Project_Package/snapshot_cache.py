@@ -0,0 +1,231 @@
+"""
+HBase 表的本地列式快照
+把从 HBase 读取的整表数据保存为 Parquet 文件，并在旁边的 JSON 文件中记录新鲜度标记。
+应用冷启动时直接读取本地快照，快照过期后在后台线程中增量刷新。
+"""
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+from hbase_config import get_hbase_config
+
+# Parquet 读写依赖 pyarrow（streamlit 已依赖 pyarrow）
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# 快照文件格式版本，格式变化时递增以使旧快照失效
+# （第 2 版的高水位由 read_watermark 提供，例如 ratings 的写入时间，不再是数据列的最大值）
+SNAPSHOT_VERSION = 2
+
+
+def write_parquet_atomic(df, path):
+    """先写临时文件再替换，保证读取方不会读到写了一半的文件"""
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(data, path):
+    """先写临时文件再替换"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class SnapshotCache:
+    """
+    HBase 表快照缓存
+
+    每张表对应 <name>.parquet 和 <name>.json 两个文件，JSON 中的新鲜度标记包括：
+      - source: 数据来源（后端://主机:端口），来源不同的快照不会被使用
+      - refreshed_at / full_refreshed_at: 最近一次刷新 / 全量刷新的时间
+      - watermark: 增量刷新的高水位（例如 ratings_changes 表中最近一次写入的时间）
+
+    后台刷新完成后依次调用 add_refresh_listener 注册的回调，便于上层清除内存中的缓存。
+    """
+
+    def __init__(self, directory, source, max_age=300, full_refresh_interval=86400):
+        """
+        初始化快照缓存
+
+        Args:
+            directory: 快照目录
+            source: 数据来源标识
+            max_age: 快照超过该时间（秒）后在后台刷新
+            full_refresh_interval: 增量刷新无法反映删除，超过该时间（秒）后改为全量刷新
+        """
+        self.directory = directory
+        self.source = source
+        self.max_age = max_age
+        self.full_refresh_interval = full_refresh_interval
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._refreshing = set()
+        self._listeners = []
+
+    def _paths(self, name):
+        base = os.path.join(self.directory, name)
+        return f"{base}.parquet", f"{base}.json"
+
+    def _lock(self, name):
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def add_refresh_listener(self, callback):
+        """
+        注册后台刷新完成后的回调（同一回调只注册一次）
+
+        Args:
+            callback: 回调函数，参数为快照名
+        """
+        with self._locks_guard:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def read_meta(self, name):
+        """
+        读取快照的新鲜度标记
+
+        Returns:
+            dict: 新鲜度标记，快照不存在、版本或来源不一致时返回 None
+        """
+        data_path, meta_path = self._paths(name)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != SNAPSHOT_VERSION or meta.get('source') != self.source:
+            return None
+        return meta
+
+    def load(self, name, read_full, read_delta=None, read_watermark=None, key_columns=None):
+        """
+        读取表数据：有快照时直接返回快照（过期则在后台刷新），没有快照时同步读取并生成快照
+
+        Args:
+            name: 快照名（通常为表类型）
+            read_full: 全量读取函数，返回 DataFrame
+            read_delta: 增量读取函数（可选），参数为上次刷新时的高水位，返回此后写入（含）的数据
+            read_watermark: 读取当前高水位的函数（可选），返回 None 表示无法增量刷新
+            key_columns: 合并增量数据时用于去重的主键列
+
+        Returns:
+            pd.DataFrame: 表数据
+        """
+        refresh_args = (name, read_full, read_delta, read_watermark, key_columns)
+        meta = self.read_meta(name)
+        if meta is None:
+            return self.refresh(*refresh_args)
+
+        try:
+            df = pd.read_parquet(self._paths(name)[0])
+        except Exception as e:
+            print(f"读取快照 {name} 失败，重新生成: {e}")
+            return self.refresh(*refresh_args)
+
+        age = time.time() - meta['refreshed_at']
+        if age > self.max_age:
+            self.refresh_in_background(*refresh_args)
+        print(f"从本地快照加载 {name}（{len(df):,} 行，{age:.0f} 秒前刷新）")
+        return df
+
+    def refresh(self, name, read_full, read_delta=None, read_watermark=None, key_columns=None):
+        """
+        刷新快照：能增量时只读取高水位之后写入的数据并合并，否则全量读取
+
+        Returns:
+            pd.DataFrame: 刷新后的表数据
+        """
+        with self._lock(name):
+            meta = self.read_meta(name)
+            now = time.time()
+            # 先取高水位再读数据，读取期间写入的行在下一次刷新时还会被读到
+            watermark = read_watermark() if read_watermark is not None else None
+            incremental = (
+                meta is not None and read_delta is not None
+                and meta.get('watermark') is not None and watermark is not None
+                and now - meta['full_refreshed_at'] < self.full_refresh_interval
+            )
+
+            if incremental:
+                current = pd.read_parquet(self._paths(name)[0])
+                delta = read_delta(meta['watermark'])
+                if len(delta):
+                    df = pd.concat([current, delta[current.columns]], ignore_index=True)
+                    df = df.drop_duplicates(key_columns, keep='last', ignore_index=True)
+                else:
+                    df = current
+                full_refreshed_at = meta['full_refreshed_at']
+                print(f"增量刷新快照 {name}: 读取 {len(delta):,} 行，共 {len(df):,} 行")
+            else:
+                delta = df = read_full()
+                full_refreshed_at = now
+                print(f"全量刷新快照 {name}: {len(df):,} 行")
+
+            os.makedirs(self.directory, exist_ok=True)
+            data_path, meta_path = self._paths(name)
+            if len(delta) or meta is None:
+                write_parquet_atomic(df, data_path)
+            write_json_atomic({
+                'version': SNAPSHOT_VERSION,
+                'source': self.source,
+                'rows': len(df),
+                'watermark': watermark,
+                'refreshed_at': now,
+                'full_refreshed_at': full_refreshed_at,
+            }, meta_path)
+            return df
+
+    def refresh_in_background(self, name, *args):
+        """在后台线程中刷新快照（同一快照同时只有一个刷新线程）"""
+        with self._locks_guard:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        def run():
+            try:
+                self.refresh(name, *args)
+                for callback in list(self._listeners):
+                    callback(name)
+            except Exception as e:
+                print(f"后台刷新快照 {name} 失败: {e}")
+            finally:
+                with self._locks_guard:
+                    self._refreshing.discard(name)
+
+        threading.Thread(target=run, name=f'snapshot-{name}', daemon=True).start()
+
+
+_snapshot_cache = None
+_snapshot_cache_lock = threading.Lock()
+
+
+def is_snapshot_enabled():
+    """是否启用 HBase 表快照"""
+    return PARQUET_AVAILABLE and get_hbase_config().get('snapshot_enabled', False)
+
+
+def get_snapshot_cache():
+    """获取快照缓存实例（单例）"""
+    global _snapshot_cache
+    if _snapshot_cache is None:
+        with _snapshot_cache_lock:
+            if _snapshot_cache is None:
+                config = get_hbase_config()
+                _snapshot_cache = SnapshotCache(
+                    directory=config['snapshot_dir'],
+                    source=f"{config['backend']}://{config['host']}:{config['port']}",
+                    max_age=config['snapshot_max_age'],
+                    full_refresh_interval=config['snapshot_full_refresh_interval']
+                )
+    return _snapshot_cache